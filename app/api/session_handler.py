@@ -1,72 +1,174 @@
 # app/api/session_handler.py
-from fastapi import APIRouter, HTTPException, Depends
+import logging
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from pydantic import ValidationError
 from email_validator import validate_email, EmailNotValidError
 from sqlalchemy.orm import Session
-from app.models.schemas import RawHRVData, SessionRecord
-from app.core.processor import HRVSessionProcessor
+from app.models.schemas import RawHRVData, RRChunk
+from starlette.concurrency import run_in_threadpool
+from app.core.admission import AdmissionTicket, admit_ingest, admit_read, set_admission_cost
 from app.core.database import get_db
+from app.core.append import AppendError
+from app.core.archive import ArchiveError
+from app.core.ingest import append_session, ingest_session_async
+from app.core.jobs import job_response, notify_job_workers
+from app.core.processor import analysis_window_count
+from app.core.profiling import profile_block, profile_requested
+from app.core.rr_series import DOWNSAMPLE_METHODS, MAX_RR_POINTS, rr_series_view
+from app.core.rr_codec import CONTENT_TYPE as BINARY_RR_CONTENT_TYPE, PayloadError, UnsupportedEncodingError, decompress, decode_payload
+from app.core.serialization import RequestDecodeError, decode_body, encode_response, split_rr_intervals
+from app.core.response_cache import cached_response
+from app.core.storage import SessionStore, get_store, get_read_store, get_lazy_read_store
+from app.config import settings
 from app.core.crud import (
-    create_hrv_session, 
-    create_hrv_metrics, 
-    get_session_by_recording_id,
-    get_sessions_by_user,
-    get_sessions_by_tag
+    create_hrv_job,
+    get_job,
+    get_active_job_by_recording_id
 )
-from app.models.sql_models import User, HRVSession, Device, Tag
-from typing import List
+from app.core.summaries import summary_response
+from app.core.circadian import circadian_response
+from app.core.sketches import SKETCH_METRICS, get_sketches, percentile_response
+from app.core.session_query import (
+    MAX_QUERY_LIMIT,
+    QueryError,
+    naive_utc,
+    parse_range_filters,
+    parse_tag_filter,
+    query_results,
+    range_parameters_openapi
+)
+from datetime import datetime
+from typing import List, Optional
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-@router.post("/hrv/session", response_model=dict)
-async def process_hrv_session(raw_data: RawHRVData, db: Session = Depends(get_db)):
-    """Process incoming HRV session data and store in database"""
-    # Check if session already exists
-    existing_session = get_session_by_recording_id(db, raw_data.recordingSessionId)
+# The body is decoded by hand (see app/core/serialization.py), so document it explicitly
+RAW_HRV_DATA_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": RawHRVData.schema()},
+            "application/msgpack": {"schema": RawHRVData.schema()}
+        }
+    }
+}
+
+def build_raw_data(fields: dict, rr_array) -> RawHRVData:
+    """Validate session fields with pydantic and attach an already-converted RR array"""
+    try:
+        raw_data = RawHRVData(**fields, rrIntervals=[])
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors())
+    raw_data.rrIntervals = rr_array
+    # Windows are computed inside one request's admission slot, so their number is bounded
+    windows = analysis_window_count(raw_data, rr_array)
+    if windows > settings.MAX_ANALYSIS_WINDOWS:
+        raise HTTPException(status_code=422, detail=(
+            f"Windowed analysis would compute {windows} windows, more than {settings.MAX_ANALYSIS_WINDOWS}; "
+            "use a longer stepSeconds"
+        ))
+    return raw_data
+
+def enqueue_session(request: Request, raw_data: RawHRVData, store: SessionStore, db: Session):
+    """Persist the raw session as a job and answer 202 with its status URL"""
+    existing_session = store.get_session_by_recording_id(raw_data.recordingSessionId)
     if existing_session:
-        return {
+        return encode_response(request, {
             "status": "error",
             "message": f"Session with ID {raw_data.recordingSessionId} already exists",
             "data": {"session_id": existing_session.id}
-        }
+        })
     
-    # Process the data
-    processor = HRVSessionProcessor(raw_data)
-    valid, result = processor.process()
-    
-    # Create session in database
-    db_session = create_hrv_session(db, raw_data, valid, processor.validation_result)
-    
-    # If valid session, also store metrics
-    if valid and "metrics" in result:
-        create_hrv_metrics(
-            db=db,
-            session_id=db_session.id,
-            metrics_dict=result["metrics"],
-            indexes=result.get("indexes", {})
-        )
-    
-    # Return response
-    if not valid:
-        return {
-            "status": "error",
-            "message": f"Invalid HRV session: {result['metadata'].get('reason')}",
-            "data": result
-        }
+    # Re-submitting while a job is pending returns the same job
+    job = get_active_job_by_recording_id(db, raw_data.recordingSessionId)
+    if not job:
+        job = create_hrv_job(db, raw_data)
+        notify_job_workers()
     
-    return {
-        "status": "success",
-        "message": "Session processed and stored successfully",
-        "data": result
-    }
+    status_url = f"/api/hrv/jobs/{job.id}"
+    return encode_response(request, {
+        "status": "accepted",
+        "message": "Session queued for processing",
+        "data": {"job_id": job.id, "status": job.status, "status_url": status_url}
+    }, status_code=202, headers={"Location": status_url})
 
-@router.get("/hrv/sessions/user/{user_id}", response_model=List[dict])
-async def get_user_sessions(user_id: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all sessions for a specific user"""
-    sessions = get_sessions_by_user(db, user_id, skip, limit)
-    if not sessions:
-        return []
+@router.post("/hrv/session", response_model=dict, openapi_extra=RAW_HRV_DATA_BODY)
+async def process_hrv_session(request: Request, admission: Optional[AdmissionTicket] = Depends(admit_ingest),
+                              db: Session = Depends(get_db),
+                              store: SessionStore = Depends(get_store),
+                              profile: bool = Depends(profile_requested),
+                              run_async: bool = Query(False, alias="async")):
+    """Process incoming HRV session data and store in database"""
+    body = await request.body()
+    try:
+        fields, rr_array = split_rr_intervals(decode_body(request.headers.get("content-type"), body))
+    except RequestDecodeError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    raw_data = build_raw_data(fields, rr_array)
+    
+    if run_async:
+        return enqueue_session(request, raw_data, store, db)
+    set_admission_cost(admission, len(rr_array))
+    
+    # The profiler samples this thread, so profiled sessions are processed inline
+    with profile_block(profile) as profile_result:
+        response = await ingest_session_async(raw_data, store, offload=not profile)
     
-    # Convert to response format
+    # Attach a pointer to the stored profile when profiling was requested
+    if profile_result:
+        response["profile"] = profile_result.summary()
+    
+    return encode_response(request, response)
+
+def request_content_type(request: Request) -> str:
+    return request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+def decode_binary_body(request: Request, body: bytes):
+    """Header fields and RR array of a binary RR payload (see app/core/rr_codec.py)"""
+    try:
+        data = decompress(body, request.headers.get("content-encoding"), settings.MAX_BINARY_PAYLOAD_BYTES)
+        return decode_payload(data)
+    except UnsupportedEncodingError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except PayloadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/hrv/session/binary", response_model=dict)
+async def process_hrv_session_binary(request: Request, admission: Optional[AdmissionTicket] = Depends(admit_ingest),
+                                     store: SessionStore = Depends(get_store),
+                                     profile: bool = Depends(profile_requested)):
+    """Process an HRV session sent in the compact binary RR format (see app/core/rr_codec.py)"""
+    if request_content_type(request) != BINARY_RR_CONTENT_TYPE:
+        raise HTTPException(status_code=415, detail=f"Expected Content-Type {BINARY_RR_CONTENT_TYPE}")
+    
+    header, rr_array = decode_binary_body(request, await request.body())
+    
+    # Validate the metadata only; the RR array goes to the validator as-is
+    raw_data = build_raw_data(header, rr_array)
+    set_admission_cost(admission, len(rr_array))
+    
+    # The profiler samples this thread, so profiled sessions are processed inline
+    with profile_block(profile) as profile_result:
+        response = await ingest_session_async(raw_data, store, offload=not profile)
+    
+    if profile_result:
+        response["profile"] = profile_result.summary()
+    
+    return encode_response(request, response)
+
+@router.get("/hrv/jobs/{job_id}", response_model=dict, dependencies=[Depends(admit_read)])
+async def get_job_status(request: Request, job_id: str, db: Session = Depends(get_db)):
+    """Get the status of a background analysis job, with its result once finished"""
+    # Reads the primary: a replica may not have the job row or its latest status yet
+    job = get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found")
+    
+    return encode_response(request, job_response(job))
+
+def session_summaries(sessions) -> List[dict]:
+    """List-endpoint view of sessions"""
     return [
         {
             "id": session.id,
@@ -80,31 +182,139 @@ async def get_user_sessions(user_id: str, skip: int = 0, limit: int = 100, db: S
         for session in sessions
     ]
 
-@router.get("/hrv/sessions/tag/{tag_name}", response_model=List[dict])
-async def get_sessions_with_tag(tag_name: str, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@router.get("/hrv/sessions/user/{user_id}", response_model=List[dict], dependencies=[Depends(admit_read)])
+async def get_user_sessions(request: Request, user_id: str, skip: int = 0, limit: int = 100,
+                            store: SessionStore = Depends(get_lazy_read_store)):
+    """Get all sessions for a specific user"""
+    return cached_response(
+        request, ("user", user_id, skip, limit), [f"user:{user_id}"],
+        lambda: session_summaries(store.get_sessions_by_user(user_id, skip, limit))
+    )
+
+@router.get("/hrv/sessions/tag/{tag_name}", response_model=List[dict], dependencies=[Depends(admit_read)])
+async def get_sessions_with_tag(request: Request, tag_name: str, skip: int = 0, limit: int = 100,
+                                store: SessionStore = Depends(get_lazy_read_store)):
     """Get all sessions with a specific tag"""
-    sessions = get_sessions_by_tag(db, tag_name, skip, limit)
-    if not sessions:
-        return []
+    return cached_response(
+        request, ("tag", tag_name, skip, limit), [f"tag:{tag_name}"],
+        lambda: session_summaries(store.get_sessions_by_tag(tag_name, skip, limit))
+    )
+
+@router.get("/hrv/sessions/query", response_model=List[dict], dependencies=[Depends(admit_read)],
+            openapi_extra=range_parameters_openapi())
+async def query_sessions_endpoint(request: Request,
+                                  quality_label: Optional[List[str]] = Query(None),
+                                  valid: Optional[bool] = None,
+                                  tag: Optional[str] = None,
+                                  device_model: Optional[str] = None,
+                                  user_id: Optional[str] = None,
+                                  start: Optional[datetime] = Query(None, alias="from"),
+                                  end: Optional[datetime] = Query(None, alias="to"),
+                                  skip: int = Query(0, ge=0),
+                                  limit: int = Query(100, ge=1, le=MAX_QUERY_LIMIT),
+                                  store: SessionStore = Depends(get_read_store)):
+    """Find sessions by metric ranges (e.g. rmssd_max=20), quality, tag, device and time, newest first"""
+    try:
+        ranges = parse_range_filters(request.query_params)
+    except QueryError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     
-    # Convert to response format
-    return [
-        {
-            "id": session.id,
-            "recordingSessionId": session.recording_session_id,
-            "timestamp": session.timestamp,
-            "valid": session.valid,
-            "quality_score": session.quality_score,
-            "quality_label": session.quality_label,
-            "tags": [tag.name for tag in session.tags]
-        }
-        for session in sessions
-    ]
+    rows = store.query_sessions(
+        ranges, quality_labels=quality_label, valid=valid, tag=tag, device_model=device_model,
+        user_id=user_id, start=naive_utc(start), end=naive_utc(end), skip=skip, limit=limit
+    )
+    return encode_response(request, query_results(rows))
 
-@router.get("/hrv/session/{session_id}", response_model=dict)
-async def get_session_details(session_id: str, db: Session = Depends(get_db)):
-    """Get detailed information for a specific session"""
-    session = get_session_by_recording_id(db, session_id)
+@router.get("/hrv/sessions/tags", response_model=dict, dependencies=[Depends(admit_read)],
+            openapi_extra=range_parameters_openapi())
+async def query_sessions_by_tags(request: Request,
+                                 all_of: Optional[List[str]] = Query(None, alias="all", description="Sessions with every one of these tags"),
+                                 any_of: Optional[List[str]] = Query(None, alias="any", description="Sessions with at least one of these tags"),
+                                 none_of: Optional[List[str]] = Query(None, alias="none", description="Sessions with none of these tags"),
+                                 quality_label: Optional[List[str]] = Query(None),
+                                 valid: Optional[bool] = None,
+                                 device_model: Optional[str] = None,
+                                 user_id: Optional[str] = None,
+                                 start: Optional[datetime] = Query(None, alias="from"),
+                                 end: Optional[datetime] = Query(None, alias="to"),
+                                 skip: int = Query(0, ge=0),
+                                 limit: int = Query(100, ge=1, le=MAX_QUERY_LIMIT),
+                                 store: SessionStore = Depends(get_read_store)):
+    """Sessions matching a tag expression (all/any/none) and the query filters, with per-tag counts over all matches"""
+    try:
+        ranges = parse_range_filters(request.query_params)
+        tags = parse_tag_filter(all_of, any_of, none_of)
+    except QueryError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    filters = dict(
+        quality_labels=quality_label, valid=valid, device_model=device_model, user_id=user_id,
+        start=naive_utc(start), end=naive_utc(end), tags=tags
+    )
+    total, facets = store.tag_facets(ranges, **filters)
+    rows = store.query_sessions(ranges, skip=skip, limit=limit, **filters)
+    return encode_response(request, {
+        "total": total,
+        "facets": dict(sorted(facets.items(), key=lambda item: (-item[1], item[0]))),
+        "sessions": query_results(rows)
+    })
+
+def user_summary(store: SessionStore, user_id: str) -> dict:
+    summary = store.get_user_summary(user_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found")
+    return summary_response(summary)
+
+@router.get("/hrv/users/{user_id}/summary", response_model=dict, dependencies=[Depends(admit_read)])
+async def get_user_summary_endpoint(request: Request, user_id: str, store: SessionStore = Depends(get_lazy_read_store)):
+    """Latest session, last-7-days averages and session counts for a user's home screen"""
+    return cached_response(request, ("summary", user_id), [f"user:{user_id}"], lambda: user_summary(store, user_id))
+
+def user_circadian(store: SessionStore, user_id: str, utc_offset: int) -> dict:
+    summary = store.get_user_summary(user_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found")
+    return circadian_response(user_id, summary.circadian, utc_offset)
+
+@router.get("/hrv/users/{user_id}/circadian", response_model=dict, dependencies=[Depends(admit_read)])
+async def get_user_circadian(request: Request, user_id: str,
+                             utc_offset: int = Query(0, ge=-720, le=840, description="Minutes east of UTC for local hours"),
+                             store: SessionStore = Depends(get_lazy_read_store)):
+    """24-hour and weekday profiles of a user's sessions, with cosinor fits"""
+    return cached_response(
+        request, ("circadian", user_id, utc_offset), [f"user:{user_id}"],
+        lambda: user_circadian(store, user_id, utc_offset)
+    )
+
+@router.get("/hrv/percentiles", response_model=dict, dependencies=[Depends(admit_read)])
+async def get_percentiles(request: Request,
+                          metric: str = Query(..., description=f"One of: {', '.join(SKETCH_METRICS)}"),
+                          value: Optional[float] = Query(None, description="Value to rank"),
+                          user_id: Optional[str] = Query(None, description="Rank this user's latest session instead"),
+                          device_model: Optional[str] = None, tag: Optional[str] = None,
+                          store: SessionStore = Depends(get_lazy_read_store)):
+    """Approximate percentile rank of a metric value among all sessions, and within a device model or tag"""
+    if metric not in SKETCH_METRICS:
+        raise HTTPException(status_code=422, detail=f"Unknown metric '{metric}', expected one of: {', '.join(SKETCH_METRICS)}")
+    registry = get_sketches()
+    if registry is None:
+        raise HTTPException(status_code=503, detail="Percentile sketches are disabled (SKETCHES_ENABLED=False)")
+    source = "value"
+    if value is None:
+        if user_id is None:
+            raise HTTPException(status_code=422, detail="Pass either value or user_id")
+        summary = store.get_user_summary(user_id)
+        if summary is None:
+            raise HTTPException(status_code=404, detail=f"User {user_id} not found")
+        value = (summary.latest_metrics or {}).get(metric)
+        if value is None:
+            raise HTTPException(status_code=404, detail=f"User {user_id} has no {metric} to rank")
+        source = "latest_session"
+    return encode_response(request, percentile_response(registry, metric, value, source, device_model, tag))
+
+def session_detail(store: SessionStore, session_id: str) -> dict:
+    """Detail view of one session, with metrics and indexes when it has them"""
+    session = store.get_session_by_recording_id(session_id)
     if not session:
         raise HTTPException(status_code=404, detail=f"Session with ID {session_id} not found")
     
@@ -143,24 +353,87 @@ async def get_session_details(session_id: str, db: Session = Depends(get_db)):
     
     return response
 
-@router.get("/hrv/database-stats", response_model=dict)
-async def get_database_stats(db: Session = Depends(get_db)):
+@router.get("/hrv/session/{session_id}", response_model=dict, dependencies=[Depends(admit_read)])
+async def get_session_details(request: Request, session_id: str, store: SessionStore = Depends(get_lazy_read_store)):
+    """Get detailed information for a specific session"""
+    return cached_response(
+        request, ("session", session_id), [f"session:{session_id}"],
+        lambda: session_detail(store, session_id)
+    )
+
+def rr_series(store: SessionStore, session_id: str, **options) -> dict:
+    internal_id = store.get_session_id(session_id)
+    if internal_id is None:
+        raise HTTPException(status_code=404, detail=f"Session with ID {session_id} not found")
+    try:
+        rr = store.get_rr_intervals(internal_id)
+    except ArchiveError as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=503, detail=f"RR series of session {session_id} is archived and cannot be read")
+    return {"recordingSessionId": session_id, **rr_series_view(rr, **options)}
+
+@router.get("/hrv/session/{session_id}/rr", response_model=dict, dependencies=[Depends(admit_read)])
+async def get_session_rr(request: Request, session_id: str,
+                         start: int = Query(0, ge=0),
+                         end: Optional[int] = Query(None, ge=0),
+                         start_s: Optional[float] = Query(None, ge=0),
+                         end_s: Optional[float] = Query(None, ge=0),
+                         points: Optional[int] = Query(None, ge=3, le=MAX_RR_POINTS),
+                         method: str = Query("lttb", regex="^(" + "|".join(DOWNSAMPLE_METHODS) + ")$"),
+                         mask: bool = True,
+                         valid_only: bool = False,
+                         store: SessionStore = Depends(get_lazy_read_store)):
+    """Stored RR intervals for charts: beat or time range, validity mask, optional LTTB/min-max downsampling"""
+    options = dict(start=start, end=end, start_s=start_s, end_s=end_s, points=points, method=method,
+                   mask=mask, valid_only=valid_only)
+    return cached_response(
+        request, ("rr", session_id, *options.values()), [f"session:{session_id}"],
+        lambda: rr_series(store, session_id, **options)
+    )
+
+@router.post("/hrv/session/{session_id}/rr", response_model=dict,
+             openapi_extra={"requestBody": {"required": True, "content": {
+                 "application/json": {"schema": RRChunk.schema()},
+                 "application/msgpack": {"schema": RRChunk.schema()},
+                 BINARY_RR_CONTENT_TYPE: {"schema": {"type": "string", "format": "binary"}}
+             }}})
+async def append_session_rr(request: Request, session_id: str,
+                            admission: Optional[AdmissionTicket] = Depends(admit_ingest),
+                            store: SessionStore = Depends(get_store)):
+    """Append a later part of a recording to a stored session (see app/core/append.py)"""
+    body = await request.body()
+    if request_content_type(request) == BINARY_RR_CONTENT_TYPE:
+        # The header carries the chunk fields (offset, motionArtifacts, final)
+        fields, rr_array = decode_binary_body(request, body)
+    else:
+        try:
+            fields, rr_array = split_rr_intervals(decode_body(request.headers.get("content-type"), body))
+        except RequestDecodeError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+    try:
+        chunk = RRChunk(**fields, rrIntervals=[])
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors())
+    if not len(rr_array):
+        raise HTTPException(status_code=422, detail="rrIntervals must not be empty")
+    set_admission_cost(admission, len(rr_array))
+    
+    try:
+        response = await run_in_threadpool(append_session, session_id, chunk, rr_array, store)
+    except AppendError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return encode_response(request, response)
+
+@router.get("/hrv/database-stats", response_model=dict, dependencies=[Depends(admit_read)])
+async def get_database_stats(request: Request, store: SessionStore = Depends(get_read_store)):
     """Get basic statistics about the database contents"""
-    user_count = db.query(User).count()
-    session_count = db.query(HRVSession).count()
-    device_count = db.query(Device).count()
-    tag_count = db.query(Tag).count()
+    counts = store.counts()
     
     # Get the latest sessions
-    latest_sessions = db.query(HRVSession).order_by(HRVSession.created_at.desc()).limit(5).all()
+    latest_sessions = store.latest_sessions(5)
     
-    return {
-        "stats": {
-            "users": user_count,
-            "sessions": session_count,
-            "devices": device_count,
-            "tags": tag_count
-        },
+    return encode_response(request, {
+        "stats": counts,
         "latest_sessions": [
             {
                 "id": session.id,
@@ -172,7 +445,7 @@ async def get_database_stats(db: Session = Depends(get_db)):
             }
             for session in latest_sessions
         ]
-    }
+    })
 
 
 
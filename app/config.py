@@ -13,6 +13,33 @@ class Settings(BaseSettings):
         "<Your Own DB_URL>"
     )
     
+    # Optional read replica for GET endpoints (defaults to the primary)
+    DATABASE_READ_URL: str = os.getenv("DATABASE_READ_URL", "")
+    # Seconds after an ingest during which replica reads are not cached (replication lag)
+    DATABASE_READ_MAX_LAG: float = float(os.getenv("DATABASE_READ_MAX_LAG", "2"))
+    
+    # Storage backend: "sql" (DATABASE_URL, Postgres or SQLite) or "memory"
+    # (process-local and not persisted; for benchmarks, tests and single-node demos)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "sql").lower()
+    
+    # Applied to sqlite:/// file databases: WAL lets reads run alongside the single writer
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    
+    # User-keyed sharding: comma-separated shard database URLs (empty = no sharding).
+    # DATABASE_URL keeps the job queue and the user -> shard directory.
+    DATABASE_SHARD_URLS: str = os.getenv("DATABASE_SHARD_URLS", "")
+    # Seconds a worker caches a user's shard; the rebalance tool waits this long before deleting moved data
+    SHARD_MAP_CACHE_TTL: float = float(os.getenv("SHARD_MAP_CACHE_TTL", "30"))
+    
+    # Connection pool settings (per engine, per worker process)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "True").lower() == "true"
+    
     # API settings
     API_TITLE: str = "HRV Metrics API"
     API_VERSION: str = "1.0.0"
@@ -24,6 +51,74 @@ class Settings(BaseSettings):
     # App settings
     DEBUG: bool = os.getenv("DEBUG", "True").lower() == "true"
     
+    # Startup settings
+    # AUTO_CREATE_TABLES=False leaves schema management to Alembic (`alembic upgrade head`)
+    AUTO_CREATE_TABLES: bool = os.getenv("AUTO_CREATE_TABLES", "True").lower() == "true"
+    PREWARM_SCIPY: bool = os.getenv("PREWARM_SCIPY", "True").lower() == "true"
+    
+    # Processing profiles per device (see app/core/profiles.py); optional JSON file with extra profiles and rules
+    PROCESSING_PROFILES_FILE: str = os.getenv("PROCESSING_PROFILES_FILE", "")
+    
+    # Windowed analysis ("analysis" in the session body): requests that would compute more windows are rejected
+    MAX_ANALYSIS_WINDOWS: int = int(os.getenv("MAX_ANALYSIS_WINDOWS", "1000"))
+    
+    # Appended RR chunks (POST /api/hrv/session/{id}/rr) recompute spectral and nonlinear metrics once the
+    # cleaned beat count has grown by this fraction since they were last computed, or on the final chunk
+    APPEND_SPECTRAL_GROWTH: float = float(os.getenv("APPEND_SPECTRAL_GROWTH", "0.25"))
+    
+    # Binary ingest settings (limit applies after decompression)
+    MAX_BINARY_PAYLOAD_BYTES: int = int(os.getenv("MAX_BINARY_PAYLOAD_BYTES", str(2 * 1024 * 1024)))
+    
+    # Background job settings (POST /api/hrv/session?async=true)
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "2.0"))
+    JOB_STALE_AFTER: float = float(os.getenv("JOB_STALE_AFTER", "600"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    
+    # Write-behind group commit for ingest (on by default only for SQLite, which has a single writer)
+    WRITE_BEHIND_ENABLED: bool = os.getenv(
+        "WRITE_BEHIND_ENABLED", str(os.getenv("DATABASE_URL", "").startswith("sqlite:"))
+    ).lower() == "true"
+    WRITE_BEHIND_FLUSH_MS: float = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "5"))
+    WRITE_BEHIND_MAX_BATCH: int = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "64"))
+    
+    # Cold RR archive (`python -m app.core.archive run`): series of sessions older than
+    # RR_ARCHIVE_AFTER_DAYS move to compressed files under RR_ARCHIVE_DIR ("zstd" or "gzip")
+    RR_ARCHIVE_DIR: str = os.getenv("RR_ARCHIVE_DIR", "rr_archive")
+    RR_ARCHIVE_AFTER_DAYS: float = float(os.getenv("RR_ARCHIVE_AFTER_DAYS", "90"))
+    RR_ARCHIVE_COMPRESSION: str = os.getenv("RR_ARCHIVE_COMPRESSION", "zstd")
+    
+    # Population percentile sketches (GET /api/hrv/percentiles); pending counts are per worker until flushed
+    SKETCHES_ENABLED: bool = os.getenv("SKETCHES_ENABLED", "True").lower() == "true"
+    SKETCH_FLUSH_SECONDS: float = float(os.getenv("SKETCH_FLUSH_SECONDS", "30"))
+    SKETCH_MAX_SEGMENTS: int = int(os.getenv("SKETCH_MAX_SEGMENTS", "500"))
+    
+    # Admission control: shed load with 503 + Retry-After instead of queueing (per worker)
+    ADMISSION_CONTROL_ENABLED: bool = os.getenv("ADMISSION_CONTROL_ENABLED", "True").lower() == "true"
+    INGEST_MAX_IN_FLIGHT: int = int(os.getenv("INGEST_MAX_IN_FLIGHT", "16"))
+    INGEST_MAX_QUEUED_BEATS: int = int(os.getenv("INGEST_MAX_QUEUED_BEATS", "500000"))
+    INGEST_MAX_QUEUE_DELAY: float = float(os.getenv("INGEST_MAX_QUEUE_DELAY", "5"))
+    INGEST_DEFAULT_BEATS: int = int(os.getenv("INGEST_DEFAULT_BEATS", "3000"))  # without Content-Length
+    READ_MAX_IN_FLIGHT: int = int(os.getenv("READ_MAX_IN_FLIGHT", "64"))
+    
+    # In-process response cache for read endpoints (per worker; TTL bounds staleness across workers)
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "True").lower() == "true"
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+    
+    # Observability settings
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "True").lower() == "true"
+    SLOW_REQUEST_THRESHOLD_MS: float = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "1000"))
+    TRACE_EXPORTER: str = os.getenv("TRACE_EXPORTER", "memory")  # "memory" or "file"
+    TRACE_FILE_PATH: str = os.getenv("TRACE_FILE_PATH", "slow_traces.jsonl")
+    TRACE_BUFFER_SIZE: int = int(os.getenv("TRACE_BUFFER_SIZE", "100"))
+    
+    # Profiling settings (profiling is allowed in DEBUG mode or with ADMIN_TOKEN)
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_SAMPLE_INTERVAL_MS: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "1"))
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -27,5 +27,9 @@ INTERPRETATIONS_MAP = {
     ),
     "Circadian patterning": (
         "Tracks daily HRV rhythm and alignment with biological clocks. Useful for spotting disruption, irregular rest, or phase shifts."
+    ),
+    "Complexity & fractal dynamics": (
+        "Describes how irregular and self-similar the beat-to-beat pattern is. Higher entropy and DFA alpha1 near 1 suggest a healthy, adaptable rhythm; "
+        "low entropy or alpha1 drifting towards 0.5 can indicate fatigue, heavy exertion, or reduced regulatory flexibility."
     )
 }
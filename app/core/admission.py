@@ -0,0 +1,170 @@
+# app/core/admission.py
+"""Admission control for ingest and read endpoints.
+
+Each budget caps the number of requests in flight. The ingest budget also
+tracks the RR beats those requests carry. It estimates the backlog as
+in-flight beats times a measured per-beat processing cost. When a request
+would push either over its limit, it is rejected at once with 503 and
+Retry-After. This happens before the body is read or a DB connection is
+checked out, so the server does not keep queueing work that clients will
+time out on and retry.
+"""
+import math
+import threading
+import time
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Request
+
+from app.config import settings
+from app.core.instrumentation import ADMISSION_IN_FLIGHT, ADMISSION_REJECTED_TOTAL
+from app.core.rr_codec import CONTENT_TYPE as BINARY_RR_CONTENT_TYPE
+
+# Conservative bytes per RR interval for estimating beats from Content-Length
+# before the body is read (JSON "812, " is ~5 bytes, uint16 is 2, varint ~1)
+BYTES_PER_BEAT = {
+    "application/json": 4,
+    "application/msgpack": 3,
+    "application/x-msgpack": 3,
+    BINARY_RR_CONTENT_TYPE: 1,
+}
+DEFAULT_BYTES_PER_BEAT = 4
+# Weight of each new observation in the per-beat processing cost average
+COST_SMOOTHING = 0.2
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    __slots__ = ("controller", "cost", "released")
+
+    def __init__(self, controller: "AdmissionController", cost: float):
+        self.controller = controller
+        self.cost = cost
+        self.released = False
+
+    def set_cost(self, cost: float) -> None:
+        """Replace the up-front estimate once the real size is known"""
+        self.controller.adjust(self, cost)
+
+
+class AdmissionController:
+    """Non-blocking in-flight limiter with an optional cost budget"""
+
+    def __init__(self, name: str, max_in_flight: int, max_cost: float = 0, max_delay: float = 0,
+                 seconds_per_unit: float = 0.0):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_cost = max_cost
+        self.max_delay = max_delay
+        self.seconds_per_unit = seconds_per_unit
+        self.in_flight = 0
+        self.in_flight_cost = 0.0
+        self._lock = threading.Lock()
+        ADMISSION_IN_FLIGHT.set_function(lambda: self.in_flight, name, "requests")
+        ADMISSION_IN_FLIGHT.set_function(lambda: self.in_flight_cost, name, "cost")
+
+    def estimated_delay(self) -> float:
+        """Seconds of work already admitted ahead of a new request"""
+        return self.in_flight_cost * self.seconds_per_unit
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self.estimated_delay()))
+
+    def try_acquire(self, cost: float = 1.0) -> AdmissionTicket:
+        with self._lock:
+            # An idle server always admits, so one oversized request can still run
+            if self.in_flight:
+                if self.in_flight >= self.max_in_flight:
+                    raise AdmissionRejected("in_flight", self._retry_after())
+                if self.max_cost and self.in_flight_cost + cost > self.max_cost:
+                    raise AdmissionRejected("cost", self._retry_after())
+                if self.max_delay and (self.in_flight_cost + cost) * self.seconds_per_unit > self.max_delay:
+                    raise AdmissionRejected("delay", self._retry_after())
+            self.in_flight += 1
+            self.in_flight_cost += cost
+            return AdmissionTicket(self, cost)
+
+    def adjust(self, ticket: AdmissionTicket, cost: float) -> None:
+        with self._lock:
+            if not ticket.released:
+                self.in_flight_cost += cost - ticket.cost
+            ticket.cost = cost
+
+    def release(self, ticket: AdmissionTicket) -> None:
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            self.in_flight -= 1
+            self.in_flight_cost -= ticket.cost
+
+    def observe(self, units: float, seconds: float) -> None:
+        """Fold a measured processing time into the per-unit cost estimate"""
+        if units <= 0:
+            return
+        sample = seconds / units
+        with self._lock:
+            self.seconds_per_unit += COST_SMOOTHING * (sample - self.seconds_per_unit)
+
+
+INGEST_ADMISSION = AdmissionController(
+    "ingest",
+    settings.INGEST_MAX_IN_FLIGHT,
+    max_cost=settings.INGEST_MAX_QUEUED_BEATS,
+    max_delay=settings.INGEST_MAX_QUEUE_DELAY,
+    # Starting point until real sessions have been timed (~5 us per beat)
+    seconds_per_unit=5e-6,
+)
+READ_ADMISSION = AdmissionController("read", settings.READ_MAX_IN_FLIGHT)
+
+
+def estimate_ingest_beats(request: Request) -> float:
+    """RR beats implied by Content-Length; queued jobs do no processing here"""
+    if request.query_params.get("async", "").lower() in ("1", "true", "yes"):
+        return 0.0
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    content_length = request.headers.get("content-length")
+    if not content_length or not content_length.isdigit():
+        return float(settings.INGEST_DEFAULT_BEATS)
+    return int(content_length) / BYTES_PER_BEAT.get(content_type, DEFAULT_BYTES_PER_BEAT)
+
+
+def admission_dependency(controller: AdmissionController, estimate_cost: Callable[[Request], float]):
+    """Build a FastAPI dependency that holds a slot in `controller` for the request"""
+    async def dependency(request: Request):
+        if not settings.ADMISSION_CONTROL_ENABLED:
+            yield None
+            return
+        try:
+            ticket = controller.try_acquire(estimate_cost(request))
+        except AdmissionRejected as e:
+            ADMISSION_REJECTED_TOTAL.inc(controller.name, e.reason)
+            raise HTTPException(
+                status_code=503,
+                detail=f"Server is at capacity for {controller.name} requests, retry later",
+                headers={"Retry-After": str(e.retry_after)},
+            )
+        try:
+            yield ticket
+        finally:
+            controller.release(ticket)
+    return dependency
+
+
+admit_ingest = admission_dependency(INGEST_ADMISSION, estimate_ingest_beats)
+admit_read = admission_dependency(READ_ADMISSION, lambda request: 1.0)
+
+
+def set_admission_cost(ticket: Optional[AdmissionTicket], beats: int) -> None:
+    if ticket is not None:
+        ticket.set_cost(float(beats))
+
+
+def observe_ingest_processing(beats: int, seconds: float) -> None:
+    INGEST_ADMISSION.observe(beats, seconds)
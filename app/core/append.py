@@ -0,0 +1,287 @@
+# app/core/append.py
+"""Appending later parts of a recording to a stored session.
+
+Straps buffer beats, so one recording often arrives in several uploads. The
+first part is ingested as usual (POST /api/hrv/session); each later part goes
+to POST /api/hrv/session/{id}/rr and costs O(part), not O(recording):
+
+- ``hrv_sessions.rr_state`` keeps running integer sums. They cover beats
+  received and in range, statistical outliers removed, and the cleaned series:
+  its count, sum, sum of squares, first and last beat, and successive
+  differences. Validation counters and the time-domain metrics (mean RR, SDNN,
+  RMSSD, pNN50, CV, SD1/SD2) are computed from these sums.
+- New beats are range checked and then filtered against the series so far.
+  The z-score filter uses the running mean and SD (and, like the validator,
+  keeps nothing when the SD is 0). The IQR filter uses the quartile bounds
+  from the last full computation. Beats already kept are not filtered again.
+- The part's RR rows are inserted after the stored ones.
+
+Because earlier beats are not refiltered as the mean, SD or quartiles move,
+the cleaned series can differ by a few beats from what the validator would
+keep over the whole recording. Validation and time-domain metrics between
+full recomputations are therefore close approximations, not exact values.
+
+Spectral and nonlinear metrics (LF/HF, breathing rate, entropies, DFA) need the
+whole series. They keep their last values until the session is recomputed in
+full, which happens:
+
+- on the first append, which builds rr_state from the stored series;
+- on a part marked ``final``;
+- when a session first becomes valid;
+- once the cleaned series has grown by APPEND_SPECTRAL_GROWTH since the last
+  full computation.
+
+A full recomputation runs the ingest pipeline over the whole recording and
+resets rr_state, so every metric is exact again. After the final part, the
+session therefore matches what a single upload of the recording would have
+stored.
+"""
+import math
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.core.indexes import build_metric_indexes
+from app.core.processor import HRVSessionProcessor, get_pipeline
+from app.core.profiles import ProcessingProfile
+from app.core.validator import MIN_QUALITY_SCORE, iqr_bounds, quality_label, statistical_filter
+from app.models.metadata import SessionMetadata
+from app.models.result import SessionMetrics, ValidationResult
+from app.models.schemas import RawHRVData
+from app.models.sql_models import HRVSession
+
+# Metrics that need the whole series; kept from the last full computation between recomputes
+DEFERRED_METRICS = ("lfPower", "hfPower", "lfHfRatio", "breathingRate", "sampleEntropy", "approxEntropy",
+                    "dfaAlpha1", "dfaAlpha2")
+
+EMPTY_STATE = {
+    "raw": 0,  # beats received
+    "in_range": 0, "range_sum": 0, "range_sumsq": 0,  # beats within the profile's RR range
+    "filtered": 0,  # in-range beats removed by the statistical filter
+    "bounds": None,  # IQR filter bounds from the last full computation
+    "n": 0, "sum": 0, "sumsq": 0, "first": None, "last": None,  # cleaned series
+    "diff_sumsq": 0, "nn50": 0,  # its successive differences
+    "spectral_count": 0, "deferred": None  # cleaned beats and DEFERRED_METRICS at the last full computation
+}
+
+
+class AppendError(ValueError):
+    """Chunk cannot be appended (maps to HTTP 404/409)"""
+
+    def __init__(self, message: str, status_code: int = 409):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AppendPlan(NamedTuple):
+    """A session's new state after an append, computed before anything is written"""
+    metadata: SessionMetadata
+    metrics: Optional[SessionMetrics]
+    indexes: Optional[Dict[str, Any]]
+    state: Dict[str, Any]
+    was_valid: bool
+    recomputed: bool
+
+
+def check_offset(recording_session_id: str, offset: Optional[int], beats: int) -> None:
+    """A chunk sent with an offset must start right after the stored beats (a retried chunk does not)"""
+    if offset is not None and offset != beats:
+        raise AppendError(f"Session {recording_session_id} has {beats} RR intervals, chunk starts at {offset}")
+
+
+def _add_in_range(state: Dict[str, Any], received: int, in_range: np.ndarray) -> Dict[str, Any]:
+    state = dict(state)
+    state["raw"] += received
+    state["in_range"] += int(in_range.size)
+    state["range_sum"] += int(in_range.sum())
+    state["range_sumsq"] += int(np.dot(in_range, in_range))
+    return state
+
+
+def _add_cleaned(state: Dict[str, Any], in_range: np.ndarray, kept: np.ndarray) -> Dict[str, Any]:
+    state["filtered"] += int(in_range.size - kept.size)
+    if not kept.size:
+        return state
+    # The first kept beat follows the last kept beat of the series so far
+    series = kept if state["last"] is None else np.concatenate(([state["last"]], kept))
+    diffs = np.diff(series)
+    state["diff_sumsq"] += int(np.dot(diffs, diffs))
+    state["nn50"] += int(np.count_nonzero(np.abs(diffs) > 50))
+    if state["first"] is None:
+        state["first"] = int(kept[0])
+    state["last"] = int(kept[-1])
+    state["n"] += int(kept.size)
+    state["sum"] += int(kept.sum())
+    state["sumsq"] += int(np.dot(kept, kept))
+    return state
+
+
+def _in_range(rr: np.ndarray, profile: ProcessingProfile) -> np.ndarray:
+    return rr[(rr >= profile.min_rr) & (rr <= profile.max_rr)]
+
+
+def _keep(in_range: np.ndarray, state: Dict[str, Any], profile: ProcessingProfile) -> np.ndarray:
+    """Chunk beats the profile's filter keeps, judged against the series so far (chunk included)"""
+    if not in_range.size:
+        return in_range
+    if profile.filter_method == "zscore":
+        n = state["in_range"]
+        sd = math.sqrt(max(n * state["range_sumsq"] - state["range_sum"] ** 2, 0)) / n
+        if sd == 0:
+            # The validator's z-scores are all NaN then, so it keeps no beat
+            return in_range[:0]
+        return in_range[np.abs((in_range - state["range_sum"] / n) / sd) <= profile.zscore_threshold]
+    if profile.filter_method == "iqr" and state["bounds"]:
+        low, high = state["bounds"]
+        return in_range[(in_range >= low) & (in_range <= high)]
+    return in_range
+
+
+def series_state(rr: np.ndarray, profile: ProcessingProfile, metrics: Optional[SessionMetrics] = None) -> Dict[str, Any]:
+    """rr_state for a whole series, filtered like the validator; metrics of a full computation set the deferred values"""
+    rr = np.asarray(rr, dtype=np.int64)
+    in_range = _in_range(rr, profile)
+    state = _add_in_range(EMPTY_STATE, int(rr.size), in_range)
+    state = _add_cleaned(state, in_range, statistical_filter(in_range, profile) if in_range.size else in_range)
+    if profile.filter_method == "iqr" and in_range.size:
+        state["bounds"] = [float(bound) for bound in iqr_bounds(in_range, profile)]
+    if metrics is not None:
+        state["spectral_count"] = int(metrics.rr_count)
+        state["deferred"] = {name: None if metrics[name] is None else float(metrics[name]) for name in DEFERRED_METRICS}
+    return state
+
+
+def add_chunk(state: Dict[str, Any], chunk: np.ndarray, profile: ProcessingProfile) -> Dict[str, Any]:
+    """rr_state with chunk appended, in O(len(chunk))"""
+    chunk = np.asarray(chunk, dtype=np.int64)
+    in_range = _in_range(chunk, profile)
+    state = _add_in_range(state, int(chunk.size), in_range)
+    return _add_cleaned(state, in_range, _keep(in_range, state, profile))
+
+
+def state_validation(state: Dict[str, Any], profile: ProcessingProfile, motion_artifacts: bool) -> ValidationResult:
+    """HRVValidator's verdict from the running counts"""
+    if motion_artifacts:
+        return ValidationResult(valid=False, reason="Motion artifact detected", filter_method=profile.filter_method,
+                                processing_profile=profile.name)
+    reasons = []
+    raw = state["raw"]
+    valid_rr_percentage = state["in_range"] / raw * 100 if raw else 100.0
+    if state["in_range"] < profile.min_rr_count:
+        reasons.append("Too few valid RR intervals")
+    if valid_rr_percentage < profile.min_valid_percentage:
+        reasons.append("Low valid RR percentage")
+    outlier_count = raw - state["in_range"] + state["filtered"]
+    quality_score = 1 - outlier_count / raw if raw else 1.0
+    if quality_score < MIN_QUALITY_SCORE:
+        reasons.append("Poor quality score")
+    return ValidationResult(
+        valid=not reasons,
+        reason=" + ".join(reasons) if reasons else None,
+        quality_score=quality_score,
+        quality_label=quality_label(quality_score),
+        filter_method=profile.filter_method,
+        processing_profile=profile.name,
+        outlier_count=outlier_count,
+        valid_rr_percentage=valid_rr_percentage
+    )
+
+
+def state_metrics(state: Dict[str, Any], validation: ValidationResult, heart_rate: Optional[int],
+                  motion_artifacts: bool) -> SessionMetrics:
+    """Time-domain and Poincaré metrics from the running sums, deferred metrics from the last full computation"""
+    n, diffs = state["n"], state["n"] - 1
+    # Integer sums keep these exact up to the final division
+    variance = (n * state["sumsq"] - state["sum"] ** 2) / n ** 2
+    mean_rr = state["sum"] / n
+    sdnn = math.sqrt(max(variance, 0.0))
+    values = {"mean_rr": mean_rr, "sdnn": sdnn, "cv_rr": sdnn / mean_rr * 100, "rr_count": n,
+              "rmssd": None, "pnn50": None}
+    if diffs:
+        values["rmssd"] = math.sqrt(state["diff_sumsq"] / diffs)
+        values["pnn50"] = state["nn50"] / diffs * 100
+    if n >= 3:
+        # Sum of successive differences telescopes to last - first
+        diff_variance = (diffs * state["diff_sumsq"] - (state["last"] - state["first"]) ** 2) / diffs ** 2
+        values["sd1"] = math.sqrt(max(diff_variance, 0.0) / 2)
+        values["sd2"] = math.sqrt(max(2 * variance - diff_variance / 2, 0.0))
+        values["sd1Sd2Ratio"] = values["sd1"] / values["sd2"] if values["sd2"] else None
+    values.update(state["deferred"] or {})
+    return SessionMetrics(
+        values,
+        heartRate=float(heart_rate) if heart_rate is not None else None,
+        motionArtifacts=motion_artifacts,
+        valid_rr_percentage=validation.valid_rr_percentage,
+        quality_score=validation.quality_score,
+        outlier_count=validation.outlier_count,
+        filter_method=validation.filter_method
+    )
+
+
+def _metadata(session: HRVSession, validation: ValidationResult, motion_artifacts: bool) -> SessionMetadata:
+    return SessionMetadata(
+        validation,
+        timestamp=session.timestamp.isoformat() if session.timestamp else None,
+        recordingSessionId=session.recording_session_id,
+        user_id=session.user_id,
+        device_info={"model": session.device.model, "firmwareVersion": session.device.firmware_version},
+        tags=[tag.name for tag in session.tags],
+        motionArtifacts=motion_artifacts
+    )
+
+
+def recompute(session: HRVSession, rr: np.ndarray, motion_artifacts: bool) -> AppendPlan:
+    """Run the ingest pipeline over the whole recording"""
+    raw_data = RawHRVData(
+        user_id=session.user_id,
+        device_info={"model": session.device.model, "firmwareVersion": session.device.firmware_version},
+        recordingSessionId=session.recording_session_id,
+        timestamp=session.timestamp.isoformat() if session.timestamp else "",
+        rrIntervals=[],
+        heartRate=session.heart_rate,
+        motionArtifacts=motion_artifacts,
+        tags=[tag.name for tag in session.tags]
+    )
+    raw_data.rrIntervals = rr
+    processor = HRVSessionProcessor(raw_data)
+    if processor.validate():
+        processor.compute_metrics()
+        processor.build_indexes()
+    return AppendPlan(
+        metadata=processor.metadata,
+        metrics=processor.metrics,
+        indexes=processor.indexes,
+        state=series_state(rr, processor.pipeline.profile, processor.metrics),
+        was_valid=bool(session.valid),
+        recomputed=True
+    )
+
+
+def plan_append(session: HRVSession, chunk: np.ndarray, motion_artifacts: bool, final: bool,
+                read_rr: Callable[[], np.ndarray]) -> AppendPlan:
+    """The session with chunk appended; calls read_rr (the stored series) only for a full recomputation"""
+    profile = get_pipeline({"model": session.device.model, "firmwareVersion": session.device.firmware_version}).profile
+    motion_artifacts = bool(session.motion_artifacts or motion_artifacts)
+    stored = None
+    state = session.rr_state
+    if state is None:
+        stored = read_rr()
+        state = series_state(stored, profile)
+    state = add_chunk(state, chunk, profile)
+    validation = state_validation(state, profile, motion_artifacts)
+
+    grown = state["n"] >= state["spectral_count"] * (1 + settings.APPEND_SPECTRAL_GROWTH)
+    if validation.valid and (final or state["deferred"] is None or grown):
+        rr = np.concatenate((read_rr() if stored is None else stored, np.asarray(chunk, dtype=np.int64)))
+        return recompute(session, rr, motion_artifacts)
+
+    metrics = state_metrics(state, validation, session.heart_rate, motion_artifacts) if validation.valid else None
+    return AppendPlan(
+        metadata=_metadata(session, validation, motion_artifacts),
+        metrics=metrics,
+        indexes=build_metric_indexes(metrics) if metrics is not None else None,
+        state=state,
+        was_valid=bool(session.valid),
+        recomputed=False
+    )
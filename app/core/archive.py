@@ -0,0 +1,258 @@
+# app/core/archive.py
+"""Cold archive of RR series.
+
+RR rows are most of the database but are rarely read once metrics exist.
+The archival job moves the series of sessions older than RR_ARCHIVE_AFTER_DAYS
+out of rr_intervals into one compressed file per session. The files are
+partitioned by month of the session start:
+
+    RR_ARCHIVE_DIR/2025/03/<session id>.rr.zst
+
+A file is a binary RR payload (see rr_codec): a JSON header naming the
+session, then varint-delta RR values, zstd compressed (gzip without the
+optional ``zstandard`` package). That is about 1 byte per beat instead of a
+row per beat. Series with a jump too large for a varint delta (a garbage
+beat) are stored as int32 instead. ``hrv_sessions.rr_archive`` keeps the file's path relative to
+RR_ARCHIVE_DIR. SQLSessionStore.get_rr_intervals reads the file when a
+session has no RR rows, so the RR endpoint serves archived sessions
+unchanged.
+
+The job writes a file and reads it back, then sets the pointer and deletes
+the rows in one transaction, one batch of sessions at a time, oldest month first. An
+interrupted run leaves at most an unreferenced file, which the next run
+overwrites. A session whose file does not read back as its rows keeps its
+rows and is logged. Run it from cron on a host that shares RR_ARCHIVE_DIR with the
+API workers:
+
+    python -m app.core.archive run [--older-than-days 90] [--batch-size 100]
+    python -m app.core.archive status
+    python -m app.core.archive restore <session id> ...
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.database import SessionLocal, ShardSessionLocals
+from app.core.rr_codec import PayloadError, decode_payload, decompress, encode_payload, varint_delta_fits
+from app.models.sql_models import HRVSession, RRInterval, generate_uuid
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIXES = {"zstd": ".rr.zst", "gzip": ".rr.gz"}
+# A night at 1 byte per beat is ~50 KB; refuse to inflate anything absurd
+MAX_ARCHIVE_BYTES = 64 * 1024 * 1024
+INT32_RANGE = (-2 ** 31, 2 ** 31 - 1)
+
+
+class ArchiveError(Exception):
+    """An RR series that cannot be archived, or an archive file that cannot be read"""
+
+
+def archive_compression() -> str:
+    """RR_ARCHIVE_COMPRESSION, falling back to gzip when zstandard is not installed"""
+    if settings.RR_ARCHIVE_COMPRESSION == "zstd":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            logger.warning("zstandard is not installed; archiving RR series with gzip")
+            return "gzip"
+    return settings.RR_ARCHIVE_COMPRESSION
+
+
+def archive_path(session: HRVSession, compression: str) -> str:
+    """Path relative to RR_ARCHIVE_DIR: one directory per month of session start"""
+    timestamp = session.timestamp or session.created_at
+    return f"{timestamp:%Y}/{timestamp:%m}/{session.id}{ARCHIVE_SUFFIXES[compression]}"
+
+
+def write_archive(root: str, path: str, session: HRVSession, rr: np.ndarray, compression: str) -> None:
+    header = {
+        "session_id": session.id,
+        "recordingSessionId": session.recording_session_id,
+        "timestamp": session.timestamp.isoformat() if session.timestamp else None
+    }
+    full_path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    if varint_delta_fits(rr):
+        encoding = "varint-delta"
+    elif not rr.size or INT32_RANGE[0] <= rr.min() and rr.max() <= INT32_RANGE[1]:
+        encoding = "int32"
+    else:
+        raise ArchiveError(f"Session {session.id} has RR values outside the int32 range")
+    # Readers never see a partial file
+    temporary = f"{full_path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(encode_payload(header, rr, encoding=encoding, compression=compression))
+    os.replace(temporary, full_path)
+
+
+def read_archive(path: str, root: Optional[str] = None) -> np.ndarray:
+    """RR series stored at `path` (relative to RR_ARCHIVE_DIR); raises ArchiveError when it cannot be read"""
+    try:
+        with open(os.path.join(root or settings.RR_ARCHIVE_DIR, path), "rb") as f:
+            body = f.read()
+        compression = next(name for name, suffix in ARCHIVE_SUFFIXES.items() if path.endswith(suffix))
+        _, rr = decode_payload(decompress(body, compression, MAX_ARCHIVE_BYTES))
+    except (OSError, StopIteration, PayloadError) as e:
+        raise ArchiveError(f"Cannot read RR archive {path}: {e}") from e
+    return rr.astype(np.int64)
+
+
+def archive_batch(db: Session, root: str, cutoff: datetime, batch_size: int, compression: str,
+                  failed: Optional[Set[str]] = None) -> Dict[str, int]:
+    """Archive up to batch_size of the oldest unarchived sessions that started before cutoff.
+
+    Sessions that cannot be archived are added to `failed` (and skipped by
+    later batches) and keep their rows.
+    """
+    failed = set() if failed is None else failed
+    query = db.query(HRVSession).filter(HRVSession.timestamp < cutoff, HRVSession.rr_archive.is_(None))
+    if failed:
+        query = query.filter(HRVSession.id.notin_(failed))
+    sessions = (
+        query
+        .order_by(HRVSession.timestamp, HRVSession.id)
+        .limit(batch_size)
+        .all()
+    )
+    if not sessions:
+        return {"sessions": 0, "beats": 0, "bytes": 0, "failed": 0}
+
+    ids = [session.id for session in sessions]
+    values: Dict[str, List[int]] = {session_id: [] for session_id in ids}
+    rows = db.execute(
+        select(RRInterval.session_id, RRInterval.value)
+        .where(RRInterval.session_id.in_(ids))
+        .order_by(RRInterval.session_id, RRInterval.position)
+    )
+    for session_id, value in rows:
+        values[session_id].append(value)
+
+    beats = written = 0
+    archived = []
+    for session in sessions:
+        path = archive_path(session, compression)
+        rr = np.asarray(values[session.id], dtype=np.int64)
+        try:
+            write_archive(root, path, session, rr, compression)
+            # Rows are deleted only for a file that reads back as exactly these values
+            if not np.array_equal(read_archive(path, root), rr):
+                raise ArchiveError(f"Archive of session {session.id} does not read back as its RR rows")
+        except (ArchiveError, OSError) as e:
+            logger.error(f"Not archiving session {session.id}: {e}")
+            if os.path.exists(os.path.join(root, path)):
+                os.remove(os.path.join(root, path))
+            failed.add(session.id)
+            continue
+        session.rr_archive = path
+        archived.append(session.id)
+        beats += rr.size
+        written += os.path.getsize(os.path.join(root, path))
+    if archived:
+        db.execute(delete(RRInterval).where(RRInterval.session_id.in_(archived)))
+    db.commit()
+    return {"sessions": len(archived), "beats": beats, "bytes": written, "failed": len(sessions) - len(archived)}
+
+
+def archive_sessions(db: Session, root: str, older_than: timedelta, batch_size: int = 100,
+                     max_sessions: Optional[int] = None) -> Dict[str, int]:
+    """Archive every session older than `older_than` (or the first max_sessions of them)"""
+    cutoff = datetime.utcnow() - older_than
+    compression = archive_compression()
+    totals = {"sessions": 0, "beats": 0, "bytes": 0, "failed": 0}
+    failed: Set[str] = set()
+    while max_sessions is None or totals["sessions"] < max_sessions:
+        limit = batch_size if max_sessions is None else min(batch_size, max_sessions - totals["sessions"])
+        stats = archive_batch(db, root, cutoff, limit, compression, failed)
+        if not stats["sessions"] and not stats["failed"]:
+            break
+        for key, value in stats.items():
+            totals[key] += value
+        logger.info(f"Archived {totals['sessions']} sessions ({totals['beats']} beats) so far")
+    return totals
+
+
+def restore_sessions(db: Session, root: str, session_ids: List[str]) -> int:
+    """Move archived RR series back into rr_intervals; returns the sessions restored"""
+    sessions = db.query(HRVSession).filter(HRVSession.id.in_(session_ids), HRVSession.rr_archive.isnot(None)).all()
+    paths = []
+    for session in sessions:
+        rr = read_archive(session.rr_archive, root)
+        if rr.size:
+            db.execute(insert(RRInterval), [
+                {"id": generate_uuid(), "session_id": session.id, "position": position, "value": int(value)}
+                for position, value in enumerate(rr.tolist())
+            ])
+        paths.append(session.rr_archive)
+        session.rr_archive = None
+    db.commit()
+    # Files go only once the rows are committed
+    for path in paths:
+        os.remove(os.path.join(root, path))
+    return len(sessions)
+
+
+def partition_status(db: Session) -> List[Dict[str, object]]:
+    """Sessions per month of session start, and how many of them are archived"""
+    month = func.strftime("%Y-%m", HRVSession.timestamp) if db.bind.dialect.name == "sqlite" else \
+        func.to_char(HRVSession.timestamp, "YYYY-MM")
+    rows = (
+        db.query(month, func.count(HRVSession.id), func.count(HRVSession.rr_archive))
+        .group_by(month)
+        .order_by(month)
+        .all()
+    )
+    return [{"month": name, "sessions": total, "archived": archived} for name, total, archived in rows]
+
+
+def databases() -> List[Session]:
+    """Sessions for every database holding session data (the shards, when sharded)"""
+    if ShardSessionLocals:
+        return [session_local() for session_local in ShardSessionLocals]
+    return [SessionLocal()]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="Archive RR series of old sessions")
+    run.add_argument("--older-than-days", type=float, default=settings.RR_ARCHIVE_AFTER_DAYS)
+    run.add_argument("--batch-size", type=int, default=100)
+    run.add_argument("--max-sessions", type=int, default=None)
+    commands.add_parser("status", help="Archived sessions per month")
+    restore = commands.add_parser("restore", help="Move archived RR series back into the database")
+    restore.add_argument("session_ids", nargs="+")
+    args = parser.parse_args()
+
+    root = settings.RR_ARCHIVE_DIR
+    for db in databases():
+        try:
+            if args.command == "run":
+                totals = archive_sessions(db, root, timedelta(days=args.older_than_days), args.batch_size,
+                                          args.max_sessions)
+                ratio = totals["bytes"] / totals["beats"] if totals["beats"] else 0.0
+                print(f"{db.bind.url.render_as_string()}: archived {totals['sessions']} sessions, "
+                      f"{totals['beats']} beats in {totals['bytes']} bytes ({ratio:.2f} bytes/beat), "
+                      f"{totals['failed']} failed")
+            elif args.command == "status":
+                print(f"{db.bind.url.render_as_string()}")
+                print(f"  {'month':<8} {'sessions':>9} {'archived':>9}")
+                for partition in partition_status(db):
+                    print(f"  {partition['month'] or '-':<8} {partition['sessions']:>9} {partition['archived']:>9}")
+            else:
+                print(f"{db.bind.url.render_as_string()}: restored {restore_sessions(db, root, args.session_ids)} sessions")
+        finally:
+            db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+# app/core/circadian.py
+"""Per-user circadian profiles from incrementally maintained time-of-day bins.
+
+Each user summary keeps one bin per hour of the week (7 x 24, UTC, by session
+start). A bin holds the session count and, for each CIRCADIAN_METRICS value,
+its sum, sum of squares and count. Ingest adds a session to one bin, which is
+O(1) however long the history. GET /api/hrv/users/{user_id}/circadian folds
+the bins into a 24-hour and a weekday profile in the caller's time zone.
+
+The same sums are sufficient statistics for a cosinor fit:
+
+    y(t) = MESOR + amplitude * cos(2 * pi * (t - acrophase) / 24)
+
+The fit is least squares over every session, each placed at the centre of its
+hour, so it needs no pass over the history either.
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from scipy import stats
+
+# Circadian patterning metrics (as in build_metric_indexes); heartRate comes from the session row
+CIRCADIAN_METRICS = ("mean_rr", "hfPower", "breathingRate", "heartRate")
+HOURS = 24
+WEEK_HOURS = 7 * HOURS
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+# A cosinor fit has three parameters; require residual degrees of freedom and spread over the day
+MIN_COSINOR_SESSIONS = 4
+MIN_COSINOR_HOURS = 3
+
+
+def _metric_bins() -> Dict[str, list]:
+    return {"sum": [0.0] * WEEK_HOURS, "sumsq": [0.0] * WEEK_HOURS, "count": [0] * WEEK_HOURS}
+
+
+def empty_bins() -> Dict[str, Any]:
+    return {"sessions": [0] * WEEK_HOURS, "metrics": {name: _metric_bins() for name in CIRCADIAN_METRICS}}
+
+
+def add_session(bins: Optional[Dict[str, Any]], timestamp, values: Dict[str, Any], weight: int = 1) -> Dict[str, Any]:
+    """Bins with one more session (naive UTC start time), or one fewer with weight=-1; returns a copy for the JSON column"""
+    bins = bins or empty_bins()
+    slot = timestamp.weekday() * HOURS + timestamp.hour
+    updated = {
+        "sessions": list(bins["sessions"]),
+        "metrics": {name: {key: list(column) for key, column in metric.items()}
+                    for name, metric in bins["metrics"].items()}
+    }
+    updated["sessions"][slot] += weight
+    for name in CIRCADIAN_METRICS:
+        value = values.get(name)
+        if value is None:
+            continue
+        metric = updated["metrics"].setdefault(name, _metric_bins())
+        metric["sum"][slot] += weight * float(value)
+        metric["sumsq"][slot] += weight * float(value) ** 2
+        metric["count"][slot] += weight
+    return updated
+
+
+def _means(total: np.ndarray, count: np.ndarray) -> List[Optional[float]]:
+    return [float(s / n) if n else None for s, n in zip(total, count)]
+
+
+def cosinor(total: np.ndarray, sumsq: np.ndarray, count: np.ndarray) -> Optional[Dict[str, float]]:
+    """24-hour cosinor fit from per-hour sums, sums of squares and counts"""
+    n = count.sum()
+    if n < MIN_COSINOR_SESSIONS or np.count_nonzero(count) < MIN_COSINOR_HOURS:
+        return None
+    angle = 2 * np.pi * (np.arange(HOURS) + 0.5) / HOURS
+    design = np.stack((np.ones(HOURS), np.cos(angle), np.sin(angle)), axis=1)
+    # Normal equations summed over sessions: each hour contributes count copies of its row
+    xtx = design.T @ (design * count[:, None])
+    xty = design.T @ total
+    try:
+        mesor, beta, gamma = np.linalg.solve(xtx, xty)
+    except np.linalg.LinAlgError:
+        return None
+
+    tss = max(sumsq.sum() - total.sum() ** 2 / n, 0.0)
+    rss = min(max(sumsq.sum() - np.dot((mesor, beta, gamma), xty), 0.0), tss)
+    dof = n - 3
+    if tss > 0 and rss > 0:
+        p_value = float(stats.f.sf(((tss - rss) / 2) / (rss / dof), 2, dof))
+    else:
+        p_value = 0.0 if tss > 0 else 1.0
+    return {
+        "mesor": float(mesor),
+        "amplitude": float(np.hypot(beta, gamma)),
+        "acrophase_hour": float(np.arctan2(gamma, beta) % (2 * np.pi) * HOURS / (2 * np.pi)),
+        "r_squared": float(1 - rss / tss) if tss > 0 else 0.0,
+        "p_value": p_value,
+        "sessions": int(n)
+    }
+
+
+def circadian_response(user_id: str, bins: Optional[Dict[str, Any]], utc_offset_minutes: int = 0) -> Dict[str, Any]:
+    """Response for GET /api/hrv/users/{user_id}/circadian.
+
+    Bins are shifted into local time by whole hours (offsets round to the hour).
+    """
+    bins = bins or empty_bins()
+    shift = int(round(utc_offset_minutes / 60))
+
+    def local_week(column) -> np.ndarray:
+        # Week slot i in UTC is slot i + shift in local time
+        return np.roll(np.asarray(column, dtype=np.float64), shift).reshape(7, HOURS)
+
+    sessions = local_week(bins["sessions"])
+    hourly = {"hour": list(range(HOURS)), "sessions": sessions.sum(axis=0).astype(int).tolist()}
+    weekday = {"weekday": list(WEEKDAYS), "sessions": sessions.sum(axis=1).astype(int).tolist()}
+    fits = {}
+    for name in CIRCADIAN_METRICS:
+        metric = bins["metrics"].get(name)
+        if metric is None:
+            hourly[name], weekday[name], fits[name] = [None] * HOURS, [None] * 7, None
+            continue
+        total, sumsq, count = (local_week(metric[key]) for key in ("sum", "sumsq", "count"))
+        hourly[name] = _means(total.sum(axis=0), count.sum(axis=0))
+        weekday[name] = _means(total.sum(axis=1), count.sum(axis=1))
+        fits[name] = cosinor(total.sum(axis=0), sumsq.sum(axis=0), count.sum(axis=0))
+
+    return {
+        "user_id": user_id,
+        "utc_offset_minutes": shift * 60,
+        "sessions": int(sessions.sum()),
+        "hourly": hourly,
+        "weekday": weekday,
+        "cosinor": fits
+    }
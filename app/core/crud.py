@@ -1,11 +1,27 @@
 # app/core/crud.py
-from sqlalchemy.orm import Session
-from typing import List, Dict, Any, Optional
-from app.models.sql_models import User, Device, Tag, HRVSession, HRVMetrics, RRInterval
-from app.models.schemas import RawHRVData, UserCreate, DeviceCreate, TagCreate
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Dict, Any, Optional, Set, Tuple
+from app.models.sql_models import User, Device, Tag, HRVSession, HRVMetrics, RRInterval, HRVJob, UserSummary, session_tags, generate_uuid
+from app.models.schemas import RawHRVData
+from app.core.instrumentation import timed, CRUD_SECONDS
+from app.core.summaries import apply_session, new_summary, replace_session, session_values, stored_metrics
+from app.core.append import AppendError, AppendPlan, check_offset, plan_append
+from app.core.session_query import Range, TagFilter, needs_metrics, range_clauses, tag_clauses
 from datetime import datetime
-import uuid
+import numpy as np
 
+def commit_or_rollback(db: Session) -> bool:
+    """Commit a get-or-create insert; False if a concurrent request inserted the same row first"""
+    try:
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
+
+@timed(CRUD_SECONDS)
 def get_or_create_user(db: Session, email: str) -> User:
     """Get a user by email (used as user_id) or create if not exists"""
     # First check if user exists with this email
@@ -22,11 +38,14 @@ def get_or_create_user(db: Session, email: str) -> User:
             email=email
         )
         db.add(user)
-        db.commit()
+        if not commit_or_rollback(db):
+            # Created concurrently by another request
+            return db.query(User).filter(User.email == email).one()
         db.refresh(user)
     
     return user
 
+@timed(CRUD_SECONDS)
 def get_or_create_device(db: Session, device_info: Dict[str, str]) -> Device:
     """Get a device by model and firmware version or create if not exists"""
     device = db.query(Device).filter(
@@ -40,11 +59,16 @@ def get_or_create_device(db: Session, device_info: Dict[str, str]) -> Device:
             firmware_version=device_info.get("firmwareVersion")
         )
         db.add(device)
-        db.commit()
+        if not commit_or_rollback(db):
+            return db.query(Device).filter(
+                Device.model == device_info.get("model"),
+                Device.firmware_version == device_info.get("firmwareVersion")
+            ).one()
         db.refresh(device)
     
     return device
 
+@timed(CRUD_SECONDS)
 def get_or_create_tags(db: Session, tag_names: List[str]) -> List[Tag]:
     """Get or create tags from a list of tag names"""
     tags = []
@@ -53,103 +77,379 @@ def get_or_create_tags(db: Session, tag_names: List[str]) -> List[Tag]:
         if not tag:
             tag = Tag(name=tag_name)
             db.add(tag)
-            db.commit()
-            db.refresh(tag)
+            if not commit_or_rollback(db):
+                tag = db.query(Tag).filter(Tag.name == tag_name).one()
+            else:
+                db.refresh(tag)
         tags.append(tag)
     return tags
 
-def create_hrv_session(db: Session, raw_data: RawHRVData, valid: bool, validation_result: Dict) -> HRVSession:
-    """Create a new HRV session record"""
-    # Get or create related entities
-    user = get_or_create_user(db, raw_data.user_id)
-    device = get_or_create_device(db, raw_data.device_info)
-    tags = get_or_create_tags(db, raw_data.tags)
-    
-    # Parse timestamp
+def parse_timestamp(value: str) -> datetime:
+    """Parse an ISO-8601 timestamp, falling back to the current time"""
     try:
-        timestamp = datetime.fromisoformat(raw_data.timestamp.replace('Z', '+00:00'))
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
     except ValueError:
-        # Fallback to current time if parsing fails
-        timestamp = datetime.utcnow()
+        return datetime.utcnow()
+
+def build_session_row(entry: Dict[str, Any], session_id: str, device_id: str) -> Dict[str, Any]:
+    """hrv_sessions column values for one processed session entry"""
+    raw_data = entry["raw_data"]
+    validation_result = entry["validation_result"]
+    return {
+        "id": session_id,
+        "recording_session_id": raw_data.recordingSessionId,
+        "timestamp": parse_timestamp(raw_data.timestamp),
+        "user_id": raw_data.user_id,
+        "device_id": device_id,
+        "heart_rate": raw_data.heartRate,
+        "motion_artifacts": raw_data.motionArtifacts,
+        "valid": entry["valid"],
+        "reason": validation_result.reason,
+        "quality_score": validation_result.quality_score,
+        "quality_label": validation_result.quality_label,
+        "filter_method": validation_result.filter_method,
+        "outlier_count": validation_result.outlier_count,
+        "valid_rr_percentage": validation_result.valid_rr_percentage
+    }
+
+def build_metrics_row(entry: Dict[str, Any], session_id: str) -> Dict[str, Any]:
+    """hrv_metrics column values for a valid session entry"""
+    metrics = entry["metrics"]
+    return {
+        "id": generate_uuid(),
+        "session_id": session_id,
+        "mean_rr": metrics.mean_rr,
+        "sdnn": metrics.sdnn,
+        "rmssd": metrics.rmssd,
+        "pnn50": metrics.pnn50,
+        "cv_rr": metrics.cv_rr,
+        "rr_count": metrics.rr_count,
+        "lf_power": metrics.lfPower,
+        "hf_power": metrics.hfPower,
+        "lf_hf_ratio": metrics.lfHfRatio,
+        "breathing_rate": metrics.breathingRate,
+        "indexes": entry.get("indexes", {})
+    }
+
+@timed(CRUD_SECONDS)
+def create_hrv_sessions_bulk(db: Session, entries: List[Dict[str, Any]]) -> List[str]:
+    """Store several processed sessions in one transaction using multi-row inserts.
     
-    # Create the session
-    session = HRVSession(
-        recording_session_id=raw_data.recordingSessionId,
-        timestamp=timestamp,
-        user_id=user.id,
-        device_id=device.id,
-        heart_rate=raw_data.heartRate,
-        motion_artifacts=raw_data.motionArtifacts,
-        valid=valid,
-        reason=validation_result.get("reason"),
-        quality_score=validation_result.get("quality_score", 1.0),
-        quality_label=validation_result.get("quality_label", "excellent"),
-        filter_method=validation_result.get("filter_method", "zscore"),
-        outlier_count=validation_result.get("outlier_count", 0),
-        valid_rr_percentage=validation_result.get("valid_rr_percentage", 100.0)
-    )
+    Each entry holds raw_data, valid, validation_result and, for valid sessions,
+    metrics (a SessionMetrics record) and indexes. Returns the new session ids
+    in entry order. Nothing is committed if any row fails.
+    """
+    # Resolve users, devices and tags for the whole batch with one lookup each
+    emails = {entry["raw_data"].user_id for entry in entries}
+    known_users = {row.id for row in db.query(User.id).filter(User.id.in_(emails))}
+    new_users = [
+        {"id": email, "username": email.split('@')[0], "email": email}
+        for email in emails - known_users
+    ]
+    if new_users:
+        db.execute(insert(User), new_users)
     
-    # Add tags
-    session.tags = tags
+    # Lock the users' summary rows for the rest of the transaction
+    summaries = {
+        summary.user_id: summary
+        for summary in db.query(UserSummary).filter(UserSummary.user_id.in_(emails)).with_for_update()
+    }
+    for email in emails - summaries.keys():
+        # Users from before summaries existed are rebuilt from their stored sessions
+        summaries[email] = build_user_summary(db, email) if email in known_users else new_summary(email)
+        db.add(summaries[email])
     
-    # Add to database
-    db.add(session)
-    db.commit()
-    db.refresh(session)
-    
-    # Add RR intervals
-    for i, rr_value in enumerate(raw_data.rrIntervals):
-        rr_interval = RRInterval(
-            session_id=session.id,
-            position=i,
-            value=rr_value,
-            is_valid=True  # Assume all intervals are valid initially
+    device_keys = {
+        (entry["raw_data"].device_info.get("model"), entry["raw_data"].device_info.get("firmwareVersion"))
+        for entry in entries
+    }
+    device_ids = {}
+    models = {model for model, _ in device_keys}
+    model_filter = Device.model.in_(models - {None})
+    if None in models:
+        model_filter = or_(model_filter, Device.model.is_(None))
+    for device in db.query(Device.id, Device.model, Device.firmware_version).filter(model_filter):
+        device_ids.setdefault((device.model, device.firmware_version), device.id)
+    new_devices = [
+        {"id": generate_uuid(), "model": model, "firmware_version": firmware}
+        for model, firmware in device_keys if (model, firmware) not in device_ids
+    ]
+    if new_devices:
+        db.execute(insert(Device), new_devices)
+        device_ids.update({(d["model"], d["firmware_version"]): d["id"] for d in new_devices})
+    
+    tag_names = {name for entry in entries for name in entry["raw_data"].tags}
+    tag_ids = {}
+    if tag_names:
+        tag_ids = {tag.name: tag.id for tag in db.query(Tag.id, Tag.name).filter(Tag.name.in_(tag_names))}
+        new_tags = [{"id": generate_uuid(), "name": name} for name in tag_names - tag_ids.keys()]
+        if new_tags:
+            db.execute(insert(Tag), new_tags)
+            tag_ids.update({t["name"]: t["id"] for t in new_tags})
+    
+    # Build every row up front, then one multi-row INSERT per table
+    session_ids, session_rows, tag_rows, metric_rows, rr_rows = [], [], [], [], []
+    for entry in entries:
+        raw_data = entry["raw_data"]
+        session_id = generate_uuid()
+        session_ids.append(session_id)
+        device_key = (raw_data.device_info.get("model"), raw_data.device_info.get("firmwareVersion"))
+        session_row = build_session_row(entry, session_id, device_ids[device_key])
+        session_rows.append(session_row)
+        tag_rows.extend({"session_id": session_id, "tag_id": tag_ids[name]} for name in dict.fromkeys(raw_data.tags))
+        
+        metrics_dict = entry.get("metrics")
+        apply_session(summaries[raw_data.user_id], session_row, metrics_dict if entry["valid"] else None)
+        if entry["valid"] and metrics_dict:
+            metric_rows.append(build_metrics_row(entry, session_id))
+        
+        rr_rows.extend(
+            {"id": generate_uuid(), "session_id": session_id, "position": i, "value": value, "is_valid": True}
+            for i, value in enumerate(np.asarray(raw_data.rrIntervals).tolist())
         )
-        db.add(rr_interval)
     
+    db.execute(insert(HRVSession), session_rows)
+    if tag_rows:
+        db.execute(insert(session_tags), tag_rows)
+    if metric_rows:
+        db.execute(insert(HRVMetrics), metric_rows)
+    if rr_rows:
+        db.execute(insert(RRInterval), rr_rows)
     db.commit()
     
-    return session
-
-def create_hrv_metrics(db: Session, session_id: str, metrics_dict: Dict[str, Any], indexes: Dict[str, Any]) -> HRVMetrics:
-    """Create HRV metrics record for a session"""
-    metrics = HRVMetrics(
-        session_id=session_id,
-        mean_rr=metrics_dict.get("mean_rr"),
-        sdnn=metrics_dict.get("sdnn"),
-        rmssd=metrics_dict.get("rmssd"),
-        pnn50=metrics_dict.get("pnn50"),
-        cv_rr=metrics_dict.get("cv_rr"),
-        rr_count=metrics_dict.get("rr_count"),
-        lf_power=metrics_dict.get("lfPower"),
-        hf_power=metrics_dict.get("hfPower"),
-        lf_hf_ratio=metrics_dict.get("lfHfRatio"),
-        breathing_rate=metrics_dict.get("breathingRate"),
-        indexes=indexes
+    return session_ids
+
+def apply_append(session: HRVSession, plan: AppendPlan, summary: Optional[UserSummary]) -> None:
+    """Write an append plan into the session, its metrics and the user's summary (the caller stores the RR chunk)"""
+    was_valid = session.valid
+    old_metrics = stored_metrics(session.metrics)
+    metadata = plan.metadata
+    session.valid = metadata.valid
+    session.reason = metadata.reason
+    session.quality_score = metadata.quality_score
+    session.quality_label = metadata.quality_label
+    session.filter_method = metadata.filter_method
+    session.outlier_count = metadata.outlier_count
+    session.valid_rr_percentage = metadata.valid_rr_percentage
+    session.motion_artifacts = metadata.motionArtifacts
+    session.rr_state = plan.state
+    
+    if plan.metrics is None:
+        session.metrics = None
+    else:
+        row = build_metrics_row({"metrics": plan.metrics, "indexes": plan.indexes}, session.id)
+        if session.metrics is None:
+            session.metrics = HRVMetrics(**row, created_at=datetime.utcnow())
+        else:
+            for column, value in row.items():
+                if column not in ("id", "session_id"):
+                    setattr(session.metrics, column, value)
+    
+    if summary is not None:
+        replace_session(summary, session_values(session), was_valid, old_metrics, plan.metrics)
+
+@timed(CRUD_SECONDS)
+def append_rr_chunk(db: Session, recording_session_id: str, rr_chunk: np.ndarray, offset: Optional[int] = None,
+                    motion_artifacts: bool = False, final: bool = False) -> AppendPlan:
+    """Append RR intervals to a stored session, updating it, its metrics and the user's summary in one transaction.
+    
+    The session row is locked first, so concurrent chunks of one recording apply one after the other.
+    """
+    session = (
+        db.query(HRVSession)
+        .filter(HRVSession.recording_session_id == recording_session_id)
+        .with_for_update()
+        .first()
     )
+    if session is None:
+        raise AppendError(f"Session with ID {recording_session_id} not found", status_code=404)
+    if session.rr_archive:
+        raise AppendError(f"Session {recording_session_id} is archived; restore it before appending")
     
-    db.add(metrics)
-    db.commit()
-    db.refresh(metrics)
+    beats = session.rr_state["raw"] if session.rr_state else (
+        db.query(func.count(RRInterval.id)).filter(RRInterval.session_id == session.id).scalar()
+    )
+    check_offset(recording_session_id, offset, beats)
+    plan = plan_append(session, rr_chunk, motion_artifacts, final, lambda: get_rr_values(db, session.id))
     
-    return metrics
+    summary = db.query(UserSummary).filter(UserSummary.user_id == session.user_id).with_for_update().first()
+    apply_append(session, plan, summary)
+    db.execute(insert(RRInterval), [
+        {"id": generate_uuid(), "session_id": session.id, "position": beats + i, "value": value, "is_valid": True}
+        for i, value in enumerate(np.asarray(rr_chunk).tolist())
+    ])
+    db.commit()
+    return plan
 
+@timed(CRUD_SECONDS)
+def build_user_summary(db: Session, user_id: str) -> UserSummary:
+    """Recompute a user's summary from all of their stored sessions"""
+    summary = new_summary(user_id)
+    rows = (
+        db.query(HRVSession, HRVMetrics)
+        .outerjoin(HRVMetrics, HRVMetrics.session_id == HRVSession.id)
+        .filter(HRVSession.user_id == user_id)
+        .order_by(HRVSession.timestamp)
+    )
+    for session, metrics in rows:
+        apply_session(summary, session_values(session), stored_metrics(metrics) if session.valid else None)
+    return summary
+
+def save_user_summary(db: Session, summary: UserSummary) -> bool:
+    """Store a summary rebuilt on read; False when the row could not be written.
+
+    That happens on a read-only replica, or when a concurrent ingest stored
+    the user's summary first. The rebuilt summary is still returned to the
+    caller.
+    """
+    db.add(summary)
+    try:
+        db.commit()
+        return True
+    except SQLAlchemyError:
+        db.rollback()
+        return False
+
+@timed(CRUD_SECONDS)
+def get_user_summary(db: Session, user_id: str) -> Optional[UserSummary]:
+    """Primary-key lookup of a user's summary row"""
+    return db.get(UserSummary, user_id)
+
+@timed(CRUD_SECONDS)
 def get_session_by_recording_id(db: Session, recording_session_id: str) -> Optional[HRVSession]:
     """Get a session by its recording ID"""
     return db.query(HRVSession).filter(HRVSession.recording_session_id == recording_session_id).first()
 
+@timed(CRUD_SECONDS)
+def get_existing_recording_ids(db: Session, recording_session_ids: List[str]) -> Set[str]:
+    """Which of these recording IDs are already stored"""
+    rows = db.query(HRVSession.recording_session_id).filter(HRVSession.recording_session_id.in_(recording_session_ids))
+    return {recording_session_id for (recording_session_id,) in rows}
+
+@timed(CRUD_SECONDS)
 def get_sessions_by_user(db: Session, user_id: str, skip: int = 0, limit: int = 100) -> List[HRVSession]:
     """Get all sessions for a specific user"""
     return db.query(HRVSession).filter(HRVSession.user_id == user_id).offset(skip).limit(limit).all()
 
+@timed(CRUD_SECONDS)
 def get_sessions_by_tag(db: Session, tag_name: str, skip: int = 0, limit: int = 100) -> List[HRVSession]:
     """Get all sessions with a specific tag"""
-    return db.query(HRVSession).join(HRVSession.tags).filter(Tag.name == tag_name).offset(skip).limit(limit).all()
+    return db.query(HRVSession).filter(*tag_clauses(TagFilter(all_of=(tag_name,)))).offset(skip).limit(limit).all()
+
+def session_filter_clauses(ranges: Dict[str, Range], quality_labels: Optional[List[str]] = None,
+                           valid: Optional[bool] = None, tag: Optional[str] = None,
+                           device_model: Optional[str] = None, user_id: Optional[str] = None,
+                           start: Optional[datetime] = None, end: Optional[datetime] = None,
+                           tags: Optional[TagFilter] = None) -> List[Any]:
+    """WHERE clauses for the query_sessions filters"""
+    clauses = range_clauses(ranges)
+    if quality_labels:
+        clauses.append(HRVSession.quality_label.in_(quality_labels))
+    if valid is not None:
+        clauses.append(HRVSession.valid == valid)
+    if user_id is not None:
+        clauses.append(HRVSession.user_id == user_id)
+    if start is not None:
+        clauses.append(HRVSession.timestamp >= start)
+    if end is not None:
+        clauses.append(HRVSession.timestamp < end)
+    if tag is not None:
+        clauses.extend(tag_clauses(TagFilter(all_of=(tag,))))
+    if tags is not None:
+        clauses.extend(tag_clauses(tags))
+    if device_model is not None:
+        clauses.append(HRVSession.device_id.in_(select(Device.id).where(Device.model == device_model)))
+    return clauses
+
+@timed(CRUD_SECONDS)
+def query_sessions(db: Session, ranges: Dict[str, Range], skip: int = 0, limit: int = 100,
+                   **filters: Any) -> List[tuple]:
+    """Sessions matching column filters (see session_filter_clauses), newest first, as (session, metrics) rows.
+    
+    Tag and device filters are IN subqueries so they resolve through the
+    session_tags / devices indexes without multiplying joined rows.
+    """
+    query = db.query(HRVSession, HRVMetrics)
+    if needs_metrics(ranges):
+        query = query.join(HRVMetrics, HRVMetrics.session_id == HRVSession.id)
+    else:
+        query = query.outerjoin(HRVMetrics, HRVMetrics.session_id == HRVSession.id)
+    
+    return (
+        query.filter(*session_filter_clauses(ranges, **filters))
+        .options(selectinload(HRVSession.tags))
+        .order_by(HRVSession.timestamp.desc(), HRVSession.id.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
+@timed(CRUD_SECONDS)
+def tag_facets(db: Session, ranges: Dict[str, Range], **filters: Any) -> Tuple[int, Dict[str, int]]:
+    """Number of sessions matching the query_sessions filters, and how many of them carry each tag"""
+    matching = select(HRVSession.id).where(*session_filter_clauses(ranges, **filters))
+    if needs_metrics(ranges):
+        matching = matching.join(HRVMetrics, HRVMetrics.session_id == HRVSession.id)
+    total = db.execute(select(func.count()).select_from(matching.subquery())).scalar()
+    counts = (
+        db.query(Tag.name, func.count())
+        .select_from(session_tags)
+        .join(Tag, Tag.id == session_tags.c.tag_id)
+        .filter(session_tags.c.session_id.in_(matching))
+        .group_by(Tag.name)
+        .all()
+    )
+    return total, dict(counts)
 
+@timed(CRUD_SECONDS)
+def get_session_id_by_recording_id(db: Session, recording_session_id: str) -> Optional[str]:
+    """Internal id for a recording id, without loading the session"""
+    return db.query(HRVSession.id).filter(HRVSession.recording_session_id == recording_session_id).scalar()
+
+@timed(CRUD_SECONDS)
 def get_metrics_by_session(db: Session, session_id: str) -> Optional[HRVMetrics]:
     """Get metrics for a specific session"""
     return db.query(HRVMetrics).filter(HRVMetrics.session_id == session_id).first()
 
+def get_rr_values(db: Session, session_id: str) -> np.ndarray:
+    """A session's stored RR values in recording order"""
+    # Core rows: ORM row processing dominates for a night-long series
+    statement = select(RRInterval.value).where(RRInterval.session_id == session_id).order_by(RRInterval.position)
+    return np.array(db.connection().execute(statement).scalars().all(), dtype=np.int64)
+
+@timed(CRUD_SECONDS)
 def get_rr_intervals_by_session(db: Session, session_id: str) -> List[RRInterval]:
     """Get all RR intervals for a specific session"""
-    return db.query(RRInterval).filter(RRInterval.session_id == session_id).order_by(RRInterval.position).all()
\ No newline at end of file
+    return db.query(RRInterval).filter(RRInterval.session_id == session_id).order_by(RRInterval.position).all()
+
+@timed(CRUD_SECONDS)
+def create_hrv_job(db: Session, raw_data: RawHRVData) -> HRVJob:
+    """Persist a raw session for background processing"""
+    rr = np.asarray(raw_data.rrIntervals, dtype=np.int64)
+    packed = rr.astype("<i4")
+    if not np.array_equal(packed, rr):
+        # The HTTP layer rejects these with a 422; never store a wrapped value
+        raise ValueError("rrIntervals must be 32-bit integers")
+    job = HRVJob(
+        recording_session_id=raw_data.recordingSessionId,
+        status="queued",
+        payload=raw_data.dict(exclude={"rrIntervals"}),
+        rr_data=packed.tobytes()
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+@timed(CRUD_SECONDS)
+def get_job(db: Session, job_id: str) -> Optional[HRVJob]:
+    """Get a background job by its ID"""
+    return db.query(HRVJob).filter(HRVJob.id == job_id).first()
+
+@timed(CRUD_SECONDS)
+def get_active_job_by_recording_id(db: Session, recording_session_id: str) -> Optional[HRVJob]:
+    """Get a queued or running job for a recording, if any"""
+    return db.query(HRVJob).filter(
+        HRVJob.recording_session_id == recording_session_id,
+        HRVJob.status.in_(["queued", "running"])
+    ).first()
@@ -1,36 +1,158 @@
 # app/core/database.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from fastapi import HTTPException
 import os
+import time
 from dotenv import load_dotenv
+from app.config import settings
+from app.core.instrumentation import (
+    DB_POOL_CHECKOUT_SECONDS,
+    DB_POOL_CHECKOUTS_TOTAL,
+    DB_POOL_CONNECTIONS,
+    DB_POOL_TIMEOUTS_TOTAL
+)
 
 # Load environment variables
 load_dotenv()
 
-# Get database connection details from environment variables
+# Get database connection details from environment variables. The memory
+# storage backend only needs a database for the job queue, so it falls back
+# to in-memory SQLite.
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
-    "<Your Own DB_URL>"
+    "sqlite://" if settings.STORAGE_BACKEND == "memory" else "<Your Own DB_URL>"
 )
 
-# For SQLAlchemy 1.4.x, need to replace postgres:// with postgresql://
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+def normalize_url(url: str) -> str:
+    # For SQLAlchemy 1.4.x, need to replace postgres:// with postgresql://
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
+
+DATABASE_URL = normalize_url(DATABASE_URL)
+DATABASE_READ_URL = normalize_url(settings.DATABASE_READ_URL) or DATABASE_URL
+
+def engine_options(url: str) -> dict:
+    """Explicit pool sizing, pre-ping and recycle settings"""
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING, "pool_recycle": settings.DB_POOL_RECYCLE}
+    parsed = make_url(url)
+    # In-memory SQLite: one connection shared by all threads, or each thread
+    # would see its own empty database
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        options.update(poolclass=StaticPool, connect_args={"check_same_thread": False})
+        return options
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT
+    )
+    return options
+
+def instrument_pool(engine, role: str) -> None:
+    """Export pool occupancy at scrape time and count checkouts"""
+    pool = engine.pool
+    for state, attr in (("size", "size"), ("checked_out", "checkedout"), ("idle", "checkedin")):
+        if hasattr(pool, attr):
+            DB_POOL_CONNECTIONS.set_function(getattr(pool, attr), role, state)
+    if hasattr(pool, "overflow"):
+        # QueuePool.overflow() is negative while the pool is below its size
+        DB_POOL_CONNECTIONS.set_function(lambda: max(pool.overflow(), 0), role, "overflow")
+    
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKOUTS_TOTAL.inc(role)
+
+def configure_sqlite(engine) -> None:
+    """Per-connection pragmas for SQLite: WAL journal, relaxed fsync and a busy timeout"""
+    if engine.dialect.name != "sqlite":
+        return
+    in_memory = engine.url.database in (None, "", ":memory:")
+    
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
 
-# Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+# Create SQLAlchemy engines: writes always go to the primary, GET endpoints
+# read from DATABASE_READ_URL when it is set
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+configure_sqlite(engine)
+instrument_pool(engine, "primary")
+
+if DATABASE_READ_URL != DATABASE_URL:
+    read_engine = create_engine(DATABASE_READ_URL, **engine_options(DATABASE_READ_URL))
+    configure_sqlite(read_engine)
+    instrument_pool(read_engine, "replica")
+else:
+    read_engine = engine
+
+def has_read_replica() -> bool:
+    return read_engine is not engine
+
+# Shard engines for user-keyed sharding (see app/core/sharding.py); a shard
+# URL equal to DATABASE_URL reuses the primary engine
+SHARD_URLS = [normalize_url(url.strip()) for url in settings.DATABASE_SHARD_URLS.split(",") if url.strip()]
+shard_engines = []
+for index, url in enumerate(SHARD_URLS):
+    if url == DATABASE_URL:
+        shard_engines.append(engine)
+        continue
+    shard_engine = create_engine(url, **engine_options(url))
+    configure_sqlite(shard_engine)
+    instrument_pool(shard_engine, f"shard{index}")
+    shard_engines.append(shard_engine)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+ShardSessionLocals = [sessionmaker(autocommit=False, autoflush=False, bind=e) for e in shard_engines]
 
 # Create Base class for models
 Base = declarative_base()
 
-# Database session dependency
+def _checked_out(session_factory, role: str):
+    db = session_factory()
+    # Check the connection out up front so pool wait time is measurable
+    start = time.perf_counter()
+    try:
+        db.connection()
+    except PoolTimeoutError:
+        db.close()
+        DB_POOL_TIMEOUTS_TOTAL.inc(role)
+        raise HTTPException(status_code=503, detail="Database connection pool exhausted", headers={"Retry-After": "1"})
+    DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start, role)
+    return db
+
+# Database session dependency (primary)
 def get_db():
-    db = SessionLocal()
+    db = _checked_out(SessionLocal, "primary")
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Read-only session dependency for GET endpoints (replica when configured)
+def get_read_db():
+    db = _checked_out(ReadSessionLocal, "replica" if has_read_replica() else "primary")
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Read session that connects on first query, for endpoints that can
+# answer from the response cache without touching the database
+def get_lazy_read_db():
+    db = ReadSessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
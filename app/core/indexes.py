@@ -1,5 +1,5 @@
 # app/core/indexes.py
-from app.models.schemas import SessionMetrics
+from app.models.result import SessionMetrics
 from app.constants.interpretations import INTERPRETATIONS_MAP
 
 def interpret(label: str) -> str:
@@ -11,6 +11,7 @@ def build_metric_indexes(metrics: SessionMetrics) -> dict:
             "rmssd": metrics.rmssd,
             "pnn50": metrics.pnn50,
             "hfPower": metrics.hfPower,
+            "sd1": metrics.sd1,
             "Interpretation": interpret("Parasympathetic indicators")
         },
         "Sympathetic influence": {
@@ -24,6 +25,7 @@ def build_metric_indexes(metrics: SessionMetrics) -> dict:
             "lfHfRatio": metrics.lfHfRatio,
             "cv_rr": metrics.cv_rr,
             "mean_rr": metrics.mean_rr,
+            "sd1Sd2Ratio": metrics.sd1Sd2Ratio,
             "Interpretation": interpret("Autonomic balance")
         },
         "Respiratory-linked": {
@@ -36,6 +38,7 @@ def build_metric_indexes(metrics: SessionMetrics) -> dict:
             "cv_rr": metrics.cv_rr,
             "rmssd": metrics.rmssd,
             "pnn50": metrics.pnn50,
+            "sd2": metrics.sd2,
             "Interpretation": interpret("General HRV capacity")
         },
         "Signal Quality & Validity": {
@@ -61,6 +64,7 @@ def build_metric_indexes(metrics: SessionMetrics) -> dict:
             "mean_rr": metrics.mean_rr,
             "quality_score": metrics.quality_score,
             "rr_count": metrics.rr_count,
+            "dfaAlpha1": metrics.dfaAlpha1,
             "Interpretation": interpret("Fatigue / Exhaustion")
         },
         "Circadian patterning": {
@@ -69,5 +73,13 @@ def build_metric_indexes(metrics: SessionMetrics) -> dict:
             "breathingRate": metrics.breathingRate,
             "heartRate": metrics.heartRate,
             "Interpretation": interpret("Circadian patterning")
+        },
+        "Complexity & fractal dynamics": {
+            "sampleEntropy": metrics.sampleEntropy,
+            "approxEntropy": metrics.approxEntropy,
+            "dfaAlpha1": metrics.dfaAlpha1,
+            "dfaAlpha2": metrics.dfaAlpha2,
+            "sd1Sd2Ratio": metrics.sd1Sd2Ratio,
+            "Interpretation": interpret("Complexity & fractal dynamics")
         }
     }
\ No newline at end of file
@@ -0,0 +1,152 @@
+# app/core/ingest.py
+import asyncio
+import time
+from typing import Any, Dict, Tuple
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+from app.models.schemas import RawHRVData, RRChunk
+from app.models.record import SessionRecord
+from app.core.processor import HRVSessionProcessor
+from app.core.instrumentation import RR_COUNT
+from app.core.admission import observe_ingest_processing
+from app.core.write_behind import get_write_behind
+from app.core.response_cache import invalidate_session_reads
+from app.core.sketches import record_metrics, record_session_metrics
+from app.core.storage import SessionStore, StoreConflict
+
+def duplicate_response(raw_data: RawHRVData, session_id: str) -> dict:
+    return {
+        "status": "error",
+        "message": f"Session with ID {raw_data.recordingSessionId} already exists",
+        "data": {"session_id": session_id}
+    }
+
+def process_session(raw_data: RawHRVData) -> Tuple[HRVSessionProcessor, bool, Dict[str, Any]]:
+    """Run the processing pipeline and record RR-count metrics"""
+    processor = HRVSessionProcessor(raw_data)
+    start = time.perf_counter()
+    valid, result = processor.process()
+    observe_ingest_processing(len(raw_data.rrIntervals), time.perf_counter() - start)
+    RR_COUNT.observe(len(raw_data.rrIntervals), "raw")
+    RR_COUNT.observe(len(processor.cleaned_rr), "cleaned")
+    return processor, valid, result
+
+def session_response(valid: bool, result: Dict[str, Any]) -> dict:
+    if not valid:
+        return {
+            "status": "error",
+            "message": f"Invalid HRV session: {result['metadata'].get('reason')}",
+            "data": result
+        }
+    
+    return {
+        "status": "success",
+        "message": "Session processed and stored successfully",
+        "data": result
+    }
+
+def session_entry(raw_data: RawHRVData, processor: HRVSessionProcessor, valid: bool, result: Dict[str, Any]) -> dict:
+    """Everything SessionStore.create_sessions needs to store one processed session"""
+    return {
+        "raw_data": raw_data,
+        "valid": valid,
+        "validation_result": processor.validation_result,
+        # The processor's own objects, not the response's rendered copies
+        "metrics": processor.metrics if valid else None,
+        "indexes": processor.indexes if valid else {}
+    }
+
+def ingest_session(raw_data: RawHRVData, store: SessionStore) -> dict:
+    """Validate, process and persist one session, returning the API response"""
+    # Check if session already exists
+    existing_session = store.get_session_by_recording_id(raw_data.recordingSessionId)
+    if existing_session:
+        return duplicate_response(raw_data, existing_session.id)
+    
+    # Process the data
+    processor, valid, result = process_session(raw_data)
+    
+    # Session, metrics, RR intervals and the user summary in one transaction.
+    # A concurrent request may create the same user, device or tag first, so
+    # a conflict that is not a duplicate session is retried once.
+    entry = session_entry(raw_data, processor, valid, result)
+    for attempt in range(2):
+        try:
+            store.create_sessions([entry])
+            break
+        except StoreConflict:
+            existing_session = store.get_session_by_recording_id(raw_data.recordingSessionId)
+            if existing_session:
+                return duplicate_response(raw_data, existing_session.id)
+            if attempt:
+                raise
+    
+    invalidate_session_reads(raw_data.user_id, raw_data.recordingSessionId, raw_data.tags)
+    record_session_metrics(entry)
+    return session_response(valid, result)
+
+async def ingest_session_async(raw_data: RawHRVData, store: SessionStore, offload: bool = True) -> dict:
+    """Like ingest_session, but hands persistence to the write-behind persister when it runs.
+    
+    Awaiting the group commit frees the event loop for other requests, which is
+    what lets concurrent ingests share one transaction. With offload, the
+    CPU-bound processing runs in the threadpool so reads stay responsive while
+    large sessions are analysed.
+    """
+    persister = get_write_behind()
+    if persister is None:
+        if offload:
+            return await run_in_threadpool(ingest_session, raw_data, store)
+        return ingest_session(raw_data, store)
+    
+    existing_session = store.get_session_by_recording_id(raw_data.recordingSessionId)
+    if existing_session:
+        return duplicate_response(raw_data, existing_session.id)
+    # Give the pooled connection back while processing and waiting; the writer
+    # thread uses its own
+    store.close()
+    
+    if offload:
+        processor, valid, result = await run_in_threadpool(process_session, raw_data)
+    else:
+        processor, valid, result = process_session(raw_data)
+    entry = session_entry(raw_data, processor, valid, result)
+    try:
+        await asyncio.wrap_future(persister.submit(entry))
+    except StoreConflict:
+        # Lost a race with a concurrent upload of the same recording
+        existing_session = store.get_session_by_recording_id(raw_data.recordingSessionId)
+        if existing_session:
+            return duplicate_response(raw_data, existing_session.id)
+        raise
+    
+    invalidate_session_reads(raw_data.user_id, raw_data.recordingSessionId, raw_data.tags)
+    record_session_metrics(entry)
+    return session_response(valid, result)
+
+def append_session(recording_session_id: str, chunk: RRChunk, rr_chunk: np.ndarray, store: SessionStore) -> dict:
+    """Append a later part of a recording to its stored session (see app/core/append.py), returning the API response"""
+    plan = store.append_rr(recording_session_id, rr_chunk, chunk.offset, chunk.motionArtifacts, chunk.final)
+    metadata = plan.metadata
+    invalidate_session_reads(metadata.user_id, recording_session_id, metadata.tags)
+    # Sketches cannot take a session back out, so only its first valid metrics are added
+    if metadata.valid and not plan.was_valid and plan.metrics is not None:
+        record_metrics(metadata.device_info.get("model"), metadata.tags, plan.metrics)
+    
+    result = SessionRecord(metadata=metadata, metrics=plan.metrics, indexes=plan.indexes).dict()
+    result["append"] = {
+        "rr_count": plan.state["raw"],
+        "recomputed": plan.recomputed,
+        "spectral_rr_count": plan.state["spectral_count"]
+    }
+    if not metadata.valid:
+        return {
+            "status": "error",
+            "message": f"Invalid HRV session: {metadata.reason}",
+            "data": result
+        }
+    return {
+        "status": "success",
+        "message": "RR intervals appended to session",
+        "data": result
+    }
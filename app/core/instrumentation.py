@@ -0,0 +1,346 @@
+# app/core/instrumentation.py
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Tuple, Sequence, Callable, Any
+from app.core.tracing import start_span
+
+# Latency buckets in seconds (sub-millisecond up to 10s)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# RR-count buckets: short spot checks up to overnight recordings
+RR_COUNT_BUCKETS = (30, 60, 120, 300, 600, 1200, 3000, 6000, 12000, 30000, 60000)
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labelvalues: Tuple[str, ...]) -> Tuple[str, ...]:
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labelvalues}")
+        return labelvalues
+
+    def header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        lines = self.header()
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callbacks: List[Tuple[Tuple[str, ...], Callable[[], float]]] = []
+
+    def set(self, value: float, *labelvalues: str) -> None:
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labelvalues: str, amount: float = 1.0) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    def set_function(self, func: Callable[[], float], *labelvalues: str) -> None:
+        """Compute the gauge value at scrape time instead of on every update"""
+        key = self._key(labelvalues)
+        with self._lock:
+            self._callbacks = [(k, f) for k, f in self._callbacks if k != key]
+            self._callbacks.append((key, func))
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+            callbacks = list(self._callbacks)
+        for key, func in callbacks:
+            try:
+                items.append((key, float(func())))
+            except Exception:
+                continue
+        lines = self.header()
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        key = self._key(labelvalues)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[idx] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, *labelvalues: str):
+        """Observe the wall-clock duration of the wrapped block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+        lines = self.header()
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def timed(histogram: Histogram, label: str = None):
+    """Decorator recording a function's duration, labelled with its name by default.
+
+    The call also shows up as a span when it runs inside a traced request.
+    """
+    def decorator(func: Callable) -> Callable:
+        label_value = label or func.__name__
+        span_name = func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any):
+            start = time.perf_counter()
+            try:
+                with start_span(span_name):
+                    return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, label_value)
+        return wrapper
+    return decorator
+
+
+# Application metrics
+HTTP_REQUESTS_TOTAL = REGISTRY.register(Counter(
+    "hrv_http_requests_total",
+    "Total HTTP requests by method, route template and status code",
+    ("method", "route", "status"),
+))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "hrv_http_request_duration_seconds",
+    "HTTP request latency by method and route template",
+    ("method", "route"),
+))
+PROCESSOR_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "hrv_processor_stage_duration_seconds",
+    "Duration of each HRVSessionProcessor stage",
+    ("stage",),
+))
+CRUD_SECONDS = REGISTRY.register(Histogram(
+    "hrv_crud_duration_seconds",
+    "Duration of each crud function including its commits",
+    ("operation",),
+))
+DB_POOL_CHECKOUT_SECONDS = REGISTRY.register(Histogram(
+    "hrv_db_pool_checkout_wait_seconds",
+    "Time spent waiting to check a connection out of the pool",
+    ("role",),
+))
+DB_POOL_CHECKOUTS_TOTAL = REGISTRY.register(Counter(
+    "hrv_db_pool_checkouts_total",
+    "Connections checked out of the pool, by engine role",
+    ("role",),
+))
+DB_POOL_TIMEOUTS_TOTAL = REGISTRY.register(Counter(
+    "hrv_db_pool_timeouts_total",
+    "Requests that gave up waiting for a pooled connection",
+    ("role",),
+))
+DB_POOL_CONNECTIONS = REGISTRY.register(Gauge(
+    "hrv_db_pool_connections",
+    "Pool connections by engine role and state (size, checked_out, idle, overflow)",
+    ("role", "state"),
+))
+RR_COUNT = REGISTRY.register(Histogram(
+    "hrv_session_rr_count",
+    "Number of RR intervals per ingested session",
+    ("kind",),
+    buckets=RR_COUNT_BUCKETS,
+))
+
+JOBS_TOTAL = REGISTRY.register(Counter(
+    "hrv_jobs_total",
+    "Background analysis jobs by final status",
+    ("status",),
+))
+JOB_QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "hrv_job_queue_wait_seconds",
+    "Time a background job spent queued before a worker claimed it",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0),
+))
+
+WRITE_BEHIND_BATCH_SIZE = REGISTRY.register(Histogram(
+    "hrv_write_behind_batch_size",
+    "Sessions per write-behind group commit",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+))
+WRITE_BEHIND_FLUSH_SECONDS = REGISTRY.register(Histogram(
+    "hrv_write_behind_flush_duration_seconds",
+    "Duration of one write-behind group commit",
+))
+
+RESPONSE_CACHE_TOTAL = REGISTRY.register(Counter(
+    "hrv_response_cache_requests_total",
+    "Cached read endpoint lookups by result (hit, miss, not_modified)",
+    ("result",),
+))
+
+ADMISSION_IN_FLIGHT = REGISTRY.register(Gauge(
+    "hrv_admission_in_flight",
+    "Admitted requests and their estimated cost (beats for ingest) per budget",
+    ("budget", "measure"),
+))
+ADMISSION_REJECTED_TOTAL = REGISTRY.register(Counter(
+    "hrv_admission_rejected_total",
+    "Requests shed with 503 by budget and reason (in_flight, cost, delay)",
+    ("budget", "reason"),
+))
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and timing them per route template"""
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Dict[Any, str] = {}
+
+    def _route_label(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            # Resolve endpoint -> route template once; the route table is static
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = route.path
+                    break
+            else:
+                path = "unmatched"
+            self._route_paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = self._route_label(scope)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], route)
+            HTTP_REQUESTS_TOTAL.inc(scope["method"], route, str(status_code))
@@ -0,0 +1,193 @@
+# app/core/jobs.py
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.core.ingest import ingest_session
+from app.core.instrumentation import JOBS_TOTAL, JOB_QUEUE_WAIT_SECONDS
+from app.core.serialization import to_jsonable
+from app.core.storage import session_store
+from app.models.schemas import RawHRVData
+from app.models.sql_models import HRVJob
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+def claim_next_job(db: Session) -> Optional[HRVJob]:
+    """Atomically move the oldest queued job to running.
+
+    The conditional UPDATE only succeeds for one claimant, so several workers
+    (threads or processes) can poll the same table without a broker or
+    SELECT ... FOR UPDATE support.
+    """
+    candidates = (
+        db.query(HRVJob.id)
+        .filter(HRVJob.status == JOB_QUEUED)
+        .order_by(HRVJob.created_at)
+        .limit(5)
+        .all()
+    )
+    for (job_id,) in candidates:
+        claimed = db.execute(
+            update(HRVJob)
+            .where(HRVJob.id == job_id, HRVJob.status == JOB_QUEUED)
+            .values(status=JOB_RUNNING, started_at=datetime.utcnow(), attempts=HRVJob.attempts + 1)
+        ).rowcount
+        db.commit()
+        if claimed:
+            return db.query(HRVJob).filter(HRVJob.id == job_id).first()
+    return None
+
+
+def requeue_stale_jobs(db: Session, stale_after: float, max_attempts: int) -> int:
+    """Recover jobs left running by a crashed worker"""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+    stale = (HRVJob.status == JOB_RUNNING, HRVJob.started_at < cutoff)
+    requeued = db.execute(
+        update(HRVJob).where(*stale, HRVJob.attempts < max_attempts).values(status=JOB_QUEUED)
+    ).rowcount
+    db.execute(
+        update(HRVJob).where(*stale, HRVJob.attempts >= max_attempts)
+        .values(status=JOB_FAILED, error="Worker stopped before finishing", finished_at=datetime.utcnow())
+    )
+    db.commit()
+    return requeued
+
+
+def run_job(db: Session, job: HRVJob) -> None:
+    """Process one claimed job and record its outcome"""
+    if job.started_at and job.created_at:
+        JOB_QUEUE_WAIT_SECONDS.observe((job.started_at - job.created_at).total_seconds())
+
+    store = session_store(db)
+    try:
+        raw_data = RawHRVData(**job.payload, rrIntervals=[])
+        raw_data.rrIntervals = np.frombuffer(job.rr_data, dtype="<i4")
+        result = ingest_session(raw_data, store)
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"Job {job.id} failed")
+        job.status = JOB_FAILED
+        job.error = str(e)
+    else:
+        job.status = JOB_SUCCEEDED
+        job.result = to_jsonable(result)
+    try:
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        JOBS_TOTAL.inc(job.status)
+    finally:
+        # Return the shard sessions a sharded store opened (the caller closes db)
+        store.close()
+
+
+class JobWorkerPool:
+    """Threads that drain the hrv_jobs table.
+
+    Local enqueues wake a worker immediately via notify(); polling picks up
+    jobs queued by other processes or requeued after a crash.
+    """
+
+    def __init__(self, workers: int, poll_interval: float, stale_after: float, max_attempts: int):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        db = SessionLocal()
+        try:
+            requeued = requeue_stale_jobs(db, self.stale_after, self.max_attempts)
+            if requeued:
+                logger.info(f"Requeued {requeued} stale jobs")
+        except Exception as e:
+            logger.error(f"Error requeueing stale jobs: {e}")
+        finally:
+            db.close()
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"hrv-job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            db = SessionLocal()
+            try:
+                job = claim_next_job(db)
+                if job is not None:
+                    run_job(db, job)
+                    continue
+            except Exception as e:
+                logger.error(f"Job worker error: {e}")
+                db.rollback()
+            finally:
+                db.close()
+
+            # Nothing to do: sleep until notified or the next poll
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+_pool: Optional[JobWorkerPool] = None
+
+
+def start_job_workers(workers: int, poll_interval: float, stale_after: float, max_attempts: int) -> JobWorkerPool:
+    global _pool
+    _pool = JobWorkerPool(workers, poll_interval, stale_after, max_attempts)
+    _pool.start()
+    return _pool
+
+
+def stop_job_workers() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.stop()
+        _pool = None
+
+
+def notify_job_workers() -> None:
+    if _pool is not None:
+        _pool.notify()
+
+
+def job_response(job: HRVJob) -> dict:
+    """Status document for GET /api/hrv/jobs/{id}"""
+    response = {
+        "job_id": job.id,
+        "status": job.status,
+        "recordingSessionId": job.recording_session_id,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at
+    }
+    if job.status == JOB_SUCCEEDED:
+        response["result"] = job.result
+    elif job.status == JOB_FAILED:
+        response["error"] = job.error
+    return response
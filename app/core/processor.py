@@ -1,66 +1,124 @@
 # app/core/processor.py
-from typing import Dict, Optional, Tuple, Any
-from app.models.schemas import SessionMetrics, RawHRVData
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Any
+import numpy as np
+from app.models.schemas import RawHRVData
+from app.models.result import SessionMetrics, ValidationResult
 from app.models.metadata import SessionMetadata
 from app.models.record import SessionRecord
 from app.core.indexes import build_metric_indexes
 from app.core.validator import HRVValidator
-from app.core.metrics import calculate_basic_metrics
+from app.core.metrics import calculate_basic_metrics, calculate_windowed_metrics, spectral_plan, window_count
+from app.core.profiles import ProcessingProfile, load_profiles, resolve_profile
+from app.core.instrumentation import timed, PROCESSOR_STAGE_SECONDS
+
+class ProcessingPipeline:
+    """A processing profile compiled for reuse across sessions.
+    
+    Spectral keyword arguments are bound once, and the Welch window and band
+    masks for the profile's fixed segment length (if it has one) are built up
+    front; other lengths are built on first use and cached by spectral_plan.
+    """
+    def __init__(self, profile: ProcessingProfile):
+        self.profile = profile
+        self.spectral = {"fs": profile.resample_hz, "lf_band": profile.lf_band, "hf_band": profile.hf_band}
+        if profile.welch_segment_seconds:
+            spectral_plan(int(round(profile.welch_segment_seconds * profile.resample_hz)), **self.spectral)
+    
+    def validate(self, raw_data: RawHRVData) -> Tuple[List[int], ValidationResult]:
+        return HRVValidator(raw_data, self.profile).process()
+    
+    def basic_metrics(self, cleaned_rr: List[int]) -> Dict:
+        return calculate_basic_metrics(cleaned_rr, welch_segment_seconds=self.profile.welch_segment_seconds,
+                                       **self.spectral)
+    
+    def windowed_metrics(self, cleaned_rr: List[int], window_seconds: float, step_seconds: float) -> Dict:
+        return calculate_windowed_metrics(cleaned_rr, window_seconds, step_seconds, **self.spectral)
+
+@lru_cache(maxsize=None)
+def _profile_pipeline(name: str) -> ProcessingPipeline:
+    profiles, _ = load_profiles()
+    return ProcessingPipeline(profiles[name])
+
+@lru_cache(maxsize=1024)
+def _device_pipeline(model: Optional[str], firmware: Optional[str]) -> ProcessingPipeline:
+    return _profile_pipeline(resolve_profile(model, firmware).name)
+
+def get_pipeline(device_info: Dict[str, str]) -> ProcessingPipeline:
+    """The cached pipeline for a device: one per profile, resolved once per (model, firmware)"""
+    return _device_pipeline(device_info.get("model"), device_info.get("firmwareVersion"))
+
+def analysis_window_count(raw_data: RawHRVData, rr_intervals) -> int:
+    """Upper bound on the windows a session's windowed analysis computes, from its in-range beats"""
+    options = raw_data.analysis
+    if not options or not options.windowSeconds:
+        return 0
+    profile = get_pipeline(raw_data.device_info).profile
+    rr = np.asarray(rr_intervals, dtype=np.int64)
+    duration = float(rr[(rr >= profile.min_rr) & (rr <= profile.max_rr)].sum()) / 1000
+    return window_count(duration, options.windowSeconds, options.stepSeconds or options.windowSeconds / 2)
 
 class HRVSessionProcessor:
     def __init__(self, raw_data: RawHRVData):
         self.raw_data = raw_data
+        self.pipeline = get_pipeline(raw_data.device_info)
         self.cleaned_rr = []
         self.metrics: Optional[SessionMetrics] = None
         self.indexes: Optional[Dict] = None
-        self.validation_result: Dict = {}
+        self.windows: Optional[Dict] = None
+        self.validation_result: Optional[ValidationResult] = None
         self.metadata: Optional[SessionMetadata] = None
 
+    @timed(PROCESSOR_STAGE_SECONDS)
     def validate(self) -> bool:
         """Validate and clean the raw RR interval data"""
-        validator = HRVValidator(self.raw_data)
-        self.cleaned_rr, self.validation_result = validator.process()
+        self.cleaned_rr, self.validation_result = self.pipeline.validate(self.raw_data)
         
-        # Create the metadata object
+        # Metadata shares the validation result's values rather than copying a dict
         self.metadata = SessionMetadata(
+            self.validation_result,
             timestamp=self.raw_data.timestamp,
             recordingSessionId=self.raw_data.recordingSessionId,
             user_id=self.raw_data.user_id,
             device_info=self.raw_data.device_info,
             tags=self.raw_data.tags,
-            valid=self.validation_result["valid"],
-            reason=self.validation_result.get("reason"),
-            quality_score=self.validation_result["quality_score"],
-            quality_label=self.validation_result["quality_label"],
-            filter_method=self.validation_result["filter_method"],
-            outlier_count=self.validation_result["outlier_count"],
-            valid_rr_percentage=self.validation_result["valid_rr_percentage"],
             motionArtifacts=self.raw_data.motionArtifacts
         )
         
-        return self.validation_result["valid"]
+        return self.validation_result.valid
 
+    @timed(PROCESSOR_STAGE_SECONDS)
     def compute_metrics(self) -> Optional[SessionMetrics]:
         """Calculate HRV metrics from cleaned RR intervals"""
         if not self.cleaned_rr:
             return None
             
-        basic_metrics = calculate_basic_metrics(self.cleaned_rr)
-        
-        # Combine with validation data and raw data fields
-        raw_metrics_dict = {
-            **basic_metrics,
-            "heartRate": self.raw_data.heartRate,
-            "motionArtifacts": self.raw_data.motionArtifacts,
-            "valid_rr_percentage": self.validation_result["valid_rr_percentage"],
-            "quality_score": self.validation_result["quality_score"],
-            "outlier_count": self.validation_result["outlier_count"],
-            "filter_method": self.validation_result["filter_method"]
-        }
-        
-        self.metrics = SessionMetrics(**raw_metrics_dict)
+        # Built once; indexes, persistence and the response all read this object
+        validation = self.validation_result
+        heart_rate = self.raw_data.heartRate
+        self.metrics = SessionMetrics(
+            self.pipeline.basic_metrics(self.cleaned_rr),
+            heartRate=float(heart_rate) if heart_rate is not None else None,
+            motionArtifacts=self.raw_data.motionArtifacts,
+            valid_rr_percentage=validation.valid_rr_percentage,
+            quality_score=validation.quality_score,
+            outlier_count=validation.outlier_count,
+            filter_method=validation.filter_method
+        )
         return self.metrics
 
+    @timed(PROCESSOR_STAGE_SECONDS)
+    def compute_windowed_metrics(self) -> Optional[Dict]:
+        """Calculate per-window metrics when the request asked for windowed analysis"""
+        options = self.raw_data.analysis
+        if not options or not options.windowSeconds or not self.cleaned_rr:
+            return None
+        
+        step = options.stepSeconds or options.windowSeconds / 2
+        self.windows = self.pipeline.windowed_metrics(self.cleaned_rr, options.windowSeconds, step)
+        return self.windows
+
+    @timed(PROCESSOR_STAGE_SECONDS)
     def build_indexes(self) -> Optional[Dict]:
         """Build metric indexes from computed metrics"""
         if not self.metrics:
@@ -77,7 +135,8 @@ class HRVSessionProcessor:
         return SessionRecord(
             metadata=self.metadata,
             metrics=self.metrics,
-            indexes=self.indexes
+            indexes=self.indexes,
+            windows=self.windows
         )
         
     def process(self) -> Tuple[bool, Dict[str, Any]]:
@@ -90,6 +149,7 @@ class HRVSessionProcessor:
             return False, record.dict()
             
         self.compute_metrics()
+        self.compute_windowed_metrics()
         self.build_indexes()
         
         # Create and return the full record
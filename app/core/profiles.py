@@ -0,0 +1,129 @@
+# app/core/profiles.py
+"""Processing profiles: validation thresholds, outlier filter and spectral settings per device.
+
+Chest straps record ECG R-R intervals. Optical (PPG) wrist and arm devices
+derive pulse intervals with more jitter and more dropped beats, so they need
+looser thresholds and a filter that copes with heavy tails. A profile is
+chosen from ``device_info`` by the first rule whose model and firmware globs
+match (case-insensitive). Devices that match no rule use ``default``, the
+settings every session was processed with before profiles existed.
+
+PROCESSING_PROFILES_FILE may name a JSON file with more profiles and rules,
+which are checked before the built-in ones::
+
+    {
+      "profiles": {"strap_legacy": {"base": "default", "min_valid_percentage": 85}},
+      "devices": [{"model": "Polar H10", "firmware": "1.*", "profile": "strap_legacy"}]
+    }
+
+A profile is turned into a ProcessingPipeline (app/core/processor.py) once
+per worker and cached per device, see ``processor.get_pipeline``.
+"""
+import fnmatch
+import json
+from dataclasses import dataclass, fields, replace
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+FILTER_METHODS = ("zscore", "iqr", "none")
+
+
+@dataclass(frozen=True)
+class ProcessingProfile:
+    name: str
+    # Validation thresholds
+    min_rr: int = 300  # ms
+    max_rr: int = 2000  # ms
+    min_rr_count: int = 30
+    min_valid_percentage: float = 90.0
+    # Outlier filter after the range check
+    filter_method: str = "zscore"
+    zscore_threshold: float = 3.0
+    iqr_factor: float = 1.5
+    # Spectral analysis: resampling rate, bands (Hz) and Welch segment length
+    resample_hz: float = 4.0
+    lf_band: Tuple[float, float] = (0.04, 0.15)
+    hf_band: Tuple[float, float] = (0.15, 0.4)
+    welch_segment_seconds: Optional[float] = None  # None: half the session
+
+    def __post_init__(self):
+        if self.filter_method not in FILTER_METHODS:
+            raise ValueError(f"Profile '{self.name}': filter_method must be one of {FILTER_METHODS}")
+        if not 0 < self.min_rr < self.max_rr:
+            raise ValueError(f"Profile '{self.name}': need 0 < min_rr < max_rr")
+        if self.resample_hz <= 2 * self.hf_band[1]:
+            raise ValueError(f"Profile '{self.name}': resample_hz must exceed twice the HF band's upper edge")
+
+
+DEFAULT_PROFILE = ProcessingProfile(name="default")
+
+BUILTIN_PROFILES = {
+    "default": DEFAULT_PROFILE,
+    # PPG pulse intervals: more missed and split beats, so a lower valid share
+    # is acceptable and the quartile filter replaces the z-score (whose mean
+    # and SD are themselves pulled by the artifacts)
+    "optical": replace(DEFAULT_PROFILE, name="optical", min_valid_percentage=80.0, filter_method="iqr",
+                       min_rr_count=60),
+}
+
+# (model glob, firmware glob, profile); first match wins
+BUILTIN_DEVICE_RULES = [
+    ("Polar Verity*", "*", "optical"),
+    ("Polar OH1*", "*", "optical"),
+    ("Apple Watch*", "*", "optical"),
+    ("Fitbit*", "*", "optical"),
+    ("WHOOP*", "*", "optical"),
+    ("Oura*", "*", "optical"),
+]
+
+
+def _load_file(path: str) -> Tuple[Dict[str, ProcessingProfile], List[Tuple[str, str, str]]]:
+    with open(path) as f:
+        config = json.load(f)
+    known = {field.name for field in fields(ProcessingProfile)} - {"name"}
+    profiles: Dict[str, ProcessingProfile] = {}
+    for name, options in config.get("profiles", {}).items():
+        options = dict(options)
+        base_name = options.pop("base", "default")
+        base = profiles.get(base_name) or BUILTIN_PROFILES.get(base_name)
+        if base is None:
+            raise ValueError(f"Profile '{name}' extends unknown profile '{base_name}'")
+        unknown = set(options) - known
+        if unknown:
+            raise ValueError(f"Profile '{name}' has unknown settings: {', '.join(sorted(unknown))}")
+        for band in ("lf_band", "hf_band"):
+            if band in options:
+                options[band] = tuple(options[band])
+        profiles[name] = replace(base, name=name, **options)
+    rules = [(rule.get("model", "*"), rule.get("firmware", "*"), rule["profile"]) for rule in config.get("devices", [])]
+    return profiles, rules
+
+
+@lru_cache(maxsize=None)
+def load_profiles() -> Tuple[Dict[str, ProcessingProfile], List[Tuple[str, str, str]]]:
+    """All profiles and device rules, configured ones first; raises ValueError on a bad file"""
+    profiles, rules = dict(BUILTIN_PROFILES), list(BUILTIN_DEVICE_RULES)
+    if settings.PROCESSING_PROFILES_FILE:
+        extra_profiles, extra_rules = _load_file(settings.PROCESSING_PROFILES_FILE)
+        profiles.update(extra_profiles)
+        rules = extra_rules + rules
+    for _, _, name in rules:
+        if name not in profiles:
+            raise ValueError(f"Device rule refers to unknown profile '{name}'")
+    return profiles, rules
+
+
+def resolve_profile(model: Optional[str], firmware: Optional[str]) -> ProcessingProfile:
+    """Profile for a device model and firmware version"""
+    profiles, rules = load_profiles()
+    model, firmware = (model or "").lower(), (firmware or "").lower()
+    for model_glob, firmware_glob, name in rules:
+        if fnmatch.fnmatchcase(model, model_glob.lower()) and fnmatch.fnmatchcase(firmware, firmware_glob.lower()):
+            return profiles[name]
+    return profiles["default"]
+
+
+def profile_view(profile: ProcessingProfile) -> Dict[str, Any]:
+    return {field.name: getattr(profile, field.name) for field in fields(ProcessingProfile)}
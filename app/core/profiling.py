@@ -0,0 +1,166 @@
+# app/core/profiling.py
+import os
+import sys
+import time
+import uuid
+import hmac
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request
+from app.config import settings
+
+PROFILE_HEADER = "X-HRV-Profile"
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+PROFILE_FORMAT = "folded"  # Brendan Gregg collapsed stacks (flamegraph.pl, speedscope)
+
+
+def _short_path(filename: str) -> str:
+    """Trim site-packages/stdlib prefixes so frames read as package/module.py"""
+    for marker in ("site-packages" + os.sep, "dist-packages" + os.sep):
+        idx = filename.rfind(marker)
+        if idx != -1:
+            return filename[idx + len(marker):]
+    cwd = os.getcwd() + os.sep
+    if filename.startswith(cwd):
+        return filename[len(cwd):]
+    return os.path.basename(filename)
+
+
+class SamplingProfiler:
+    """Sample one thread's Python stack at a fixed interval.
+
+    Time spent inside NumPy/SciPy C code is attributed to the Python frame
+    that called into it (e.g. scipy/signal/_spectral_py.py:welch).
+    """
+
+    def __init__(self, thread_id: int, root_code=None, interval: float = 0.001):
+        self.thread_id = thread_id
+        self.root_code = root_code
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict = {}
+
+    def _frame_label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _sample(self) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(frame.f_code)
+            if frame.f_code is self.root_code:
+                break
+            frame = frame.f_back
+        if stack:
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="hrv-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def folded(self) -> str:
+        """Render samples as collapsed stacks, one 'frame;frame;... count' per line"""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            lines.append(";".join(self._frame_label(code) for code in stack) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+
+class ProfileResult:
+    def __init__(self):
+        self.profile_id = uuid.uuid4().hex
+        self.path: Optional[str] = None
+        self.samples = 0
+        self.duration_ms = 0.0
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.profile_id,
+            "format": PROFILE_FORMAT,
+            "samples": self.samples,
+            "duration_ms": round(self.duration_ms, 3),
+            "url": f"/debug/profiles/{self.profile_id}",
+        }
+
+
+@contextmanager
+def profile_block(enabled: bool):
+    """Profile the enclosed block on the current thread and store the result"""
+    if not enabled:
+        yield None
+        return
+
+    result = ProfileResult()
+    # Stop unwinding at the caller so stacks start at the profiled code
+    root_code = sys._getframe(2).f_code
+    profiler = SamplingProfiler(
+        threading.get_ident(), root_code=root_code, interval=settings.PROFILE_SAMPLE_INTERVAL_MS / 1000
+    )
+    profiler.start()
+    try:
+        yield result
+    finally:
+        profiler.stop()
+        result.samples = profiler.samples
+        result.duration_ms = profiler.duration * 1000
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        result.path = os.path.join(settings.PROFILE_DIR, f"{result.profile_id}.{PROFILE_FORMAT}")
+        with open(result.path, "w") as f:
+            f.write(profiler.folded())
+
+
+def has_debug_access(request: Request) -> bool:
+    """Debug tooling is open in DEBUG mode, otherwise it requires the admin token"""
+    if settings.DEBUG:
+        return True
+    token = request.headers.get(ADMIN_TOKEN_HEADER, "")
+    return bool(settings.ADMIN_TOKEN) and hmac.compare_digest(token, settings.ADMIN_TOKEN)
+
+
+def require_debug_access(request: Request) -> None:
+    if not has_debug_access(request):
+        raise HTTPException(status_code=403, detail="Debug access requires DEBUG mode or a valid admin token")
+
+
+def profile_requested(request: Request) -> bool:
+    """Dependency: True when the caller asked for a profile and is allowed one"""
+    flag = request.headers.get(PROFILE_HEADER) or request.query_params.get("profile")
+    if not flag or flag.lower() not in ("1", "true", "yes"):
+        return False
+    require_debug_access(request)
+    return True
+
+
+def load_profile(profile_id: str) -> Optional[str]:
+    # Profile ids are uuid4 hex; reject anything else to keep reads inside PROFILE_DIR
+    if len(profile_id) != 32 or not all(c in "0123456789abcdef" for c in profile_id):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, f"{profile_id}.{PROFILE_FORMAT}")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read()
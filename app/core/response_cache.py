@@ -0,0 +1,180 @@
+# app/core/response_cache.py
+"""Strong ETags and a bounded in-process cache of rendered read responses.
+
+Read endpoints call ``cached_response(request, key, tags, build)``. On a hit
+the stored bytes are returned without touching the database or serializing
+again. ``If-None-Match`` is answered with 304 whether the body came from the
+cache or was just built. Ingest invalidates entries by tag (``user:<id>``,
+``tag:<name>``, ``session:<recordingSessionId>``).
+
+The cache is per process. Other workers only see an ingest once their
+entries expire (RESPONSE_CACHE_TTL). ETags are hashes of the body, so
+revalidation stays correct either way.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.config import settings
+from app.core.database import has_read_replica
+from app.core.instrumentation import RESPONSE_CACHE_TOTAL
+from app.core.serialization import encode_response, wants_msgpack
+
+
+def compute_etag(body: bytes) -> str:
+    """Strong validator: a hash of the exact response bytes"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match uses the weak comparison, so a W/ prefix is ignored"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = (value.strip() for value in header.split(","))
+    return any((value[2:] if value.startswith("W/") else value) == etag for value in candidates)
+
+
+class CachedResponse:
+    __slots__ = ("body", "media_type", "etag", "tags", "expires_at")
+
+    def __init__(self, body: bytes, media_type: str, tags: Iterable[str], ttl: float):
+        self.body = body
+        self.media_type = media_type
+        self.etag = compute_etag(body)
+        self.tags = tuple(tags)
+        self.expires_at = time.monotonic() + ttl
+
+
+class ResponseCache:
+    """LRU of rendered responses with tag-based invalidation"""
+
+    def __init__(self, max_entries: int, ttl: float, settle: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Entries tagged with something invalidated this recently are not stored,
+        # since a lagging read replica may still return the old data
+        self.settle = settle
+        self._invalidated_at: Dict[str, float] = {}
+        self._entries: "OrderedDict[Tuple, CachedResponse]" = OrderedDict()
+        self._keys_by_tag: Dict[str, Set[Tuple]] = {}
+        # Bumped on every invalidation; a build that overlapped one is not stored
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple, entry: CachedResponse, generation: int) -> None:
+        with self._lock:
+            if generation != self.generation:
+                return
+            if self.settle and self._recently_invalidated(entry.tags):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            for tag in entry.tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, *tags: str) -> None:
+        with self._lock:
+            self.generation += 1
+            now = time.monotonic()
+            for tag in tags:
+                if self.settle:
+                    self._invalidated_at[tag] = now
+                for key in self._keys_by_tag.pop(tag, ()):
+                    self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self._invalidated_at.clear()
+
+    def _recently_invalidated(self, tags: Iterable[str]) -> bool:
+        cutoff = time.monotonic() - self.settle
+        if len(self._invalidated_at) > self.max_entries:
+            self._invalidated_at = {tag: at for tag, at in self._invalidated_at.items() if at >= cutoff}
+        return any(self._invalidated_at.get(tag, 0.0) >= cutoff for tag in tags)
+
+    def _remove(self, key: Tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+_cache: Optional[ResponseCache] = (
+    ResponseCache(
+        settings.RESPONSE_CACHE_MAX_ENTRIES,
+        settings.RESPONSE_CACHE_TTL,
+        settle=settings.DATABASE_READ_MAX_LAG if has_read_replica() else 0.0,
+    )
+    if settings.RESPONSE_CACHE_ENABLED else None
+)
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    return _cache
+
+
+def _send(request: Request, entry: CachedResponse) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if etag_matches(request, entry.etag):
+        RESPONSE_CACHE_TOTAL.inc("not_modified")
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type=entry.media_type, headers=headers)
+
+
+def cached_response(request: Request, key: Tuple, tags: Iterable[str], build: Callable[[], Any]) -> Response:
+    """Serve a read endpoint from the cache, or build, render and store it"""
+    # Representations differ per Accept, and so do their ETags
+    key = key + ("msgpack" if wants_msgpack(request) else "json",)
+    if _cache is not None:
+        entry = _cache.get(key)
+        if entry is not None:
+            RESPONSE_CACHE_TOTAL.inc("hit")
+            return _send(request, entry)
+        generation = _cache.generation
+
+    response = encode_response(request, build())
+    if _cache is None:
+        return _send(request, CachedResponse(response.body, response.media_type, tags, 0))
+    entry = CachedResponse(response.body, response.media_type, tags, _cache.ttl)
+    RESPONSE_CACHE_TOTAL.inc("miss")
+    _cache.put(key, entry, generation)
+    return _send(request, entry)
+
+
+def invalidate_session_reads(user_id: str, recording_session_id: str, tags: Iterable[str]) -> None:
+    """Drop cached reads that a newly stored session can change"""
+    if _cache is not None:
+        _cache.invalidate(f"user:{user_id}", f"session:{recording_session_id}", *(f"tag:{tag}" for tag in tags))
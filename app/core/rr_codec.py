@@ -0,0 +1,183 @@
+# app/core/rr_codec.py
+"""Compact binary RR payloads.
+
+Wire format (all integers little-endian)::
+
+    uint32 header_length | header (UTF-8 JSON, header_length bytes) | RR block
+
+The JSON header carries the same metadata fields as ``RawHRVData`` except
+``rrIntervals``, plus:
+
+    "encoding": "int16" | "uint16" | "int32" | "varint-delta"
+    "count":    number of RR intervals in the block
+
+``int16``/``uint16``/``int32`` blocks are raw little-endian arrays. ``varint-delta``
+stores zigzag-encoded differences between consecutive intervals (the first
+value is a difference from 0) as LEB128 varints, which is 1 byte per beat
+for typical data. The whole body may be gzip or zstd compressed, signalled
+with the standard ``Content-Encoding`` header.
+"""
+import gzip
+import json
+import struct
+import zlib
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+CONTENT_TYPE = "application/x-hrv-rr"
+
+_HEADER_LENGTH = struct.Struct("<I")
+_FIXED_DTYPES = {"int16": np.dtype("<i2"), "uint16": np.dtype("<u2"), "int32": np.dtype("<i4")}
+# RR deltas never need more than 3 varint bytes (21 bits); anything longer is corrupt
+_MAX_VARINT_BYTES = 3
+# RR values are stored as 32-bit integers (rr_intervals.value, queued jobs' int32 blob)
+RR_VALUE_RANGE = (-2 ** 31, 2 ** 31 - 1)
+
+
+class PayloadError(ValueError):
+    """Malformed binary payload (maps to HTTP 400)"""
+
+
+class UnsupportedEncodingError(PayloadError):
+    """Unknown or unavailable encoding/compression (maps to HTTP 415)"""
+
+
+def decompress(body: bytes, content_encoding: str, max_size: int) -> bytes:
+    """Undo Content-Encoding, refusing to inflate beyond max_size bytes"""
+    content_encoding = (content_encoding or "identity").strip().lower()
+    if content_encoding == "identity":
+        data = body
+    elif content_encoding == "gzip":
+        inflater = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        try:
+            data = inflater.decompress(body, max_size + 1)
+        except zlib.error as e:
+            raise PayloadError(f"Invalid gzip body: {e}")
+    elif content_encoding == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise UnsupportedEncodingError("zstd bodies need the optional 'zstandard' package on the server")
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(body) as reader:
+                data = reader.read(max_size + 1)
+        except zstandard.ZstdError as e:
+            raise PayloadError(f"Invalid zstd body: {e}")
+    else:
+        raise UnsupportedEncodingError(f"Unsupported Content-Encoding '{content_encoding}'")
+
+    if len(data) > max_size:
+        raise PayloadError(f"Decoded payload exceeds {max_size} bytes")
+    return data
+
+
+def _decode_varint_delta(block: memoryview, count: int) -> np.ndarray:
+    """Vectorized LEB128 + zigzag + cumulative-sum decode"""
+    raw = np.frombuffer(block, dtype=np.uint8)
+    if raw.size == 0:
+        if count:
+            raise PayloadError("Empty varint block")
+        return np.empty(0, dtype=np.int64)
+    if raw[-1] & 0x80:
+        raise PayloadError("Truncated varint at end of block")
+
+    ends = np.flatnonzero(raw < 0x80)
+    if ends.size != count:
+        raise PayloadError(f"Header count {count} does not match {ends.size} encoded values")
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+    if lengths.max() > _MAX_VARINT_BYTES:
+        raise PayloadError("Varint too long for an RR delta")
+
+    # Byte position within its own varint -> 7-bit shift
+    position = np.arange(raw.size) - np.repeat(starts, lengths)
+    values = np.add.reduceat((raw & 0x7F).astype(np.int64) << (7 * position), starts)
+    deltas = (values >> 1) ^ -(values & 1)
+    return np.cumsum(deltas)
+
+
+def rr_out_of_range(rr: np.ndarray) -> bool:
+    """Whether any RR value does not fit the 32-bit storage"""
+    return bool(rr.size) and bool(rr.min() < RR_VALUE_RANGE[0] or rr.max() > RR_VALUE_RANGE[1])
+
+
+def decode_rr_block(block: memoryview, encoding: str, count: int) -> np.ndarray:
+    """Decode the RR block; fixed-width encodings are a zero-copy view"""
+    if encoding in _FIXED_DTYPES:
+        dtype = _FIXED_DTYPES[encoding]
+        if len(block) != count * dtype.itemsize:
+            raise PayloadError(f"Expected {count * dtype.itemsize} bytes of {encoding} data, got {len(block)}")
+        return np.frombuffer(block, dtype=dtype, count=count)
+    if encoding == "varint-delta":
+        return _decode_varint_delta(block, count)
+    raise UnsupportedEncodingError(f"Unsupported RR encoding '{encoding}'")
+
+
+def decode_payload(data: bytes) -> Tuple[Dict[str, Any], np.ndarray]:
+    """Split a (decompressed) body into its metadata header and RR array"""
+    if len(data) < _HEADER_LENGTH.size:
+        raise PayloadError("Payload too short")
+    (header_length,) = _HEADER_LENGTH.unpack_from(data)
+    header_end = _HEADER_LENGTH.size + header_length
+    if header_end > len(data):
+        raise PayloadError("Header length exceeds payload size")
+
+    view = memoryview(data)
+    try:
+        header = json.loads(bytes(view[_HEADER_LENGTH.size:header_end]))
+    except ValueError as e:
+        raise PayloadError(f"Invalid JSON header: {e}")
+    if not isinstance(header, dict):
+        raise PayloadError("Header must be a JSON object")
+
+    encoding = header.pop("encoding", "uint16")
+    count = header.pop("count", None)
+    if not isinstance(count, int) or count < 0:
+        raise PayloadError("Header must include a non-negative integer 'count'")
+    if "rrIntervals" in header:
+        raise PayloadError("rrIntervals belong in the binary block, not the header")
+
+    rr = decode_rr_block(view[header_end:], encoding, count)
+    if rr_out_of_range(rr):
+        # Varint deltas can sum past what rr_intervals stores
+        raise PayloadError("RR intervals must be 32-bit integers")
+    return header, rr
+
+
+def varint_delta_fits(rr_intervals) -> bool:
+    """Whether every delta of the series fits the varint-delta decoder's limit"""
+    deltas = np.diff(np.asarray(rr_intervals, dtype=np.int64), prepend=0)
+    return bool(deltas.size == 0 or ((deltas << 1) ^ (deltas >> 63)).max() < 1 << (7 * _MAX_VARINT_BYTES))
+
+
+def encode_payload(metadata: Dict[str, Any], rr_intervals, encoding: str = "uint16",
+                   compression: str = "identity") -> bytes:
+    """Build a binary payload (reference encoder for clients, tests and benchmarks)"""
+    rr = np.asarray(rr_intervals, dtype=np.int64)
+    if encoding in _FIXED_DTYPES:
+        block = rr.astype(_FIXED_DTYPES[encoding]).tobytes()
+    elif encoding == "varint-delta":
+        deltas = np.diff(rr, prepend=0)
+        zigzag = ((deltas << 1) ^ (deltas >> 63)).tolist()
+        out = bytearray()
+        for value in zigzag:
+            while value >= 0x80:
+                out.append((value & 0x7F) | 0x80)
+                value >>= 7
+            out.append(value)
+        block = bytes(out)
+    else:
+        raise UnsupportedEncodingError(f"Unsupported RR encoding '{encoding}'")
+
+    header = json.dumps({**metadata, "encoding": encoding, "count": int(rr.size)}).encode("utf-8")
+    body = _HEADER_LENGTH.pack(len(header)) + header + block
+
+    if compression == "gzip":
+        return gzip.compress(body)
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor().compress(body)
+    return body
@@ -0,0 +1,139 @@
+# app/core/rr_series.py
+"""Stored RR series for charts: slicing, validity mask and downsampling.
+
+GET /api/hrv/session/{id}/rr serves a session's tachogram as columns: beat
+index, time since the start of the recording (s), RR (ms) and optionally a
+validity flag. It can reduce the series to roughly ``points`` points:
+
+``lttb``
+    Largest-Triangle-Three-Buckets. The first and last beats are kept, and in
+    each bucket the beat forming the largest triangle with the previous pick
+    and the next bucket's mean. This keeps the visual shape of the series.
+``minmax``
+    The lowest and highest beat of each bucket, so spikes and dips always
+    survive. Useful for spotting artifacts.
+
+Bucket statistics are computed with vectorized NumPy kernels. Only the
+LTTB pick, which depends on the previous pick, loops, and it loops once per
+bucket rather than once per beat.
+"""
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from app.core.profiles import DEFAULT_PROFILE
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+MAX_RR_POINTS = 10000
+
+
+def beat_times(rr: np.ndarray) -> np.ndarray:
+    """Seconds from the start of the recording to each beat"""
+    return np.cumsum(rr, dtype=np.float64) / 1000.0
+
+
+def validity_mask(rr: np.ndarray) -> np.ndarray:
+    """Beats the validator keeps with the default profile: in range and not a z-score outlier.
+
+    The mask is computed over the whole session, as the validator does, so a
+    slice shows the same flags as the full series.
+    """
+    valid = (rr >= DEFAULT_PROFILE.min_rr) & (rr <= DEFAULT_PROFILE.max_rr)
+    in_range = rr[valid].astype(np.float64)
+    if in_range.size:
+        std = in_range.std()
+        if std > 0:
+            valid[valid] = np.abs(in_range - in_range.mean()) / std <= DEFAULT_PROFILE.zscore_threshold
+    return valid
+
+
+def _bucket_edges(n: int, buckets: int) -> np.ndarray:
+    return np.linspace(0, n, buckets + 1).astype(np.int64)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Indices of the LTTB selection of about `points` points (first and last always kept)"""
+    n = x.size
+    if points >= n:
+        return np.arange(n)
+    if points < 3:
+        raise ValueError("LTTB needs at least 3 points")
+
+    # Interior beats split into points - 2 buckets; the first and last beats are their own
+    edges = 1 + _bucket_edges(n - 2, points - 2)
+    starts, ends = edges[:-1], edges[1:]
+    counts = ends - starts
+    mean_x = np.add.reduceat(x[1:-1], starts - 1) / counts
+    mean_y = np.add.reduceat(y[1:-1], starts - 1) / counts
+    # Each bucket looks ahead at the next bucket's mean, the last one at the final beat
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket, (start, end) in enumerate(zip(starts, ends)):
+        ax, ay = x[previous], y[previous]
+        area = np.abs((ax - next_x[bucket]) * (y[start:end] - ay) - (ax - x[start:end]) * (next_y[bucket] - ay))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def minmax(y: np.ndarray, points: int) -> np.ndarray:
+    """Indices of each bucket's minimum and maximum, in series order"""
+    n = y.size
+    buckets = points // 2
+    if points >= n or buckets < 1:
+        return np.arange(n)
+    edges = _bucket_edges(n, buckets)
+    starts, ends = edges[:-1], edges[1:]
+    # One row per bucket, short buckets padded by repeating their last beat
+    width = int((ends - starts).max())
+    rows = np.minimum(starts[:, None] + np.arange(width), (ends - 1)[:, None])
+    values = y[rows]
+    picks = np.arange(buckets)
+    return np.unique(np.concatenate((rows[picks, values.argmin(axis=1)], rows[picks, values.argmax(axis=1)])))
+
+
+def rr_series_view(rr: np.ndarray, start: int = 0, end: Optional[int] = None, start_s: Optional[float] = None,
+                   end_s: Optional[float] = None, points: Optional[int] = None, method: str = "lttb",
+                   mask: bool = True, valid_only: bool = False) -> Dict[str, Any]:
+    """Columnar RR series for beats [start, end) and times [start_s, end_s), downsampled to about `points` points.
+
+    ``valid_only`` drops beats outside the validity mask before downsampling
+    (artifacts otherwise dominate both methods).
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}', expected one of {DOWNSAMPLE_METHODS}")
+    total = int(rr.size)
+    t = beat_times(rr)
+    valid = validity_mask(rr)
+
+    low, high = start, total if end is None else min(end, total)
+    if start_s is not None:
+        low = max(low, int(np.searchsorted(t, start_s)))
+    if end_s is not None:
+        high = min(high, int(np.searchsorted(t, end_s)))
+    index = np.arange(low, max(low, high))
+    if valid_only:
+        index = index[valid[index]]
+    downsampled = points is not None and points < index.size
+    if downsampled:
+        values = rr[index].astype(np.float64)
+        if method == "lttb":
+            index = index[lttb(t[index], values, points)]
+        else:
+            index = index[minmax(values, points)]
+
+    series = {
+        "count": total,
+        "returned": int(index.size),
+        "method": method if downsampled else None,
+        "index": index,
+        "t": np.round(t[index], 3),
+        "rr": rr[index],
+    }
+    if mask:
+        series["valid"] = valid[index]
+    return series
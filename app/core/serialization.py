@@ -0,0 +1,134 @@
+# app/core/serialization.py
+"""Fast request decoding and response encoding.
+
+Handlers return ``encode_response(request, content)`` instead of a plain dict,
+which skips FastAPI's ``jsonable_encoder`` walk. JSON is rendered by orjson,
+which handles NumPy scalars/arrays and datetimes natively. Clients sending
+``Accept: application/msgpack`` get MessagePack when the optional ``msgpack``
+package is installed.
+"""
+from datetime import date, datetime
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import orjson
+from fastapi import Request
+from fastapi.responses import ORJSONResponse, Response
+
+from app.core.rr_codec import rr_out_of_range
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+
+class RequestDecodeError(ValueError):
+    """Request body could not be decoded (maps to HTTP 400/415/422)"""
+
+    def __init__(self, message: str, status_code: int = 422):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _default(value: Any) -> Any:
+    """Fallback for types neither orjson nor msgpack handle natively"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, "dict"):
+        return value.dict()
+    raise TypeError(f"Type {type(value).__name__} is not serializable")
+
+
+class HRVJSONResponse(ORJSONResponse):
+    """orjson response that also accepts NumPy values and pydantic models"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
+
+
+class MsgPackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=_default, use_bin_type=True)
+
+
+def to_jsonable(content: Any) -> Any:
+    """Round-trip through orjson to get plain Python types (e.g. for JSON columns)"""
+    return orjson.loads(orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS))
+
+
+def wants_msgpack(request: Request) -> bool:
+    if msgpack is None:
+        return False
+    accept = request.headers.get("accept", "")
+    return any(media_type in accept for media_type in MSGPACK_TYPES)
+
+
+def encode_response(request: Request, content: Any, status_code: int = 200, headers: Dict[str, str] = None) -> Response:
+    """Pick MessagePack or JSON from the Accept header and render directly"""
+    if wants_msgpack(request):
+        return MsgPackResponse(content, status_code=status_code, headers=headers)
+    return HRVJSONResponse(content, status_code=status_code, headers=headers)
+
+
+def decode_body(content_type: str, body: bytes) -> Any:
+    """Parse a JSON or MessagePack request body"""
+    media_type = (content_type or "application/json").split(";")[0].strip().lower()
+    if media_type in MSGPACK_TYPES:
+        if msgpack is None:
+            raise RequestDecodeError("MessagePack bodies need the optional 'msgpack' package on the server", 415)
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except Exception as e:
+            raise RequestDecodeError(f"Invalid MessagePack body: {e}", 400)
+    if media_type != "application/json":
+        raise RequestDecodeError(f"Unsupported Content-Type '{media_type}'", 415)
+    try:
+        return orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise RequestDecodeError(f"Invalid JSON body: {e}", 400)
+
+
+def split_rr_intervals(payload: Any) -> Tuple[Dict[str, Any], np.ndarray]:
+    """Separate rrIntervals from the session fields and convert them in one step.
+
+    Replaces pydantic's per-element List[int] validation with a single
+    NumPy conversion plus a dtype check.
+    """
+    if not isinstance(payload, dict):
+        raise RequestDecodeError("Request body must be an object")
+    fields = dict(payload)
+    rr = fields.pop("rrIntervals", None)
+    if not isinstance(rr, list):
+        raise RequestDecodeError("rrIntervals must be a list of integers")
+    if not rr:
+        return fields, np.empty(0, dtype=np.int64)
+
+    try:
+        rr_array = np.array(rr)
+    except (ValueError, TypeError):
+        raise RequestDecodeError("rrIntervals must be a list of integers")
+    if rr_array.ndim != 1:
+        raise RequestDecodeError("rrIntervals must be a flat list of integers")
+    if rr_array.dtype.kind in "iuf" and rr_out_of_range(rr_array):
+        raise RequestDecodeError("rrIntervals must be 32-bit integers")
+    if rr_array.dtype.kind == "f":
+        # Accept 812.0 like pydantic does, reject 812.5
+        if not np.all(np.isfinite(rr_array)) or not np.all(rr_array == np.floor(rr_array)):
+            raise RequestDecodeError("rrIntervals must contain whole numbers")
+        rr_array = rr_array.astype(np.int64)
+    elif rr_array.dtype.kind not in "iu":
+        raise RequestDecodeError("rrIntervals must be a list of integers")
+    return fields, rr_array
@@ -0,0 +1,187 @@
+# app/core/session_query.py
+"""Population queries over the indexed session and metric columns.
+
+GET /api/hrv/sessions/query takes ``<metric>_min`` / ``<metric>_max`` range
+parameters for any name in RANGE_FILTERS. It combines them with quality,
+tag, device, user and time filters. Every filter compiles to a predicate on a
+plain column. The tag and device filters become IN subqueries on their own
+indexes. The database can therefore answer e.g. "RMSSD < 20, excellent
+quality, last 30 days" from an index range scan instead of loading every
+session and its metrics JSON.
+
+GET /api/hrv/sessions/tags adds tag expressions (a TagFilter): every tag in
+``all``, at least one in ``any`` and none in ``none``. Each required tag is
+an IN subquery on the (tag_id, session_id) index, and exclusions are a NOT
+EXISTS probe on the session_id index, so no filter multiplies session rows.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import exists, select
+
+from app.models.sql_models import HRVMetrics, HRVSession, Tag, session_tags
+
+# Public filter name -> column (SessionMetrics field names, as in the detail view)
+RANGE_FILTERS = {
+    "mean_rr": HRVMetrics.mean_rr,
+    "sdnn": HRVMetrics.sdnn,
+    "rmssd": HRVMetrics.rmssd,
+    "pnn50": HRVMetrics.pnn50,
+    "cv_rr": HRVMetrics.cv_rr,
+    "rr_count": HRVMetrics.rr_count,
+    "lfPower": HRVMetrics.lf_power,
+    "hfPower": HRVMetrics.hf_power,
+    "lfHfRatio": HRVMetrics.lf_hf_ratio,
+    "breathingRate": HRVMetrics.breathing_rate,
+    "quality_score": HRVSession.quality_score,
+    "heart_rate": HRVSession.heart_rate,
+}
+RANGE_SUFFIXES = ("_min", "_max")
+MAX_QUERY_LIMIT = 1000
+# Tags per expression (each one is a subquery)
+MAX_QUERY_TAGS = 20
+
+Range = Tuple[Optional[float], Optional[float]]
+
+
+class QueryError(ValueError):
+    """Invalid filter parameter (maps to HTTP 422)"""
+
+
+class TagFilter(NamedTuple):
+    """Sessions with every tag in all_of, at least one in any_of (if given) and none in none_of"""
+    all_of: Tuple[str, ...] = ()
+    any_of: Tuple[str, ...] = ()
+    none_of: Tuple[str, ...] = ()
+
+    def matches(self, names: Sequence[str]) -> bool:
+        """Python mirror of tag_clauses"""
+        names = set(names)
+        return (
+            all(tag in names for tag in self.all_of)
+            and (not self.any_of or any(tag in names for tag in self.any_of))
+            and not any(tag in names for tag in self.none_of)
+        )
+
+
+def parse_tag_filter(all_of: Optional[List[str]], any_of: Optional[List[str]],
+                     none_of: Optional[List[str]]) -> TagFilter:
+    """Validate the all/any/none tag parameters (duplicates dropped, order kept)"""
+    groups = [tuple(dict.fromkeys(tag.strip() for tag in group or ())) for group in (all_of, any_of, none_of)]
+    if any("" in group for group in groups):
+        raise QueryError("Tag names must not be empty")
+    if sum(len(group) for group in groups) > MAX_QUERY_TAGS:
+        raise QueryError(f"At most {MAX_QUERY_TAGS} tags per query")
+    all_of, any_of, none_of = (set(group) for group in groups)
+    # Such a query can never match; it is almost certainly a mistake
+    conflicting = (all_of & none_of) or (any_of if any_of and any_of <= none_of else set())
+    if conflicting:
+        raise QueryError(f"Tags both required and excluded: {', '.join(sorted(conflicting))}")
+    return TagFilter(*groups)
+
+
+def parse_range_filters(params: Mapping[str, str]) -> Dict[str, Range]:
+    """Collect <name>_min / <name>_max query parameters into {name: (low, high)}.
+
+    Bounds are inclusive. Unknown names are rejected rather than ignored, so a
+    typo cannot silently widen a screening query to the whole population.
+    """
+    ranges: Dict[str, List[Optional[float]]] = {}
+    for key, raw in params.items():
+        if not key.endswith(RANGE_SUFFIXES):
+            continue
+        name, bound = key[:-4], key[-3:]
+        if name not in RANGE_FILTERS:
+            allowed = ", ".join(sorted(RANGE_FILTERS))
+            raise QueryError(f"Unknown range filter '{key}'; use <name>_min/<name>_max with one of: {allowed}")
+        try:
+            value = float(raw)
+        except ValueError:
+            raise QueryError(f"{key} must be a number, got '{raw}'")
+        if value != value:
+            raise QueryError(f"{key} must be a number, got '{raw}'")
+        ranges.setdefault(name, [None, None])[0 if bound == "min" else 1] = value
+
+    for name, (low, high) in ranges.items():
+        if low is not None and high is not None and low > high:
+            raise QueryError(f"{name}_min ({low}) is greater than {name}_max ({high})")
+    return {name: (low, high) for name, (low, high) in ranges.items()}
+
+
+def range_clauses(ranges: Dict[str, Range]) -> List[Any]:
+    clauses = []
+    for name, (low, high) in ranges.items():
+        column = RANGE_FILTERS[name]
+        if low is not None:
+            clauses.append(column >= low)
+        if high is not None:
+            clauses.append(column <= high)
+    return clauses
+
+
+def _tagged(names: Sequence[str]):
+    return select(session_tags.c.session_id).join(Tag, Tag.id == session_tags.c.tag_id).where(Tag.name.in_(names))
+
+
+def tag_clauses(tags: TagFilter) -> List[Any]:
+    clauses = [HRVSession.id.in_(_tagged([tag])) for tag in tags.all_of]
+    if tags.any_of:
+        clauses.append(HRVSession.id.in_(_tagged(tags.any_of)))
+    if tags.none_of:
+        clauses.append(~exists().where(
+            session_tags.c.session_id == HRVSession.id,
+            session_tags.c.tag_id.in_(select(Tag.id).where(Tag.name.in_(tags.none_of)))
+        ))
+    return clauses
+
+
+def needs_metrics(ranges: Dict[str, Range]) -> bool:
+    """Metric ranges require a metrics row, which allows an inner join"""
+    return any(RANGE_FILTERS[name].class_ is HRVMetrics for name in ranges)
+
+
+def range_parameters_openapi() -> Dict[str, Any]:
+    """Document the dynamic range parameters, which FastAPI cannot see"""
+    parameters = []
+    for name in RANGE_FILTERS:
+        for suffix in RANGE_SUFFIXES:
+            parameters.append({
+                "name": f"{name}{suffix}",
+                "in": "query",
+                "required": False,
+                "schema": {"type": "number"},
+                "description": f"Inclusive {'lower' if suffix == '_min' else 'upper'} bound on {name}",
+            })
+    return {"parameters": parameters}
+
+
+def metrics_view(metrics: Optional[HRVMetrics]) -> Optional[Dict[str, Any]]:
+    if metrics is None:
+        return None
+    return {name: getattr(metrics, column.key) for name, column in RANGE_FILTERS.items()
+            if column.class_ is HRVMetrics}
+
+
+def query_results(rows: List[Tuple[HRVSession, Optional[HRVMetrics]]]) -> List[Dict[str, Any]]:
+    """Result view: the list-endpoint session fields plus the metric columns"""
+    return [
+        {
+            "id": session.id,
+            "recordingSessionId": session.recording_session_id,
+            "timestamp": session.timestamp,
+            "user_id": session.user_id,
+            "valid": session.valid,
+            "quality_score": session.quality_score,
+            "quality_label": session.quality_label,
+            "tags": [tag.name for tag in session.tags],
+            "metrics": metrics_view(metrics)
+        }
+        for session, metrics in rows
+    ]
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Stored timestamps are naive UTC; query parameters may carry an offset"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
@@ -0,0 +1,144 @@
+# app/core/shard_admin.py
+"""Shard directory administration.
+
+    status     users and sessions per shard, and directory entries per shard
+    adopt      record directory entries for users already present in a shard
+               (e.g. after enabling sharding on an existing database)
+    move       move one user to another shard
+    rebalance  move users from the fullest to the emptiest shard until the
+               session counts are within one user of each other
+
+Moves copy first and switch the directory second. They then wait --grace
+seconds (by default the shard map cache TTL) so that every worker sees the
+new entry. Only then do they copy the sessions that arrived meanwhile and
+delete the source rows. Ingest keeps running during a move.
+
+Usage:
+    python -m app.core.shard_admin status
+    python -m app.core.shard_admin adopt
+    python -m app.core.shard_admin move USER_ID TARGET_SHARD [--grace SECONDS]
+    python -m app.core.shard_admin rebalance [--max-moves 10] [--dry-run]
+"""
+import argparse
+import sys
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func, insert
+
+from app.config import settings
+from app.core.database import SHARD_URLS, SessionLocal, ShardSessionLocals
+from app.core.sharding import get_shard_map, move_user, shard_user_ids
+from app.models.sql_models import HRVSession, UserShard
+
+
+def shard_loads() -> List[Dict[str, int]]:
+    """Sessions per user on each shard"""
+    loads = []
+    for factory in ShardSessionLocals:
+        db = factory()
+        try:
+            counts = dict(db.query(HRVSession.user_id, func.count(HRVSession.id)).group_by(HRVSession.user_id))
+            loads.append({user_id: counts.get(user_id, 0) for user_id in shard_user_ids(db)})
+        finally:
+            db.close()
+    return loads
+
+
+def status() -> None:
+    directory = SessionLocal()
+    try:
+        entries = dict(directory.query(UserShard.shard, func.count(UserShard.user_id)).group_by(UserShard.shard))
+    finally:
+        directory.close()
+    print(f"{'shard':<6} {'users':>8} {'sessions':>10} {'directory':>10}  url")
+    for index, load in enumerate(shard_loads()):
+        print(f"{index:<6} {len(load):>8} {sum(load.values()):>10} {entries.get(index, 0):>10}  {SHARD_URLS[index]}")
+
+
+def adopt() -> None:
+    directory = SessionLocal()
+    try:
+        known = {user_id for (user_id,) in directory.query(UserShard.user_id)}
+        rows = []
+        for index, load in enumerate(shard_loads()):
+            rows.extend({"user_id": user_id, "shard": index} for user_id in load if user_id not in known)
+            known.update(load)
+        if rows:
+            directory.execute(insert(UserShard), rows)
+            directory.commit()
+    finally:
+        directory.close()
+    print(f"Recorded {len(rows)} users in the shard directory")
+
+
+def plan_rebalance(loads: List[Dict[str, int]], max_moves: int) -> List[Tuple[str, int, int]]:
+    """Greedy moves (user, source, target) from the fullest to the emptiest shard"""
+    totals = [sum(load.values()) for load in loads]
+    users = [dict(load) for load in loads]
+    moves = []
+    while len(moves) < max_moves:
+        source = max(range(len(totals)), key=totals.__getitem__)
+        target = min(range(len(totals)), key=totals.__getitem__)
+        gap = totals[source] - totals[target]
+        # The largest user that still narrows the gap
+        candidates = [(sessions, user_id) for user_id, sessions in users[source].items() if 0 < sessions < gap]
+        if not candidates:
+            break
+        sessions, user_id = max(candidates)
+        moves.append((user_id, source, target))
+        del users[source][user_id]
+        users[target][user_id] = sessions
+        totals[source] -= sessions
+        totals[target] += sessions
+    return moves
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status")
+    commands.add_parser("adopt")
+    move = commands.add_parser("move")
+    move.add_argument("user_id")
+    move.add_argument("target", type=int)
+    move.add_argument("--grace", type=float, default=settings.SHARD_MAP_CACHE_TTL)
+    rebalance = commands.add_parser("rebalance")
+    rebalance.add_argument("--max-moves", type=int, default=10)
+    rebalance.add_argument("--grace", type=float, default=settings.SHARD_MAP_CACHE_TTL)
+    rebalance.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if not ShardSessionLocals:
+        print("DATABASE_SHARD_URLS is not set", file=sys.stderr)
+        return 1
+    if args.command == "status":
+        status()
+        return 0
+    if args.command == "adopt":
+        adopt()
+        return 0
+
+    if args.command == "move":
+        if not 0 <= args.target < len(ShardSessionLocals):
+            print(f"Shard {args.target} does not exist (0-{len(ShardSessionLocals) - 1})", file=sys.stderr)
+            return 1
+        moves = [(args.user_id, None, args.target)]
+    else:
+        moves = plan_rebalance(shard_loads(), args.max_moves)
+        for user_id, source, target in moves:
+            print(f"{user_id}: shard {source} -> {target}")
+        if args.dry_run or not moves:
+            return 0
+
+    directory = SessionLocal()
+    try:
+        for user_id, _, target in moves:
+            result = move_user(directory, ShardSessionLocals, get_shard_map(), user_id, target, args.grace)
+            print(f"{result['user_id']}: shard {result['source']} -> {result['target']}, {result['moved']} sessions copied")
+    finally:
+        directory.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,454 @@
+# app/core/sharding.py
+"""User-keyed sharding of session data.
+
+With DATABASE_SHARD_URLS set, each user's sessions, metrics, RR intervals,
+tags and summary live in exactly one shard database. The ``user_shards``
+directory on DATABASE_URL records which one. New users are placed by a
+stable hash of their id. Workers cache directory entries for
+SHARD_MAP_CACHE_TTL seconds.
+
+``ShardedSessionStore`` routes ingest and the per-user reads to the user's
+shard. It answers lookups by recording id, tag listings, population queries
+and database stats by scatter-gather over all shards. Moving users between
+shards is done by ``python -m app.core.shard_admin``, using the copy and
+delete helpers below.
+"""
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config import settings
+from app.core.append import AppendError, AppendPlan
+from app.core.crud import build_user_summary, get_existing_recording_ids
+from app.core.session_query import Range
+from app.core.storage import SessionStore, SQLSessionStore, StoreConflict, _newest_first
+from app.models.sql_models import (
+    Device,
+    HRVMetrics,
+    HRVSession,
+    RRInterval,
+    Tag,
+    User,
+    UserShard,
+    UserSummary,
+    generate_uuid,
+    session_tags
+)
+
+logger = logging.getLogger(__name__)
+
+# Cached directory entries per worker before the cache is reset
+SHARD_MAP_MAX_CACHED = 100_000
+GATHER_THREADS = 32
+
+
+def home_shard(user_id: str, shard_count: int) -> int:
+    """Stable placement for users without a directory entry"""
+    digest = hashlib.blake2b(user_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+
+class ShardMap:
+    """user_id -> shard index, read from the user_shards directory and cached"""
+
+    def __init__(self, shard_count: int, cache_ttl: float):
+        self.shard_count = shard_count
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[Optional[int], float]] = {}
+
+    def _cached(self, user_id: str) -> Tuple[bool, Optional[int]]:
+        with self._lock:
+            entry = self._cache.get(user_id)
+        if entry is None or entry[1] < time.monotonic():
+            return False, None
+        return True, entry[0]
+
+    def _remember(self, entries: Dict[str, Optional[int]]) -> None:
+        expires_at = time.monotonic() + self.cache_ttl
+        with self._lock:
+            if len(self._cache) + len(entries) > SHARD_MAP_MAX_CACHED:
+                self._cache.clear()
+            for user_id, shard in entries.items():
+                self._cache[user_id] = (shard, expires_at)
+
+    def forget(self, user_id: str) -> None:
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+    def lookup(self, db: Session, user_ids: Iterable[str]) -> Dict[str, Optional[int]]:
+        """Directory entries for these users (None when a user has none yet)"""
+        found: Dict[str, Optional[int]] = {}
+        missing = []
+        for user_id in set(user_ids):
+            hit, shard = self._cached(user_id)
+            if hit:
+                found[user_id] = shard
+            else:
+                missing.append(user_id)
+        if missing:
+            rows = dict(db.query(UserShard.user_id, UserShard.shard).filter(UserShard.user_id.in_(missing)))
+            fetched = {user_id: rows.get(user_id) for user_id in missing}
+            self._remember(fetched)
+            found.update(fetched)
+        return found
+
+    def shard_for(self, db: Session, user_id: str) -> int:
+        shard = self.lookup(db, [user_id])[user_id]
+        return home_shard(user_id, self.shard_count) if shard is None else shard
+
+    def place(self, db: Session, user_ids: Iterable[str]) -> Dict[str, int]:
+        """Shards for users about to be written, recording new users in the directory"""
+        shards = self.lookup(db, user_ids)
+        new_rows = [
+            {"user_id": user_id, "shard": home_shard(user_id, self.shard_count)}
+            for user_id, shard in shards.items() if shard is None
+        ]
+        if new_rows:
+            try:
+                db.execute(insert(UserShard), new_rows)
+                db.commit()
+            except IntegrityError:
+                # Placed concurrently by another worker; read back what won
+                db.rollback()
+                for row in new_rows:
+                    self.forget(row["user_id"])
+                shards.update(self.lookup(db, [row["user_id"] for row in new_rows]))
+            else:
+                placed = {row["user_id"]: row["shard"] for row in new_rows}
+                self._remember(placed)
+                shards.update(placed)
+        return {user_id: home_shard(user_id, self.shard_count) if shard is None else shard
+                for user_id, shard in shards.items()}
+
+    def assign(self, db: Session, user_id: str, shard: int) -> None:
+        """Point a user at a shard (used when moving users)"""
+        entry = db.get(UserShard, user_id)
+        if entry is None:
+            db.add(UserShard(user_id=user_id, shard=shard))
+        else:
+            entry.shard = shard
+        db.commit()
+        self.forget(user_id)
+
+
+_gather_pool: Optional[ThreadPoolExecutor] = None
+_gather_pool_lock = threading.Lock()
+
+
+def gather_pool() -> ThreadPoolExecutor:
+    global _gather_pool
+    with _gather_pool_lock:
+        if _gather_pool is None:
+            _gather_pool = ThreadPoolExecutor(max_workers=GATHER_THREADS, thread_name_prefix="hrv-shard-gather")
+        return _gather_pool
+
+
+class ShardedSessionStore(SessionStore):
+    """SessionStore over one SQLSessionStore per shard.
+
+    A write batch that spans shards is checked for duplicate recording ids on
+    every shard first, then committed shard by shard, so it is atomic per
+    shard only.
+    """
+
+    def __init__(self, directory: Session, shard_sessions: Sequence[sessionmaker], shard_map: ShardMap):
+        self.directory = directory
+        self.shard_map = shard_map
+        self._shard_sessions = shard_sessions
+        self._stores: Dict[int, SQLSessionStore] = {}
+
+    def shard(self, index: int) -> SQLSessionStore:
+        store = self._stores.get(index)
+        if store is None:
+            store = self._stores[index] = SQLSessionStore(self._shard_sessions[index]())
+        return store
+
+    def for_user(self, user_id: str) -> SQLSessionStore:
+        return self.shard(self.shard_map.shard_for(self.directory, user_id))
+
+    def gather(self, call: Callable[[SQLSessionStore], Any]) -> List[Any]:
+        """Run call against every shard in parallel, results in shard order"""
+        stores = [self.shard(index) for index in range(len(self._shard_sessions))]
+        if len(stores) == 1:
+            return [call(stores[0])]
+        return list(gather_pool().map(call, stores))
+
+    def get_session_by_recording_id(self, recording_session_id: str) -> Optional[HRVSession]:
+        for session in self.gather(lambda store: store.get_session_by_recording_id(recording_session_id)):
+            if session is not None:
+                return session
+        return None
+
+    def get_session_id(self, recording_session_id: str) -> Optional[str]:
+        for session_id in self.gather(lambda store: store.get_session_id(recording_session_id)):
+            if session_id is not None:
+                return session_id
+        return None
+
+    def create_sessions(self, entries: List[Dict[str, Any]]) -> List[str]:
+        shards = self.shard_map.place(self.directory, {entry["raw_data"].user_id for entry in entries})
+        groups: Dict[int, List[int]] = {}
+        for position, entry in enumerate(entries):
+            groups.setdefault(shards[entry["raw_data"].user_id], []).append(position)
+
+        if len(groups) > 1:
+            recording_ids = [entry["raw_data"].recordingSessionId for entry in entries]
+            if len(set(recording_ids)) != len(recording_ids) or any(self.gather(
+                lambda store: get_existing_recording_ids(store.db, recording_ids)
+            )):
+                raise StoreConflict("Duplicate recordingSessionId")
+
+        session_ids: List[Optional[str]] = [None] * len(entries)
+        for shard, positions in groups.items():
+            stored = self.shard(shard).create_sessions([entries[position] for position in positions])
+            for position, session_id in zip(positions, stored):
+                session_ids[position] = session_id
+        return session_ids
+
+    def append_rr(self, recording_session_id: str, rr_chunk: np.ndarray, offset: Optional[int] = None,
+                  motion_artifacts: bool = False, final: bool = False) -> AppendPlan:
+        # Recording ids are not in the directory: find the session's user, then write to the
+        # user's shard (during a move the session is on both, and only the target is kept)
+        owners = self.gather(lambda store: store.db.query(HRVSession.user_id).filter(
+            HRVSession.recording_session_id == recording_session_id
+        ).scalar())
+        user_id = next((owner for owner in owners if owner is not None), None)
+        if user_id is None:
+            raise AppendError(f"Session with ID {recording_session_id} not found", status_code=404)
+        shard = self.shard_map.shard_for(self.directory, user_id)
+        return self.shard(shard).append_rr(recording_session_id, rr_chunk, offset, motion_artifacts, final)
+
+    def get_sessions_by_user(self, user_id: str, skip: int = 0, limit: int = 100) -> List[HRVSession]:
+        return self.for_user(user_id).get_sessions_by_user(user_id, skip, limit)
+
+    def get_sessions_by_tag(self, tag_name: str, skip: int = 0, limit: int = 100) -> List[HRVSession]:
+        # Each shard returns its first skip + limit; the page is cut from the concatenation
+        pages = self.gather(lambda store: store.get_sessions_by_tag(tag_name, 0, skip + limit))
+        return [session for page in pages for session in page][skip:skip + limit]
+
+    def query_sessions(self, ranges: Dict[str, Range], user_id: Optional[str] = None, skip: int = 0,
+                       limit: int = 100, **filters: Any) -> List[Tuple[HRVSession, Optional[HRVMetrics]]]:
+        if user_id is not None:
+            return self.for_user(user_id).query_sessions(ranges, user_id=user_id, skip=skip, limit=limit, **filters)
+        pages = self.gather(lambda store: store.query_sessions(ranges, skip=0, limit=skip + limit, **filters))
+        rows = sorted((row for page in pages for row in page), key=_newest_first, reverse=True)
+        return rows[skip:skip + limit]
+
+    def tag_facets(self, ranges: Dict[str, Range], **filters: Any) -> Tuple[int, Dict[str, int]]:
+        if filters.get("user_id") is not None:
+            return self.for_user(filters["user_id"]).tag_facets(ranges, **filters)
+        total, counts = 0, {}
+        for shard_total, shard_counts in self.gather(lambda store: store.tag_facets(ranges, **filters)):
+            total += shard_total
+            for name, count in shard_counts.items():
+                counts[name] = counts.get(name, 0) + count
+        return total, counts
+
+    def get_user_summary(self, user_id: str) -> Optional[UserSummary]:
+        return self.for_user(user_id).get_user_summary(user_id)
+
+    def get_rr_intervals(self, session_id: str) -> np.ndarray:
+        for rr in self.gather(lambda store: store.get_rr_intervals(session_id)):
+            if rr.size:
+                return rr
+        return np.empty(0, dtype=np.int64)
+
+    def counts(self) -> Dict[str, int]:
+        def shard_counts(store: SQLSessionStore):
+            db = store.db
+            return (
+                db.query(func.count(User.id)).scalar(),
+                db.query(func.count(HRVSession.id)).scalar(),
+                set(db.query(Device.model, Device.firmware_version)),
+                {name for (name,) in db.query(Tag.name)}
+            )
+
+        # Devices and tags are created per shard, so count distinct ones
+        results = self.gather(shard_counts)
+        return {
+            "users": sum(users for users, _, _, _ in results),
+            "sessions": sum(sessions for _, sessions, _, _ in results),
+            "devices": len(set().union(*(devices for _, _, devices, _ in results))),
+            "tags": len(set().union(*(tags for _, _, _, tags in results)))
+        }
+
+    def latest_sessions(self, limit: int = 5) -> List[HRVSession]:
+        pages = self.gather(lambda store: store.latest_sessions(limit))
+        sessions = [session for page in pages for session in page]
+        sessions.sort(key=lambda session: session.created_at or datetime.min, reverse=True)
+        return sessions[:limit]
+
+    def close(self) -> None:
+        for store in self._stores.values():
+            store.close()
+        self.directory.close()
+
+
+_shard_map: Optional[ShardMap] = None
+
+
+def get_shard_map() -> ShardMap:
+    global _shard_map
+    from app.core.database import ShardSessionLocals
+    if _shard_map is None:
+        _shard_map = ShardMap(len(ShardSessionLocals), settings.SHARD_MAP_CACHE_TTL)
+    return _shard_map
+
+
+def sharded_store(directory: Session) -> ShardedSessionStore:
+    from app.core.database import ShardSessionLocals
+    return ShardedSessionStore(directory, ShardSessionLocals, get_shard_map())
+
+
+def _rows(db: Session, table, *where) -> List[Dict[str, Any]]:
+    return [dict(row) for row in db.execute(select(table).where(*where)).mappings()]
+
+
+def _session_versions(db: Session, user_id: str) -> Dict[str, Tuple[Any, int]]:
+    """Recording id -> (rr_state, RR row count) of a user's sessions; both change when RR is appended"""
+    counts = dict(
+        db.query(HRVSession.recording_session_id, func.count(RRInterval.id))
+        .join(RRInterval, RRInterval.session_id == HRVSession.id)
+        .filter(HRVSession.user_id == user_id)
+        .group_by(HRVSession.recording_session_id)
+    )
+    return {
+        recording_id: (state, counts.get(recording_id, 0))
+        for recording_id, state in db.query(HRVSession.recording_session_id, HRVSession.rr_state)
+        .filter(HRVSession.user_id == user_id)
+    }
+
+
+def _delete_sessions(db: Session, session_ids) -> int:
+    """Delete sessions with their RR rows, metrics and tag links; returns sessions deleted"""
+    db.execute(delete(RRInterval).where(RRInterval.session_id.in_(session_ids)))
+    db.execute(delete(HRVMetrics).where(HRVMetrics.session_id.in_(session_ids)))
+    db.execute(delete(session_tags).where(session_tags.c.session_id.in_(session_ids)))
+    return db.execute(delete(HRVSession).where(HRVSession.id.in_(session_ids))).rowcount
+
+
+def copy_user(source: Session, target: Session, user_id: str) -> int:
+    """Copy a user's rows from one shard to another.
+
+    Sessions already on the target are skipped unless RR intervals were
+    appended to the source copy since (their rr_state or RR count differs);
+    those are replaced. Session, metrics and RR ids are kept (they are UUIDs);
+    devices and tags are matched by model/firmware and name on the target.
+    The target summary is rebuilt from the sessions it ends up with. Returns
+    the sessions copied.
+    """
+    user_rows = _rows(source, User.__table__, User.id == user_id)
+    if not user_rows:
+        return 0
+    if target.get(User, user_id) is None:
+        target.execute(insert(User), user_rows)
+
+    sessions = _rows(source, HRVSession.__table__, HRVSession.user_id == user_id)
+    present = get_existing_recording_ids(target, [row["recording_session_id"] for row in sessions])
+    if present:
+        source_versions, target_versions = _session_versions(source, user_id), _session_versions(target, user_id)
+        changed = {recording_id for recording_id in present
+                   if source_versions.get(recording_id) != target_versions.get(recording_id)}
+        if changed:
+            _delete_sessions(target, [session_id for (session_id,) in target.query(HRVSession.id).filter(
+                HRVSession.recording_session_id.in_(changed)
+            )])
+        present = present - changed
+    sessions = [row for row in sessions if row["recording_session_id"] not in present]
+    session_ids = [row["id"] for row in sessions]
+    if sessions:
+        devices = {}
+        for row in _rows(source, Device.__table__, Device.id.in_({row["device_id"] for row in sessions})):
+            existing = target.query(Device.id).filter(
+                Device.model == row["model"], Device.firmware_version == row["firmware_version"]
+            ).first()
+            if existing is None:
+                new_id = generate_uuid()
+                target.execute(insert(Device), [{**row, "id": new_id}])
+                devices[row["id"]] = new_id
+            else:
+                devices[row["id"]] = existing.id
+        for row in sessions:
+            row["device_id"] = devices.get(row["device_id"], row["device_id"])
+
+        links = [dict(row) for row in source.execute(
+            select(session_tags.c.session_id, Tag.name)
+            .join(Tag, Tag.id == session_tags.c.tag_id)
+            .where(session_tags.c.session_id.in_(session_ids))
+        ).mappings()]
+        names = {link["name"] for link in links}
+        tag_ids = {name: tag_id for tag_id, name in target.query(Tag.id, Tag.name).filter(Tag.name.in_(names))}
+        new_tags = [{"id": generate_uuid(), "name": name} for name in names - tag_ids.keys()]
+        if new_tags:
+            target.execute(insert(Tag), new_tags)
+            tag_ids.update({tag["name"]: tag["id"] for tag in new_tags})
+
+        target.execute(insert(HRVSession), sessions)
+        if links:
+            target.execute(insert(session_tags), [
+                {"session_id": link["session_id"], "tag_id": tag_ids[link["name"]]} for link in links
+            ])
+        metrics = _rows(source, HRVMetrics.__table__, HRVMetrics.session_id.in_(session_ids))
+        if metrics:
+            target.execute(insert(HRVMetrics), metrics)
+        rr_rows = _rows(source, RRInterval.__table__, RRInterval.session_id.in_(session_ids))
+        if rr_rows:
+            target.execute(insert(RRInterval), rr_rows)
+
+    target.execute(delete(UserSummary).where(UserSummary.user_id == user_id))
+    target.add(build_user_summary(target, user_id))
+    target.commit()
+    return len(sessions)
+
+
+def delete_user(db: Session, user_id: str) -> int:
+    """Remove a user's rows from a shard after they were moved; returns sessions deleted"""
+    deleted = _delete_sessions(db, select(HRVSession.id).where(HRVSession.user_id == user_id).scalar_subquery())
+    db.execute(delete(UserSummary).where(UserSummary.user_id == user_id))
+    db.execute(delete(User).where(User.id == user_id))
+    db.commit()
+    return deleted
+
+
+def move_user(directory: Session, shard_sessions: Sequence[sessionmaker], shard_map: ShardMap,
+              user_id: str, target: int, grace: float) -> Dict[str, Any]:
+    """Move one user to another shard without losing concurrent ingests.
+
+    1. copy the user's rows to the target shard
+    2. point the directory at the target
+    3. wait `grace` seconds, so that every worker's cached entry expires and
+       new ingests land on the target
+    4. copy again, picking up sessions written to the source meanwhile
+    5. delete the user from the source shard
+    """
+    source = shard_map.shard_for(directory, user_id)
+    if source == target:
+        return {"user_id": user_id, "source": source, "target": target, "moved": 0}
+
+    source_db, target_db = shard_sessions[source](), shard_sessions[target]()
+    try:
+        copied = copy_user(source_db, target_db, user_id)
+        shard_map.assign(directory, user_id, target)
+        if grace > 0:
+            time.sleep(grace)
+        copied += copy_user(source_db, target_db, user_id)
+        deleted = delete_user(source_db, user_id)
+    finally:
+        source_db.close()
+        target_db.close()
+    logger.info(f"Moved user {user_id} from shard {source} to {target} ({copied} sessions copied, {deleted} deleted)")
+    return {"user_id": user_id, "source": source, "target": target, "moved": copied}
+
+
+def shard_user_ids(db: Session) -> Set[str]:
+    return {user_id for (user_id,) in db.query(User.id)}
@@ -0,0 +1,382 @@
+# app/core/sketches.py
+"""Population percentile ranks from mergeable quantile sketches.
+
+Each (segment, metric) pair keeps a log-bucketed sketch (DDSketch). Values
+fall into buckets whose bounds grow by a factor (1 + ALPHA) / (1 - ALPHA),
+so every rank is exact up to the one bucket holding the queried value: a
+relative error of ALPHA in value. Merging two sketches adds their bucket
+counts, and a sketch never holds more than MAX_BINS buckets. Segments are
+"all", "device:<model>" and "tag:<name>".
+
+Ingest adds each valid session's metrics to this worker's pending sketches.
+A background flusher merges the pending sketches into the metric_sketches
+table every SKETCH_FLUSH_SECONDS and reloads the merged rows. Percentile
+lookups read the loaded rows plus the local counts not loaded yet. That
+costs one cumulative-count lookup per segment, however large the population.
+
+Sessions stored before sketches existed are added with:
+
+    python -m app.core.sketches rebuild
+"""
+import argparse
+import logging
+import math
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal, ShardSessionLocals
+from app.core.session_query import RANGE_FILTERS
+from app.models.sql_models import Device, HRVMetrics, HRVSession, MetricSketch, Tag, session_tags
+
+logger = logging.getLogger(__name__)
+
+# Metrics users compare (SessionMetrics names, all kept in the summary's latest_metrics)
+SKETCH_METRICS = ("mean_rr", "sdnn", "rmssd", "pnn50", "lfHfRatio", "hfPower", "breathingRate")
+ALPHA = 0.01
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+LOG_GAMMA = math.log(GAMMA)
+# Values at or below this (e.g. pnn50 of 0) share one bucket
+MIN_VALUE = 1e-6
+# 1024 buckets cover 9 orders of magnitude at 1% accuracy; beyond that the lowest merge
+MAX_BINS = 1024
+
+SegmentKey = Tuple[str, str]  # (segment, metric)
+
+
+def _key(value: float) -> int:
+    return math.ceil(math.log(value) / LOG_GAMMA)
+
+
+class QuantileSketch:
+    """Log-bucketed quantile sketch: counts per bucket from `offset` upwards, plus a zero bucket"""
+
+    __slots__ = ("zero", "offset", "counts", "_cumulative")
+
+    def __init__(self, zero: int = 0, offset: int = 0, counts: Optional[np.ndarray] = None):
+        self.zero = zero
+        self.offset = offset
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else counts
+        self._cumulative: Optional[np.ndarray] = None
+
+    @property
+    def count(self) -> int:
+        return self.zero + int(self.counts.sum())
+
+    def _cover(self, low: int, high: int) -> None:
+        """Grow the bucket array to keys [low, high]"""
+        if not self.counts.size:
+            self.offset, self.counts = low, np.zeros(high - low + 1, dtype=np.int64)
+            return
+        start, end = min(low, self.offset), max(high, self.offset + self.counts.size - 1)
+        if start < self.offset or end >= self.offset + self.counts.size:
+            counts = np.zeros(end - start + 1, dtype=np.int64)
+            counts[self.offset - start:self.offset - start + self.counts.size] = self.counts
+            self.offset, self.counts = start, counts
+
+    def _collapse(self) -> None:
+        """Fold the lowest buckets together so at most MAX_BINS remain"""
+        excess = self.counts.size - MAX_BINS
+        if excess > 0:
+            self.counts[excess] += self.counts[:excess].sum()
+            self.counts = self.counts[excess:].copy()
+            self.offset += excess
+
+    def add(self, value: float) -> None:
+        self._cumulative = None
+        if value <= MIN_VALUE:
+            self.zero += 1
+            return
+        key = _key(value)
+        self._cover(key, key)
+        self.counts[key - self.offset] += 1
+        self._collapse()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        self._cumulative = None
+        self.zero += other.zero
+        if other.counts.size:
+            self._cover(other.offset, other.offset + other.counts.size - 1)
+            start = other.offset - self.offset
+            self.counts[start:start + other.counts.size] += other.counts
+            self._collapse()
+
+    def count_below(self, value: float) -> float:
+        """Values below `value`, counting half of its own bucket"""
+        if value <= MIN_VALUE:
+            return self.zero / 2
+        if self._cumulative is None:
+            self._cumulative = np.concatenate(([0], np.cumsum(self.counts)))
+        index = min(max(_key(value) - self.offset, -1), self.counts.size)
+        if index < 0:
+            return float(self.zero)
+        if index == self.counts.size:
+            return float(self.zero + self._cumulative[-1])
+        return self.zero + self._cumulative[index] + self.counts[index] / 2
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate value at quantile q (0..1)"""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        if rank < self.zero:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.counts), rank - self.zero, side="right"))
+        index = min(index, self.counts.size - 1)
+        # Midpoint of the bucket (GAMMA^(k-1), GAMMA^k] in relative terms
+        return 2 * GAMMA ** (self.offset + index) / (GAMMA + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"zero": self.zero, "offset": self.offset, "counts": self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        return cls(data.get("zero", 0), data.get("offset", 0), np.asarray(data.get("counts", []), dtype=np.int64))
+
+
+def session_segments(device_model: Optional[str], tags: Iterable[str]) -> List[str]:
+    segments = ["all"]
+    if device_model:
+        segments.append(f"device:{device_model}")
+    segments.extend(f"tag:{tag}" for tag in tags)
+    return segments
+
+
+class SketchRegistry:
+    """Persisted sketches as last loaded, plus this worker's not yet flushed additions"""
+
+    def __init__(self, max_segments: int):
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self._loaded: Dict[SegmentKey, QuantileSketch] = {}
+        self._pending: Dict[SegmentKey, QuantileSketch] = {}
+        # Written by the last flush but not yet part of _loaded
+        self._flushed: Dict[SegmentKey, QuantileSketch] = {}
+        self._segments: set = set()
+
+    def record(self, device_model: Optional[str], tags: Iterable[str], metrics: Dict[str, Any]) -> None:
+        """Add one valid session's metrics"""
+        with self._lock:
+            for segment in session_segments(device_model, tags):
+                if segment not in self._segments:
+                    if len(self._segments) >= self.max_segments:
+                        continue
+                    self._segments.add(segment)
+                for name in SKETCH_METRICS:
+                    value = metrics.get(name)
+                    if value is not None and math.isfinite(value):
+                        self._pending.setdefault((segment, name), QuantileSketch()).add(float(value))
+
+    def flush(self, db: Session) -> int:
+        """Merge pending additions into metric_sketches; returns the rows written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed = pending
+        if not pending:
+            return 0
+        try:
+            for (segment, name), sketch in sorted(pending.items()):
+                row = db.query(MetricSketch).filter(
+                    MetricSketch.segment == segment, MetricSketch.metric == name
+                ).with_for_update().first()
+                if row is None:
+                    db.add(MetricSketch(segment=segment, metric=name, count=sketch.count, sketch=sketch.to_dict()))
+                    continue
+                merged = QuantileSketch.from_dict(row.sketch)
+                merged.merge(sketch)
+                row.count, row.sketch = merged.count, merged.to_dict()
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Keep the additions for the next flush
+            with self._lock:
+                self._flushed = {}
+                for key, sketch in pending.items():
+                    self._pending.setdefault(key, QuantileSketch()).merge(sketch)
+            raise
+        return len(pending)
+
+    def load(self, db: Session) -> None:
+        """Replace the loaded sketches with the stored ones, which include everything flushed"""
+        loaded = {(row.segment, row.metric): QuantileSketch.from_dict(row.sketch) for row in db.query(MetricSketch)}
+        with self._lock:
+            self._loaded = loaded
+            self._flushed = {}
+            self._segments = {segment for segment, _ in loaded} | {segment for segment, _ in self._pending}
+
+    def percentile(self, segment: str, name: str, value: float) -> Tuple[int, Optional[float]]:
+        """(population size, percentile rank of value) in one segment"""
+        with self._lock:
+            key = (segment, name)
+            sketches = [sketches[key] for sketches in (self._loaded, self._flushed, self._pending) if key in sketches]
+            total = sum(sketch.count for sketch in sketches)
+            if not total:
+                return 0, None
+            return total, 100 * sum(sketch.count_below(value) for sketch in sketches) / total
+
+
+class SketchFlusher:
+    """Thread that periodically flushes this worker's sketches and reloads everyone's"""
+
+    def __init__(self, registry: SketchRegistry, interval: float):
+        self.registry = registry
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="hrv-sketch-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush what is pending, then stop"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _cycle(self) -> None:
+        db = SessionLocal()
+        try:
+            self.registry.flush(db)
+            self.registry.load(db)
+        except Exception as e:
+            logger.error(f"Sketch flush failed: {e}")
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        self._cycle()
+        while not self._stopping.wait(self.interval):
+            self._cycle()
+        self._cycle()
+
+
+_registry: Optional[SketchRegistry] = None
+_flusher: Optional[SketchFlusher] = None
+
+
+def start_sketches(flush_interval: float, max_segments: int) -> SketchRegistry:
+    global _registry, _flusher
+    _registry = SketchRegistry(max_segments)
+    _flusher = SketchFlusher(_registry, flush_interval)
+    _flusher.start()
+    return _registry
+
+
+def stop_sketches() -> None:
+    global _registry, _flusher
+    if _flusher is not None:
+        _flusher.stop()
+        _flusher = None
+    _registry = None
+
+
+def get_sketches() -> Optional[SketchRegistry]:
+    return _registry
+
+
+def record_session_metrics(entry: Dict[str, Any]) -> None:
+    """Add a stored session entry (see ingest.session_entry) to the sketches"""
+    if entry["valid"] and entry.get("metrics"):
+        raw_data = entry["raw_data"]
+        record_metrics(raw_data.device_info.get("model"), raw_data.tags, entry["metrics"])
+
+
+def record_metrics(device_model: Optional[str], tags: Iterable[str], metrics: Dict[str, Any]) -> None:
+    """Add one valid session's metrics to the sketches when they are enabled"""
+    if _registry is not None:
+        _registry.record(device_model, tags, metrics)
+
+
+def percentile_response(registry: SketchRegistry, metric: str, value: float, source: str,
+                        device_model: Optional[str] = None, tag: Optional[str] = None) -> Dict[str, Any]:
+    """Response for GET /api/hrv/percentiles: the value's rank in the population and the requested segments"""
+    segments = session_segments(device_model, [tag] if tag else [])
+    ranks = []
+    for segment in segments:
+        count, percentile = registry.percentile(segment, metric, value)
+        ranks.append({"segment": segment, "count": count, "percentile": percentile})
+    return {
+        "metric": metric,
+        "value": value,
+        "source": source,
+        "relative_accuracy": ALPHA,
+        "segments": ranks
+    }
+
+
+def _scan_sessions(db: Session, sketches: Dict[SegmentKey, QuantileSketch], chunk_size: int) -> int:
+    """Add every stored session's metrics in one database to `sketches`; returns the sessions scanned"""
+    columns = [RANGE_FILTERS[name] for name in SKETCH_METRICS]
+    scanned = 0
+
+    def add(segment: str, values) -> None:
+        for name, value in zip(SKETCH_METRICS, values):
+            if value is not None and math.isfinite(value):
+                sketches.setdefault((segment, name), QuantileSketch()).add(float(value))
+
+    by_device = (
+        db.query(Device.model, *columns)
+        .select_from(HRVMetrics)
+        .join(HRVSession, HRVSession.id == HRVMetrics.session_id)
+        .join(Device, Device.id == HRVSession.device_id, isouter=True)
+        .yield_per(chunk_size)
+    )
+    for model, *values in by_device:
+        scanned += 1
+        add("all", values)
+        if model:
+            add(f"device:{model}", values)
+
+    by_tag = (
+        db.query(Tag.name, *columns)
+        .select_from(HRVMetrics)
+        .join(session_tags, session_tags.c.session_id == HRVMetrics.session_id)
+        .join(Tag, Tag.id == session_tags.c.tag_id)
+        .yield_per(chunk_size)
+    )
+    for tag, *values in by_tag:
+        add(f"tag:{tag}", values)
+    return scanned
+
+
+def rebuild_sketches(db: Session, session_dbs: Optional[List[Session]] = None, chunk_size: int = 10000) -> int:
+    """Recompute every sketch from hrv_metrics, replacing the stored ones; returns the sessions scanned.
+
+    Sessions are read from `session_dbs` (the shards, when sharded) and the
+    sketches written to `db`.
+    """
+    sketches: Dict[SegmentKey, QuantileSketch] = {}
+    scanned = sum(_scan_sessions(source, sketches, chunk_size) for source in (session_dbs or [db]))
+    db.query(MetricSketch).delete()
+    db.add_all(
+        MetricSketch(segment=segment, metric=name, count=sketch.count, sketch=sketch.to_dict())
+        for (segment, name), sketch in sketches.items()
+    )
+    db.commit()
+    return scanned
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+    db = SessionLocal()
+    shard_dbs = [session_local() for session_local in ShardSessionLocals]
+    try:
+        scanned = rebuild_sketches(db, shard_dbs)
+    finally:
+        for shard_db in shard_dbs:
+            shard_db.close()
+        db.close()
+    print(f"Rebuilt sketches from {scanned} sessions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,426 @@
+# app/core/storage.py
+"""Storage backends behind the session endpoints.
+
+Handlers, ingest, background jobs and the write-behind persister go through a
+``SessionStore`` rather than calling crud with a SQLAlchemy session:
+
+  SQLSessionStore    - crud over one SQLAlchemy session. It serves Postgres and
+                       SQLite (database.py applies WAL pragmas to SQLite, and
+                       write-behind batches its writes by default)
+  MemorySessionStore - process-local dicts. No database, nothing persisted
+
+Both return the same ORM classes (the memory store keeps transient instances),
+so the response views in the handlers work unchanged. STORAGE_BACKEND picks
+the backend. tests/test_storage_conformance.py checks that every backend
+behaves the same.
+"""
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from fastapi import Depends
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.archive import read_archive
+from app.core.append import AppendError, AppendPlan, check_offset, plan_append
+from app.core.crud import (
+    append_rr_chunk,
+    apply_append,
+    build_metrics_row,
+    build_session_row,
+    build_user_summary,
+    create_hrv_sessions_bulk,
+    get_session_by_recording_id,
+    get_rr_values,
+    get_session_id_by_recording_id,
+    get_sessions_by_tag,
+    get_sessions_by_user,
+    get_user_summary,
+    save_user_summary,
+    query_sessions,
+    tag_facets
+)
+from app.core.database import ShardSessionLocals, get_db, get_lazy_read_db, get_read_db
+from app.core.session_query import RANGE_FILTERS, Range, TagFilter, naive_utc
+from app.core.summaries import apply_session, new_summary
+from app.models.sql_models import Device, HRVMetrics, HRVSession, Tag, User, UserSummary, generate_uuid
+
+STORAGE_BACKENDS = ("sql", "memory")
+
+
+class StoreConflict(Exception):
+    """A write collided with existing data (duplicate recording id or a concurrent insert)"""
+
+
+class SessionStore(ABC):
+    """Operations the session endpoints need from storage"""
+
+    @abstractmethod
+    def get_session_by_recording_id(self, recording_session_id: str) -> Optional[HRVSession]:
+        ...
+
+    @abstractmethod
+    def get_session_id(self, recording_session_id: str) -> Optional[str]:
+        """Internal id for a recording id, without loading the session"""
+
+    @abstractmethod
+    def create_sessions(self, entries: List[Dict[str, Any]]) -> List[str]:
+        """Store processed session entries (see ingest.session_entry) atomically.
+
+        Returns the new session ids in entry order and raises StoreConflict when
+        nothing was stored because of a conflicting row.
+        """
+
+    @abstractmethod
+    def append_rr(self, recording_session_id: str, rr_chunk: np.ndarray, offset: Optional[int] = None,
+                  motion_artifacts: bool = False, final: bool = False) -> AppendPlan:
+        """Append RR intervals to a stored session and update its validation, metrics and summary atomically.
+
+        See app/core/append.py. Raises AppendError for unknown or archived
+        sessions and for an offset that does not match the stored beats.
+        """
+
+    @abstractmethod
+    def get_sessions_by_user(self, user_id: str, skip: int = 0, limit: int = 100) -> List[HRVSession]:
+        ...
+
+    @abstractmethod
+    def get_sessions_by_tag(self, tag_name: str, skip: int = 0, limit: int = 100) -> List[HRVSession]:
+        ...
+
+    @abstractmethod
+    def query_sessions(self, ranges: Dict[str, Range], **filters: Any) -> List[Tuple[HRVSession, Optional[HRVMetrics]]]:
+        """Same filters and ordering as crud.query_sessions"""
+
+    @abstractmethod
+    def tag_facets(self, ranges: Dict[str, Range], **filters: Any) -> Tuple[int, Dict[str, int]]:
+        """Same filters as crud.tag_facets: the matching session count and per-tag counts among them"""
+
+    @abstractmethod
+    def get_user_summary(self, user_id: str) -> Optional[UserSummary]:
+        """The user's summary, rebuilt from their sessions if missing; None for unknown users"""
+
+    @abstractmethod
+    def get_rr_intervals(self, session_id: str) -> np.ndarray:
+        """Stored RR intervals of a session in recording order"""
+
+    @abstractmethod
+    def counts(self) -> Dict[str, int]:
+        """Row counts for users, sessions, devices and tags"""
+
+    @abstractmethod
+    def latest_sessions(self, limit: int = 5) -> List[HRVSession]:
+        """Most recently stored sessions first"""
+
+    def close(self) -> None:
+        """Release pooled resources while waiting; the store stays usable"""
+
+
+class SQLSessionStore(SessionStore):
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_session_by_recording_id(self, recording_session_id: str) -> Optional[HRVSession]:
+        return get_session_by_recording_id(self.db, recording_session_id)
+
+    def get_session_id(self, recording_session_id: str) -> Optional[str]:
+        return get_session_id_by_recording_id(self.db, recording_session_id)
+
+    def create_sessions(self, entries: List[Dict[str, Any]]) -> List[str]:
+        try:
+            return create_hrv_sessions_bulk(self.db, entries)
+        except IntegrityError as e:
+            self.db.rollback()
+            raise StoreConflict(str(e.orig)) from e
+
+    def append_rr(self, recording_session_id: str, rr_chunk: np.ndarray, offset: Optional[int] = None,
+                  motion_artifacts: bool = False, final: bool = False) -> AppendPlan:
+        try:
+            return append_rr_chunk(self.db, recording_session_id, rr_chunk, offset, motion_artifacts, final)
+        except AppendError:
+            # Release the row lock
+            self.db.rollback()
+            raise
+
+    def get_sessions_by_user(self, user_id: str, skip: int = 0, limit: int = 100) -> List[HRVSession]:
+        return get_sessions_by_user(self.db, user_id, skip, limit)
+
+    def get_sessions_by_tag(self, tag_name: str, skip: int = 0, limit: int = 100) -> List[HRVSession]:
+        return get_sessions_by_tag(self.db, tag_name, skip, limit)
+
+    def query_sessions(self, ranges: Dict[str, Range], **filters: Any) -> List[Tuple[HRVSession, Optional[HRVMetrics]]]:
+        return query_sessions(self.db, ranges, **filters)
+
+    def tag_facets(self, ranges: Dict[str, Range], **filters: Any) -> Tuple[int, Dict[str, int]]:
+        return tag_facets(self.db, ranges, **filters)
+
+    def get_user_summary(self, user_id: str) -> Optional[UserSummary]:
+        summary = get_user_summary(self.db, user_id)
+        if summary is None:
+            # Users whose sessions predate summaries (or migration 0007) get one rebuilt
+            # and saved, so later reads are a primary-key lookup again
+            if not self.db.get(User, user_id):
+                return None
+            summary = build_user_summary(self.db, user_id)
+            save_user_summary(self.db, summary)
+        return summary
+
+    def get_rr_intervals(self, session_id: str) -> np.ndarray:
+        rr = get_rr_values(self.db, session_id)
+        if not rr.size:
+            # Archived series are loaded from their file on demand
+            path = self.db.query(HRVSession.rr_archive).filter(HRVSession.id == session_id).scalar()
+            if path:
+                return read_archive(path)
+        return rr
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "users": self.db.query(func.count(User.id)).scalar(),
+            "sessions": self.db.query(func.count(HRVSession.id)).scalar(),
+            "devices": self.db.query(func.count(Device.id)).scalar(),
+            "tags": self.db.query(func.count(Tag.id)).scalar()
+        }
+
+    def latest_sessions(self, limit: int = 5) -> List[HRVSession]:
+        return self.db.query(HRVSession).order_by(HRVSession.created_at.desc()).limit(limit).all()
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def _newest_first(row: Tuple[HRVSession, Optional[HRVMetrics]]):
+    session = row[0]
+    return (session.timestamp or datetime.min, session.id)
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions held as transient ORM objects in process memory.
+
+    Each worker process has its own store, so run a single worker. Nothing
+    survives a restart. RR intervals are kept as one NumPy array per session
+    rather than a row per beat.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._sessions: Dict[str, HRVSession] = {}  # by recording id, in insertion order
+        self._users: Dict[str, User] = {}
+        self._devices: Dict[Tuple[Optional[str], Optional[str]], Device] = {}
+        self._tags: Dict[str, Tag] = {}
+        self._summaries: Dict[str, UserSummary] = {}
+        self._user_sessions: Dict[str, List[HRVSession]] = {}
+        self._tag_sessions: Dict[str, List[HRVSession]] = {}
+        self._rr: Dict[str, np.ndarray] = {}
+
+    def get_session_by_recording_id(self, recording_session_id: str) -> Optional[HRVSession]:
+        return self._sessions.get(recording_session_id)
+
+    def get_session_id(self, recording_session_id: str) -> Optional[str]:
+        session = self._sessions.get(recording_session_id)
+        return session.id if session is not None else None
+
+    def create_sessions(self, entries: List[Dict[str, Any]]) -> List[str]:
+        with self._lock:
+            # Check the whole batch first so a conflict stores nothing
+            recording_ids = [entry["raw_data"].recordingSessionId for entry in entries]
+            if len(set(recording_ids)) != len(recording_ids) or any(rid in self._sessions for rid in recording_ids):
+                raise StoreConflict("Duplicate recordingSessionId")
+            return [self._create_session(entry) for entry in entries]
+
+    def _create_session(self, entry: Dict[str, Any]) -> str:
+        raw_data = entry["raw_data"]
+        now = datetime.utcnow()
+        user = self._users.get(raw_data.user_id)
+        if user is None:
+            user = self._users[raw_data.user_id] = User(
+                id=raw_data.user_id, username=raw_data.user_id.split('@')[0], email=raw_data.user_id,
+                created_at=now, updated_at=now
+            )
+            self._summaries[user.id] = new_summary(user.id)
+        device_key = (raw_data.device_info.get("model"), raw_data.device_info.get("firmwareVersion"))
+        device = self._devices.get(device_key)
+        if device is None:
+            device = self._devices[device_key] = Device(
+                id=generate_uuid(), model=device_key[0], firmware_version=device_key[1], created_at=now
+            )
+        tags = []
+        for name in dict.fromkeys(raw_data.tags):
+            if name not in self._tags:
+                self._tags[name] = Tag(id=generate_uuid(), name=name)
+            tags.append(self._tags[name])
+
+        session_row = build_session_row(entry, generate_uuid(), device.id)
+        # Match what the DateTime column stores
+        session_row["timestamp"] = naive_utc(session_row["timestamp"])
+        session = HRVSession(**session_row, created_at=now)
+        session.device = device
+        session.tags = tags
+        metrics_dict = entry.get("metrics")
+        if entry["valid"] and metrics_dict:
+            session.metrics = HRVMetrics(**build_metrics_row(entry, session.id), created_at=now)
+        apply_session(self._summaries[user.id], session_row, metrics_dict if entry["valid"] else None)
+
+        self._sessions[session.recording_session_id] = session
+        self._user_sessions.setdefault(user.id, []).append(session)
+        for tag in tags:
+            self._tag_sessions.setdefault(tag.name, []).append(session)
+        self._rr[session.id] = np.array(raw_data.rrIntervals, dtype=np.int64)
+        return session.id
+
+    def append_rr(self, recording_session_id: str, rr_chunk: np.ndarray, offset: Optional[int] = None,
+                  motion_artifacts: bool = False, final: bool = False) -> AppendPlan:
+        with self._lock:
+            session = self._sessions.get(recording_session_id)
+            if session is None:
+                raise AppendError(f"Session with ID {recording_session_id} not found", status_code=404)
+            stored = self._rr[session.id]
+            check_offset(recording_session_id, offset, stored.size)
+            plan = plan_append(session, rr_chunk, motion_artifacts, final, lambda: stored)
+            apply_append(session, plan, self._summaries.get(session.user_id))
+            self._rr[session.id] = np.concatenate((stored, np.asarray(rr_chunk, dtype=np.int64)))
+            return plan
+
+    def get_sessions_by_user(self, user_id: str, skip: int = 0, limit: int = 100) -> List[HRVSession]:
+        with self._lock:
+            return self._user_sessions.get(user_id, [])[skip:skip + limit]
+
+    def get_sessions_by_tag(self, tag_name: str, skip: int = 0, limit: int = 100) -> List[HRVSession]:
+        with self._lock:
+            return self._tag_sessions.get(tag_name, [])[skip:skip + limit]
+
+    def _matching(self, ranges: Dict[str, Range], quality_labels: Optional[List[str]] = None,
+                  valid: Optional[bool] = None, tag: Optional[str] = None, device_model: Optional[str] = None,
+                  user_id: Optional[str] = None, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  tags: Optional[TagFilter] = None) -> List[Tuple[HRVSession, Optional[HRVMetrics]]]:
+        with self._lock:
+            required = ([tag] if tag is not None else []) + list(tags.all_of if tags is not None else ())
+            if user_id is not None:
+                candidates = list(self._user_sessions.get(user_id, []))
+            elif required:
+                # Scan the shortest posting list
+                candidates = list(min((self._tag_sessions.get(name, []) for name in required), key=len))
+            else:
+                candidates = list(self._sessions.values())
+
+        rows = []
+        for session in candidates:
+            if quality_labels and session.quality_label not in quality_labels:
+                continue
+            if valid is not None and session.valid != valid:
+                continue
+            if user_id is not None and session.user_id != user_id:
+                continue
+            if start is not None and not (session.timestamp and session.timestamp >= start):
+                continue
+            if end is not None and not (session.timestamp and session.timestamp < end):
+                continue
+            if tag is not None and all(t.name != tag for t in session.tags):
+                continue
+            if tags is not None and not tags.matches([t.name for t in session.tags]):
+                continue
+            if device_model is not None and session.device.model != device_model:
+                continue
+            if not _in_ranges(session, ranges):
+                continue
+            rows.append((session, session.metrics))
+        return rows
+
+    def query_sessions(self, ranges: Dict[str, Range], skip: int = 0, limit: int = 100,
+                       **filters: Any) -> List[Tuple[HRVSession, Optional[HRVMetrics]]]:
+        rows = self._matching(ranges, **filters)
+        rows.sort(key=_newest_first, reverse=True)
+        return rows[skip:skip + limit]
+
+    def tag_facets(self, ranges: Dict[str, Range], **filters: Any) -> Tuple[int, Dict[str, int]]:
+        rows = self._matching(ranges, **filters)
+        counts: Dict[str, int] = {}
+        for session, _ in rows:
+            for t in session.tags:
+                counts[t.name] = counts.get(t.name, 0) + 1
+        return len(rows), counts
+
+    def get_user_summary(self, user_id: str) -> Optional[UserSummary]:
+        return self._summaries.get(user_id)
+
+    def get_rr_intervals(self, session_id: str) -> np.ndarray:
+        rr = self._rr.get(session_id)
+        return rr.copy() if rr is not None else np.empty(0, dtype=np.int64)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "sessions": len(self._sessions),
+                "devices": len(self._devices),
+                "tags": len(self._tags)
+            }
+
+    def latest_sessions(self, limit: int = 5) -> List[HRVSession]:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return sessions[::-1][:limit]
+
+
+def _in_ranges(session: HRVSession, ranges: Dict[str, Range]) -> bool:
+    """Python mirror of session_query.range_clauses (NULLs never match, like SQL)"""
+    for name, (low, high) in ranges.items():
+        column = RANGE_FILTERS[name]
+        row = session.metrics if column.class_ is HRVMetrics else session
+        value = getattr(row, column.key) if row is not None else None
+        if value is None:
+            return False
+        if (low is not None and value < low) or (high is not None and value > high):
+            return False
+    return True
+
+
+_memory_store: Optional[MemorySessionStore] = None
+_memory_store_lock = threading.Lock()
+
+
+def memory_store() -> MemorySessionStore:
+    global _memory_store
+    with _memory_store_lock:
+        if _memory_store is None:
+            _memory_store = MemorySessionStore()
+        return _memory_store
+
+
+def session_store(db: Session) -> SessionStore:
+    """The configured backend; db is used by the SQL backend"""
+    if settings.STORAGE_BACKEND == "memory":
+        return memory_store()
+    if settings.STORAGE_BACKEND != "sql":
+        raise ValueError(f"Unknown STORAGE_BACKEND '{settings.STORAGE_BACKEND}', expected one of {STORAGE_BACKENDS}")
+    if ShardSessionLocals:
+        # Imported here: the sharded store is built on this module
+        from app.core.sharding import sharded_store
+        return sharded_store(db)
+    return SQLSessionStore(db)
+
+
+def _closing(store: SessionStore) -> Iterator[SessionStore]:
+    # A sharded store opens a session per shard it touches; they go back to the pool with the request
+    try:
+        yield store
+    finally:
+        store.close()
+
+
+# Store dependencies, mirroring the database session dependencies
+def get_store(db: Session = Depends(get_db)) -> Iterator[SessionStore]:
+    yield from _closing(session_store(db))
+
+
+def get_read_store(db: Session = Depends(get_read_db)) -> Iterator[SessionStore]:
+    yield from _closing(session_store(db))
+
+
+def get_lazy_read_store(db: Session = Depends(get_lazy_read_db)) -> Iterator[SessionStore]:
+    yield from _closing(session_store(db))
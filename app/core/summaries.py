@@ -0,0 +1,169 @@
+# app/core/summaries.py
+"""Per-user latest-state summaries for the home screen.
+
+A summary row holds the session counts, the latest session, per-day metric
+sums for the most recent SUMMARY_DAYS days of recordings and the circadian
+bins (see app/core/circadian.py). Ingest updates it in the same transaction
+as the session insert. GET /api/hrv/users/{user_id}/summary is then one
+primary-key lookup plus averaging a handful of day buckets.
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from app.core.circadian import add_session
+from app.models.sql_models import HRVMetrics, HRVSession, UserSummary
+
+SUMMARY_DAYS = 7
+# Metrics averaged over the window (SessionMetrics field names)
+SUMMARY_METRICS = ("mean_rr", "sdnn", "rmssd", "pnn50", "lfHfRatio", "breathingRate")
+LATEST_METRICS = SUMMARY_METRICS + ("rr_count", "lfPower", "hfPower")
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """Stored timestamps are naive UTC; parsed ones may carry an offset"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def new_summary(user_id: str) -> UserSummary:
+    return UserSummary(user_id=user_id, session_count=0, valid_session_count=0, daily={})
+
+
+def session_values(session: HRVSession) -> Dict[str, Any]:
+    return {
+        "id": session.id,
+        "recording_session_id": session.recording_session_id,
+        "timestamp": session.timestamp,
+        "valid": session.valid,
+        "heart_rate": session.heart_rate,
+        "quality_label": session.quality_label,
+        "quality_score": session.quality_score
+    }
+
+
+def stored_metrics(metrics: Optional[HRVMetrics]) -> Optional[Dict[str, Any]]:
+    """hrv_metrics columns under their SessionMetrics names"""
+    if metrics is None:
+        return None
+    return {
+        "mean_rr": metrics.mean_rr,
+        "sdnn": metrics.sdnn,
+        "rmssd": metrics.rmssd,
+        "pnn50": metrics.pnn50,
+        "rr_count": metrics.rr_count,
+        "lfPower": metrics.lf_power,
+        "hfPower": metrics.hf_power,
+        "lfHfRatio": metrics.lf_hf_ratio,
+        "breathingRate": metrics.breathing_rate
+    }
+
+
+def apply_session(summary: UserSummary, session: Dict[str, Any], metrics: Optional[Dict[str, Any]]) -> None:
+    """Fold one stored session (hrv_sessions row values) into the summary"""
+    timestamp = _naive_utc(session["timestamp"])
+    summary.session_count = (summary.session_count or 0) + 1
+    if session["valid"]:
+        summary.valid_session_count = (summary.valid_session_count or 0) + 1
+    
+    latest = summary.latest_timestamp
+    if latest is None or timestamp >= _naive_utc(latest):
+        summary.latest_session_id = session["id"]
+        summary.latest_recording_session_id = session["recording_session_id"]
+        summary.latest_timestamp = timestamp
+        summary.latest_valid = session["valid"]
+        summary.latest_quality_label = session["quality_label"]
+        summary.latest_quality_score = session["quality_score"]
+        summary.latest_metrics = {name: metrics.get(name) for name in LATEST_METRICS} if metrics else None
+    
+    if session["valid"] and metrics:
+        _fold_metrics(summary, timestamp, metrics, session.get("heart_rate"))
+
+
+def _fold_metrics(summary: UserSummary, timestamp: datetime, metrics: Dict[str, Any], heart_rate: Optional[int],
+                  weight: int = 1) -> None:
+    """Add a valid session's metrics to the circadian bins and day buckets, or take them out with weight=-1"""
+    summary.circadian = add_session(summary.circadian, timestamp, {**metrics, "heartRate": heart_rate}, weight)
+    
+    # Copy so the JSON column sees a new value
+    daily = {day: {"sessions": bucket["sessions"], "metrics": dict(bucket["metrics"])}
+             for day, bucket in (summary.daily or {}).items()}
+    newest_day = max([date.fromisoformat(day) for day in daily] + [timestamp.date()])
+    oldest_kept = newest_day - timedelta(days=SUMMARY_DAYS - 1)
+    day = timestamp.date().isoformat()
+    if timestamp.date() >= oldest_kept and (weight > 0 or day in daily):
+        bucket = daily.setdefault(day, {"sessions": 0, "metrics": {}})
+        bucket["sessions"] += weight
+        for name in SUMMARY_METRICS:
+            value = metrics.get(name)
+            if value is not None:
+                total, count = bucket["metrics"].get(name, (0.0, 0))
+                bucket["metrics"][name] = [total + weight * float(value), count + weight]
+                if not bucket["metrics"][name][1]:
+                    del bucket["metrics"][name]
+        if not bucket["sessions"]:
+            del daily[day]
+    summary.daily = {day: bucket for day, bucket in daily.items() if date.fromisoformat(day) >= oldest_kept}
+
+
+def replace_session(summary: UserSummary, session: Dict[str, Any], was_valid: bool,
+                    old_metrics: Optional[Dict[str, Any]], metrics: Optional[Dict[str, Any]]) -> None:
+    """Update the summary for a stored session whose validation and metrics changed (appended RR data)"""
+    timestamp = _naive_utc(session["timestamp"])
+    summary.valid_session_count = (summary.valid_session_count or 0) + int(session["valid"]) - int(was_valid)
+    if summary.latest_session_id == session["id"]:
+        summary.latest_valid = session["valid"]
+        summary.latest_quality_label = session["quality_label"]
+        summary.latest_quality_score = session["quality_score"]
+        summary.latest_metrics = {name: metrics.get(name) for name in LATEST_METRICS} if metrics else None
+    
+    if was_valid and old_metrics:
+        _fold_metrics(summary, timestamp, old_metrics, session.get("heart_rate"), -1)
+    if session["valid"] and metrics:
+        _fold_metrics(summary, timestamp, metrics, session.get("heart_rate"))
+
+
+def summary_response(summary: UserSummary, today: Optional[date] = None) -> dict:
+    """Response for GET /api/hrv/users/{user_id}/summary"""
+    today = today or datetime.utcnow().date()
+    window_start = today - timedelta(days=SUMMARY_DAYS - 1)
+    
+    sessions = 0
+    totals: Dict[str, list] = {}
+    for day, bucket in (summary.daily or {}).items():
+        if not window_start <= date.fromisoformat(day) <= today:
+            continue
+        sessions += bucket["sessions"]
+        for name, (total, count) in bucket["metrics"].items():
+            accumulated = totals.setdefault(name, [0.0, 0])
+            accumulated[0] += total
+            accumulated[1] += count
+    
+    latest = None
+    if summary.latest_session_id:
+        latest = {
+            "id": summary.latest_session_id,
+            "recordingSessionId": summary.latest_recording_session_id,
+            "timestamp": summary.latest_timestamp,
+            "valid": summary.latest_valid,
+            "quality_label": summary.latest_quality_label,
+            "quality_score": summary.latest_quality_score,
+            "metrics": summary.latest_metrics
+        }
+    
+    return {
+        "user_id": summary.user_id,
+        "session_count": summary.session_count or 0,
+        "valid_session_count": summary.valid_session_count or 0,
+        "latest_session": latest,
+        f"last_{SUMMARY_DAYS}_days": {
+            "from": window_start,
+            "to": today,
+            "valid_session_count": sessions,
+            "averages": {
+                name: (totals[name][0] / totals[name][1] if name in totals and totals[name][1] else None)
+                for name in SUMMARY_METRICS
+            }
+        },
+        "updated_at": summary.updated_at
+    }
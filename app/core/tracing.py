@@ -0,0 +1,265 @@
+# app/core/tracing.py
+import json
+import time
+import uuid
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bound on spans (and on SQL statements) kept per request so huge sessions can't balloon memory
+MAX_SPANS_PER_TRACE = 1000
+
+
+class Span:
+    __slots__ = ("name", "start", "end", "attributes", "children")
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = attributes or {}
+        self.children: List["Span"] = []
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "attributes": self.attributes,
+            "children": [child.to_dict(origin) for child in self.children],
+        }
+
+
+class Trace:
+    __slots__ = ("trace_id", "started_at", "root", "sql", "span_count", "dropped_spans", "dropped_sql")
+
+    def __init__(self, root: Span):
+        self.trace_id = uuid.uuid4().hex
+        self.started_at = datetime.utcnow().isoformat() + "Z"
+        self.root = root
+        self.sql: List[Dict[str, Any]] = []
+        self.span_count = 1
+        self.dropped_spans = 0
+        self.dropped_sql = 0
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.root.end if self.root.end is not None else time.perf_counter()
+        return (end - self.root.start) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.root.attributes,
+            "dropped_spans": self.dropped_spans,
+            "spans": self.root.to_dict(self.root.start),
+            "sql": self.sql,
+            "dropped_sql": self.dropped_sql,
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("hrv_current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("hrv_current_span", default=None)
+
+
+@contextmanager
+def start_span(name: str, **attributes: Any):
+    """Open a child span of the active span; a no-op outside a traced request"""
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    if trace is None or parent is None:
+        yield None
+        return
+
+    if trace.span_count >= MAX_SPANS_PER_TRACE:
+        trace.dropped_spans += 1
+        yield None
+        return
+
+    span = Span(name, attributes)
+    parent.children.append(span)
+    trace.span_count += 1
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        span.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def traced(name: str = None):
+    """Decorator wrapping a function call in a span named after the function"""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any):
+            with start_span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Exporters
+class SpanExporter:
+    """Receives finished traces that crossed the slow-request threshold"""
+
+    def export(self, trace: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Return the most recently exported traces, newest first"""
+        return []
+
+
+class RingBufferExporter(SpanExporter):
+    def __init__(self, maxlen: int = 100):
+        self._buffer: deque = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def export(self, trace: Dict[str, Any]) -> None:
+        with self._lock:
+            self._buffer.append(trace)
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = list(self._buffer)
+        return items[::-1][:limit]
+
+
+class FileExporter(SpanExporter):
+    """Append traces as JSON lines to a local file"""
+
+    def __init__(self, path: str, maxlen: int = 100):
+        self.path = path
+        self._lock = threading.Lock()
+        # Keep a small in-memory tail so the debug endpoint doesn't re-read the file
+        self._tail: deque = deque(maxlen=maxlen)
+
+    def export(self, trace: Dict[str, Any]) -> None:
+        line = json.dumps(trace, default=str)
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+            self._tail.append(trace)
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = list(self._tail)
+        return items[::-1][:limit]
+
+
+class Tracer:
+    def __init__(self, exporter: SpanExporter, slow_threshold_ms: float):
+        self.exporter = exporter
+        self.slow_threshold_ms = slow_threshold_ms
+
+    @contextmanager
+    def trace_request(self, name: str, **attributes: Any):
+        """Open the root span for a request and export it if it ran slow"""
+        root = Span(name, attributes)
+        trace = Trace(root)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(root)
+        try:
+            yield trace
+        finally:
+            root.end = time.perf_counter()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            if trace.duration_ms >= self.slow_threshold_ms:
+                self.exporter.export(trace.to_dict())
+
+
+def build_exporter(kind: str, file_path: str, buffer_size: int) -> SpanExporter:
+    if kind == "file":
+        return FileExporter(file_path, maxlen=buffer_size)
+    return RingBufferExporter(maxlen=buffer_size)
+
+
+_tracer: Optional[Tracer] = None
+
+
+def configure_tracer(exporter: SpanExporter, slow_threshold_ms: float) -> Tracer:
+    global _tracer
+    _tracer = Tracer(exporter, slow_threshold_ms)
+    return _tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+# SQL statement spans for every engine in the process
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_trace.get() is None:
+        return
+    conn.info.setdefault("hrv_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _current_trace.get()
+    starts = conn.info.get("hrv_query_start")
+    if trace is None or not starts:
+        return
+    start = starts.pop()
+    end = time.perf_counter()
+    duration_ms = round((end - start) * 1000, 3)
+
+    # Statement text only; bound parameters may carry personal data
+    if len(trace.sql) < MAX_SPANS_PER_TRACE:
+        trace.sql.append({"statement": statement, "executemany": executemany, "duration_ms": duration_ms})
+    else:
+        trace.dropped_sql += 1
+
+    parent = _current_span.get()
+    if parent is None:
+        return
+    if trace.span_count >= MAX_SPANS_PER_TRACE:
+        trace.dropped_spans += 1
+        return
+    span = Span("sql", {"statement": statement.split(None, 1)[0].upper() if statement else ""})
+    span.start = start
+    span.end = end
+    parent.children.append(span)
+    trace.span_count += 1
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a root span per HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        tracer = get_tracer()
+        if scope["type"] != "http" or tracer is None:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with tracer.trace_request(f"{scope['method']} {scope['path']}",
+                                  method=scope["method"], path=scope["path"]) as trace:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                trace.root.attributes["status"] = status_code
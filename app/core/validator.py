@@ -1,69 +1,81 @@
 # app/core/validator.py
 import numpy as np
-from typing import List, Tuple, Dict
+from typing import List, Tuple
 from app.models.schemas import RawHRVData
+from app.core.profiles import DEFAULT_PROFILE, ProcessingProfile
+from app.models.result import ValidationResult
+
+# Sessions scoring below this are invalid
+MIN_QUALITY_SCORE = 0.6
+
+def iqr_bounds(rr_array: np.ndarray, profile: ProcessingProfile) -> Tuple[float, float]:
+    """Values the IQR filter keeps lie within these bounds"""
+    q1, q3 = np.percentile(rr_array, [25, 75])
+    iqr = q3 - q1
+    return q1 - (profile.iqr_factor * iqr), q3 + (profile.iqr_factor * iqr)
+
+def statistical_filter(rr_array: np.ndarray, profile: ProcessingProfile) -> np.ndarray:
+    """Range-checked RR intervals without the profile filter's statistical outliers"""
+    if profile.filter_method == "zscore":
+        z_scores = np.abs((rr_array - np.mean(rr_array)) / np.std(rr_array))
+        return rr_array[z_scores <= profile.zscore_threshold]
+    elif profile.filter_method == "iqr":
+        lower_bound, upper_bound = iqr_bounds(rr_array, profile)
+        return rr_array[(rr_array >= lower_bound) & (rr_array <= upper_bound)]
+    return rr_array
+
+def quality_label(quality_score: float) -> str:
+    if quality_score > 0.95:
+        return "excellent"
+    elif quality_score > 0.80:
+        return "acceptable"
+    elif quality_score > 0.60:
+        return "borderline"
+    return "poor"
 
 class HRVValidator:
-    MIN_RR = 300  # ms
-    MAX_RR = 2000  # ms
-    MIN_RR_COUNT = 30
-    MIN_VALID_PERCENTAGE = 90.0
-    
-    def __init__(self, raw_data: RawHRVData):
+    def __init__(self, raw_data: RawHRVData, profile: ProcessingProfile = DEFAULT_PROFILE):
         self.raw_data = raw_data
+        self.profile = profile
         self.outlier_count = 0
         self.valid_rr_percentage = 100.0
         self.quality_score = 1.0
-        self.filter_method = "zscore"
+        self.filter_method = profile.filter_method
         self.valid = True
         self.reasons = []
         self.cleaned_rr = []
         self.quality_label = "excellent"
     
-    def validate_range(self) -> List[int]:
+    def validate_range(self) -> np.ndarray:
         """Apply range filter to RR intervals"""
-        valid_rr = []
-        for rr in self.raw_data.rrIntervals:
-            if self.MIN_RR <= rr <= self.MAX_RR:
-                valid_rr.append(rr)
-            else:
-                self.outlier_count += 1
+        # rrIntervals is a list for JSON bodies or a NumPy view for binary ones
+        rr_array = np.asarray(self.raw_data.rrIntervals)
+        valid_rr = rr_array[(rr_array >= self.profile.min_rr) & (rr_array <= self.profile.max_rr)]
+        self.outlier_count += len(rr_array) - len(valid_rr)
         
-        total_rr = len(self.raw_data.rrIntervals)
+        total_rr = len(rr_array)
         if total_rr > 0:
             self.valid_rr_percentage = (len(valid_rr) / total_rr) * 100
         
-        if len(valid_rr) < self.MIN_RR_COUNT:
+        if len(valid_rr) < self.profile.min_rr_count:
             self.valid = False
             self.reasons.append("Too few valid RR intervals")
         
-        if self.valid_rr_percentage < self.MIN_VALID_PERCENTAGE:
+        if self.valid_rr_percentage < self.profile.min_valid_percentage:
             self.valid = False
             self.reasons.append("Low valid RR percentage")
         
         return valid_rr
     
     def remove_statistical_outliers(self, rr_list: List[int]) -> List[int]:
-        """Remove statistical outliers using Z-score method"""
-        if not rr_list:
+        """Remove statistical outliers with the profile's filter (Z-score or IQR)"""
+        if len(rr_list) == 0:
             return []
             
-        rr_array = np.array(rr_list)
-        if self.filter_method == "zscore":
-            z_scores = np.abs((rr_array - np.mean(rr_array)) / np.std(rr_array))
-            filtered_rr = rr_array[z_scores <= 3]
-            self.outlier_count += len(rr_array) - len(filtered_rr)
-            return filtered_rr.tolist()
-        elif self.filter_method == "iqr":
-            q1, q3 = np.percentile(rr_array, [25, 75])
-            iqr = q3 - q1
-            lower_bound = q1 - (1.5 * iqr)
-            upper_bound = q3 + (1.5 * iqr)
-            filtered_rr = rr_array[(rr_array >= lower_bound) & (rr_array <= upper_bound)]
-            self.outlier_count += len(rr_array) - len(filtered_rr)
-            return filtered_rr.tolist()
-        else:
-            return rr_list
+        rr_array = np.asarray(rr_list)
+        filtered_rr = statistical_filter(rr_array, self.profile)
+        self.outlier_count += len(rr_array) - len(filtered_rr)
+        return filtered_rr.tolist()
     
     def check_motion_artifacts(self):
         """Check for motion artifacts"""
@@ -77,21 +89,13 @@ class HRVValidator:
         if total_rr > 0:
             self.quality_score = 1 - (self.outlier_count / total_rr)
             
-        if self.quality_score < 0.6:
+        if self.quality_score < MIN_QUALITY_SCORE:
             self.valid = False
             self.reasons.append("Poor quality score")
         
-        # Add quality label
-        if self.quality_score > 0.95:
-            self.quality_label = "excellent"
-        elif self.quality_score > 0.80:
-            self.quality_label = "acceptable"
-        elif self.quality_score > 0.60:
-            self.quality_label = "borderline"
-        else:
-            self.quality_label = "poor"
+        self.quality_label = quality_label(self.quality_score)
     
-    def process(self) -> Tuple[List[int], Dict]:
+    def process(self) -> Tuple[List[int], ValidationResult]:
         """Process the raw data through all validation steps"""
         self.check_motion_artifacts()
         
@@ -100,14 +104,15 @@ class HRVValidator:
             self.cleaned_rr = self.remove_statistical_outliers(range_filtered)
             self.calculate_quality_score()
         
-        validation_result = {
-            "valid": self.valid,
-            "reason": " + ".join(self.reasons) if self.reasons else None,
-            "quality_score": self.quality_score,
-            "quality_label": self.quality_label,
-            "filter_method": self.filter_method,
-            "outlier_count": self.outlier_count,
-            "valid_rr_percentage": self.valid_rr_percentage
-        }
+        validation_result = ValidationResult(
+            valid=self.valid,
+            reason=" + ".join(self.reasons) if self.reasons else None,
+            quality_score=self.quality_score,
+            quality_label=self.quality_label,
+            filter_method=self.filter_method,
+            processing_profile=self.profile.name,
+            outlier_count=self.outlier_count,
+            valid_rr_percentage=self.valid_rr_percentage
+        )
         
         return self.cleaned_rr, validation_result
\ No newline at end of file
@@ -0,0 +1,118 @@
+# app/core/write_behind.py
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from app.core.database import SessionLocal
+from app.core.instrumentation import WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_SECONDS
+from app.core.storage import session_store
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindPersister:
+    """Group-commit persister for processed sessions.
+
+    Requests submit their processed session and wait on the returned future.
+    A single writer thread gathers submissions into micro-batches (closed after
+    flush_interval seconds or max_batch entries) and stores each batch with
+    multi-row inserts in one transaction. A future resolves only once its
+    batch has committed. If a batch fails, its entries are retried one by one
+    so a single bad entry (e.g. a duplicate recording id) fails alone.
+    """
+
+    def __init__(self, flush_interval: float, max_batch: int):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="hrv-write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush everything already submitted, then stop the writer thread"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, entry: Dict[str, Any]) -> Future:
+        """Queue one session (see SessionStore.create_sessions); resolves to its session id"""
+        future: Future = Future()
+        self._queue.put((entry, future))
+        return future
+
+    def _collect(self) -> List:
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch: List) -> None:
+        WRITE_BEHIND_BATCH_SIZE.observe(len(batch))
+        start = time.perf_counter()
+        db = SessionLocal()
+        store = session_store(db)
+        try:
+            session_ids = store.create_sessions([entry for entry, _ in batch])
+        except Exception as e:
+            db.rollback()
+            if len(batch) > 1:
+                logger.warning(f"Write-behind batch of {len(batch)} failed ({getattr(e, 'orig', e)}); retrying entries individually")
+                store.close()
+                db.close()
+                for item in batch:
+                    self._flush([item])
+                return
+            batch[0][1].set_exception(e)
+        else:
+            for (_, future), session_id in zip(batch, session_ids):
+                future.set_result(session_id)
+        finally:
+            store.close()
+            db.close()
+            WRITE_BEHIND_FLUSH_SECONDS.observe(time.perf_counter() - start)
+
+
+_persister: Optional[WriteBehindPersister] = None
+
+
+def start_write_behind(flush_interval: float, max_batch: int) -> WriteBehindPersister:
+    global _persister
+    _persister = WriteBehindPersister(flush_interval, max_batch)
+    _persister.start()
+    return _persister
+
+
+def stop_write_behind() -> None:
+    global _persister
+    if _persister is not None:
+        _persister.stop()
+        _persister = None
+
+
+def get_write_behind() -> Optional[WriteBehindPersister]:
+    return _persister
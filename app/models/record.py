@@ -1,19 +1,22 @@
 # app/models/record.py
-from dataclasses import dataclass, asdict
 from typing import Dict, Optional, Any
-from app.models.schemas import SessionMetrics
+from app.models.result import SessionMetrics
 from app.models.metadata import SessionMetadata
 
-@dataclass
 class SessionRecord:
-    metadata: SessionMetadata
-    metrics: Optional[SessionMetrics] = None
-    indexes: Optional[Dict[str, Dict[str, Any]]] = None
+    __slots__ = ("metadata", "metrics", "indexes", "windows")
+    
+    def __init__(self, metadata: SessionMetadata, metrics: Optional[SessionMetrics] = None,
+                 indexes: Optional[Dict[str, Dict[str, Any]]] = None, windows: Optional[Dict[str, Any]] = None):
+        self.metadata = metadata
+        self.metrics = metrics
+        self.indexes = indexes
+        self.windows = windows
     
     def dict(self) -> Dict[str, Any]:
         """Convert the record to a dictionary format for API responses"""
         result = {
-            "metadata": asdict(self.metadata)
+            "metadata": self.metadata.dict()
         }
         
         if self.metrics:
@@ -22,4 +25,7 @@ class SessionRecord:
         if self.indexes:
             result["indexes"] = self.indexes
             
-        return result
\ No newline at end of file
+        if self.windows:
+            result["windows"] = self.windows
+            
+        return result
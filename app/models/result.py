@@ -0,0 +1,67 @@
+# app/models/result.py
+"""Compact results passed through the processing pipeline.
+
+One ingest produces a validation result, metadata and metrics. They are held
+in ``__slots__`` records built once and handed by reference from the validator
+to the metric indexes, the session store and the response: persistence reads
+attributes, and only the response is rendered to plain dicts (``dict()``).
+Records are read-only mappings too, so code written against dicts (``.get``,
+``**metrics``) keeps working.
+"""
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+class SlotRecord(Mapping):
+    """Fixed fields in ``__slots__``; subclasses list them in FIELDS with optional DEFAULTS"""
+    __slots__ = ()
+    FIELDS: Tuple[str, ...] = ()
+    DEFAULTS: Dict[str, Any] = {}
+
+    def __init__(self, values: Optional[Mapping] = None, **fields):
+        # Fields come from `values` (e.g. a metrics dict), then keywords, then DEFAULTS
+        values = values or {}
+        for name in self.FIELDS:
+            if name in fields:
+                value = fields[name]
+            elif name in values:
+                value = values[name]
+            else:
+                value = self.DEFAULTS.get(name)
+            setattr(self, name, value)
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self.FIELDS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+    def dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.FIELDS)})"
+
+
+class ValidationResult(SlotRecord):
+    """HRVValidator's verdict on one session"""
+    FIELDS = ("valid", "reason", "quality_score", "quality_label", "filter_method", "processing_profile",
+              "outlier_count", "valid_rr_percentage")
+    DEFAULTS = {"valid": True, "quality_score": 1.0, "quality_label": "excellent", "filter_method": "zscore",
+                "processing_profile": "default", "outlier_count": 0, "valid_rr_percentage": 100.0}
+    __slots__ = FIELDS
+
+
+class SessionMetrics(SlotRecord):
+    """HRV metrics of a valid session plus the signal-quality fields reported with them"""
+    FIELDS = ("mean_rr", "sdnn", "rmssd", "pnn50", "cv_rr", "rr_count", "lfPower", "hfPower", "lfHfRatio",
+              "breathingRate", "sd1", "sd2", "sd1Sd2Ratio", "sampleEntropy", "approxEntropy", "dfaAlpha1",
+              "dfaAlpha2", "heartRate", "motionArtifacts", "valid_rr_percentage", "quality_score", "outlier_count",
+              "filter_method")
+    DEFAULTS = {"motionArtifacts": False}
+    __slots__ = FIELDS
@@ -12,6 +12,10 @@ class TagBase(BaseModel):
     name: str
 
 # Request schemas
+class AnalysisOptions(BaseModel):
+    windowSeconds: Optional[float] = Field(None, ge=30, le=3600)  # e.g. 300 for 5-minute windows
+    stepSeconds: Optional[float] = Field(None, ge=5)  # defaults to half the window (50% overlap)
+
 class RawHRVData(BaseModel):
     user_id: str  # This will be the user's email address
     device_info: Dict[str, str]
@@ -21,6 +25,7 @@ class RawHRVData(BaseModel):
     heartRate: Optional[int] = None
     motionArtifacts: bool = False
     tags: List[str] = []
+    analysis: Optional[AnalysisOptions] = None
     
     class Config:
         schema_extra = {
@@ -39,53 +44,22 @@ class RawHRVData(BaseModel):
             }
         }
 
-# Response schemas
-class SessionMetrics(BaseModel):
-    mean_rr: float
-    sdnn: float
-    rmssd: float
-    pnn50: float
-    cv_rr: float
-    rr_count: int
-    lfPower: Optional[float]
-    hfPower: Optional[float]
-    lfHfRatio: Optional[float]
-    breathingRate: Optional[float]
-    heartRate: Optional[float]
-    motionArtifacts: bool
-    valid_rr_percentage: float
-    quality_score: float
-    outlier_count: int
-    filter_method: str
-    
-    class Config:
-        orm_mode = True
-
-class SessionMetadata(BaseModel):
-    timestamp: str
-    recordingSessionId: str
-    user_id: str
-    device_info: Dict[str, str]
-    tags: List[str]
-    valid: bool
-    reason: Optional[str] = None
-    quality_score: float = 1.0
-    quality_label: str = "excellent"
-    filter_method: str = "zscore"
-    outlier_count: int = 0
-    valid_rr_percentage: float = 100.0
+class RRChunk(BaseModel):
+    """A later part of a recording, appended to the stored session (rrIntervals is required)"""
+    rrIntervals: List[int]
+    offset: Optional[int] = Field(None, ge=0)  # beats already stored; a mismatch is rejected, so retries are safe
     motionArtifacts: bool = False
+    final: bool = False  # last part: recompute every metric over the whole recording
     
     class Config:
-        orm_mode = True
-
-class SessionRecord(BaseModel):
-    metadata: SessionMetadata
-    metrics: Optional[SessionMetrics] = None
-    indexes: Optional[Dict[str, Dict[str, Any]]] = None
-    
-    class Config:
-        orm_mode = True
+        schema_extra = {
+            "example": {
+                "rrIntervals": [801, 795, 810, 822],
+                "offset": 4,
+                "motionArtifacts": False,
+                "final": True
+            }
+        }
 
 # Models for database operations
 class UserCreate(BaseModel):
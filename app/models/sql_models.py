@@ -1,5 +1,5 @@
 # app/models/sql_models.py
-from sqlalchemy import Column, Integer, Float, String, Boolean, ForeignKey, DateTime, JSON, Table, Text
+from sqlalchemy import Column, Integer, Float, String, Boolean, ForeignKey, DateTime, JSON, Table, Text, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.core.database import Base
@@ -37,6 +37,9 @@ session_tags = Table(
     Base.metadata,
     Column("session_id", String, ForeignKey("hrv_sessions.id")),
     Column("tag_id", String, ForeignKey("tags.id")),
+    # Tag filters resolve tag -> sessions; tag lists load session -> tags
+    Index("ix_session_tags_tag_id_session_id", "tag_id", "session_id"),
+    Index("ix_session_tags_session_id", "session_id"),
 )
 
 class Tag(Base):
@@ -66,6 +69,10 @@ class HRVSession(Base):
     outlier_count = Column(Integer, default=0)
     valid_rr_percentage = Column(Float, default=100.0)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # RR series file under RR_ARCHIVE_DIR once archived (see app/core/archive.py); its rows are then gone
+    rr_archive = Column(String, nullable=True)
+    # Running sums behind incremental appends (see app/core/append.py); built on the first append
+    rr_state = Column(JSON, nullable=True)
     
     # Relationships
     user = relationship("User", back_populates="sessions")
@@ -74,6 +81,13 @@ class HRVSession(Base):
     metrics = relationship("HRVMetrics", back_populates="session", uselist=False, cascade="all, delete-orphan")
     rr_intervals = relationship("RRInterval", back_populates="session", cascade="all, delete-orphan")
     
+    __table_args__ = (
+        # Per-user history and population screens filter on one column, then a time range
+        Index("ix_hrv_sessions_user_id_timestamp", "user_id", "timestamp"),
+        Index("ix_hrv_sessions_quality_label_timestamp", "quality_label", "timestamp"),
+        Index("ix_hrv_sessions_device_id_timestamp", "device_id", "timestamp"),
+    )
+    
 class HRVMetrics(Base):
     __tablename__ = "hrv_metrics"
     
@@ -96,6 +110,14 @@ class HRVMetrics(Base):
     
     # Relationships
     session = relationship("HRVSession", back_populates="metrics")
+    
+    __table_args__ = (
+        # Range filters on the screening metrics; session_id makes the scan covering for the join
+        Index("ix_hrv_metrics_rmssd_session_id", "rmssd", "session_id"),
+        Index("ix_hrv_metrics_sdnn_session_id", "sdnn", "session_id"),
+        Index("ix_hrv_metrics_mean_rr_session_id", "mean_rr", "session_id"),
+        Index("ix_hrv_metrics_lf_hf_ratio_session_id", "lf_hf_ratio", "session_id"),
+    )
 
 class RRInterval(Base):
     __tablename__ = "rr_intervals"
@@ -106,5 +128,66 @@ class RRInterval(Base):
     value = Column(Integer)     # RR interval value in ms
     is_valid = Column(Boolean, default=True)
     
+    __table_args__ = (
+        # A session's series in order, answered from the index alone
+        Index("ix_rr_intervals_session_id_position_value", "session_id", "position", "value"),
+    )
+    
     # Relationships
-    session = relationship("HRVSession", back_populates="rr_intervals")
\ No newline at end of file
+    session = relationship("HRVSession", back_populates="rr_intervals")
+
+class HRVJob(Base):
+    __tablename__ = "hrv_jobs"
+    
+    id = Column(String, primary_key=True, default=generate_uuid)
+    recording_session_id = Column(String, index=True)
+    status = Column(String, default="queued")  # queued, running, succeeded, failed
+    payload = Column(JSON)                     # RawHRVData fields except rrIntervals
+    rr_data = Column(LargeBinary)              # RR intervals as little-endian int32
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        # Workers claim the oldest queued job
+        Index("ix_hrv_jobs_status_created_at", "status", "created_at"),
+    )
+
+class UserSummary(Base):
+    """Latest state per user, maintained by the ingest transaction (see app/core/summaries.py)"""
+    __tablename__ = "user_summaries"
+    
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    session_count = Column(Integer, default=0)
+    valid_session_count = Column(Integer, default=0)
+    latest_session_id = Column(String, nullable=True)
+    latest_recording_session_id = Column(String, nullable=True)
+    latest_timestamp = Column(DateTime, nullable=True)
+    latest_valid = Column(Boolean, nullable=True)
+    latest_quality_label = Column(String, nullable=True)
+    latest_quality_score = Column(Float, nullable=True)
+    latest_metrics = Column(JSON, nullable=True)
+    daily = Column(JSON, nullable=True)  # {"YYYY-MM-DD": {"sessions": n, "metrics": {name: [sum, count]}}}
+    circadian = Column(JSON, nullable=True)  # hour-of-week bins, see app/core/circadian.py
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class UserShard(Base):
+    """Shard directory: which shard database holds a user's data (see app/core/sharding.py)"""
+    __tablename__ = "user_shards"
+    
+    user_id = Column(String, primary_key=True)
+    shard = Column(Integer, nullable=False, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class MetricSketch(Base):
+    """Population quantile sketch of one metric in one segment (see app/core/sketches.py)"""
+    __tablename__ = "metric_sketches"
+    
+    segment = Column(String, primary_key=True)  # "all", "device:<model>" or "tag:<name>"
+    metric = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    sketch = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
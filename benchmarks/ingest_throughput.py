@@ -0,0 +1,93 @@
+# benchmarks/ingest_throughput.py
+"""Sustained ingest throughput with and without write-behind group commit.
+
+Runs --sessions concurrent ingests (asyncio, --concurrency at a time) through
+ingest_session_async, first with per-request commits and then with the
+write-behind persister, and reports sessions per second. A final run against
+the in-memory store shows the processing-only ceiling without any database.
+
+Usage:
+    DATABASE_URL=postgresql://... python benchmarks/ingest_throughput.py [--sessions 500]
+
+Defaults to a throwaway SQLite file when DATABASE_URL is unset.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from app.core.database import Base, SessionLocal, engine  # noqa: E402
+from app.core.ingest import ingest_session_async  # noqa: E402
+from app.core.storage import MemorySessionStore, SQLSessionStore  # noqa: E402
+from app.core.write_behind import start_write_behind, stop_write_behind  # noqa: E402
+from app.models import sql_models  # noqa: E402,F401
+from app.models.schemas import RawHRVData  # noqa: E402
+
+
+def make_raw(run_id, i, beats):
+    rng = np.random.default_rng(i)
+    return RawHRVData(
+        user_id=f"bench{i % 20}@example.com",
+        device_info={"model": "Polar H10", "firmwareVersion": "2.1.9"},
+        recordingSessionId=f"bench-{run_id}-{i}",
+        timestamp="2025-03-25T23:10:00Z",
+        rrIntervals=(850 + rng.normal(0, 20, beats)).astype(int).tolist(),
+        tags=["Sleep"],
+    )
+
+
+async def run(sessions, concurrency, beats, memory=None):
+    run_id = uuid.uuid4().hex[:8]
+    payloads = [make_raw(run_id, i, beats) for i in range(sessions)]
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(raw):
+        async with limit:
+            store = memory or SQLSessionStore(SessionLocal())
+            try:
+                return await ingest_session_async(raw, store)
+            finally:
+                store.close()
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(raw) for raw in payloads))
+    elapsed = time.perf_counter() - start
+    assert all(r["status"] == "success" for r in results)
+    return sessions / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--beats", type=int, default=300)
+    parser.add_argument("--flush-ms", type=float, default=5)
+    parser.add_argument("--max-batch", type=int, default=64)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+
+    baseline = asyncio.run(run(args.sessions, args.concurrency, args.beats))
+    print(f"per-request commits : {baseline:8.1f} sessions/s")
+
+    start_write_behind(args.flush_ms / 1000, args.max_batch)
+    try:
+        grouped = asyncio.run(run(args.sessions, args.concurrency, args.beats))
+    finally:
+        stop_write_behind()
+    print(f"write-behind        : {grouped:8.1f} sessions/s  ({grouped / baseline:.1f}x)")
+    
+    in_memory = asyncio.run(run(args.sessions, args.concurrency, args.beats, MemorySessionStore()))
+    print(f"memory store        : {in_memory:8.1f} sessions/s  ({in_memory / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
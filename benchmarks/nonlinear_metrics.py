@@ -0,0 +1,89 @@
+# benchmarks/nonlinear_metrics.py
+"""Nonlinear metric cost against recording length.
+
+  naive    - all-pairs template comparison for sample/approximate entropy (O(n²),
+             only run up to --naive-max beats)
+  kdtree   - KD-tree range counts (used for non-integer RR data)
+  sweep    - exact histogram sweep (used for millisecond RR data from 2000 beats)
+  dfa      - DFA alpha1 + alpha2
+  session  - full calculate_basic_metrics, the per-session ingest cost
+
+Usage:
+    python benchmarks/nonlinear_metrics.py [--naive-max 5000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import metrics  # noqa: E402
+
+
+def synthetic_rr(n):
+    rng = np.random.default_rng(0)
+    t = np.arange(n)
+    return (850 + 60 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 15, n)).astype(int)
+
+
+def naive_entropy(rr, m=metrics.ENTROPY_M, r=metrics.ENTROPY_R):
+    """Reference all-pairs implementation, chunked to bound memory"""
+    n = rr.size
+    tolerance = r * np.std(rr)
+
+    def match_counts(length):
+        templates = metrics._embed(rr, length)
+        counts = np.empty(len(templates), dtype=np.int64)
+        for start in range(0, len(templates), 512):
+            block = templates[start:start + 512]
+            distance = np.max(np.abs(block[:, None, :] - templates[None, :, :]), axis=2)
+            counts[start:start + 512] = np.sum(distance <= tolerance, axis=1)
+        return counts
+
+    counts_m, counts_m1 = match_counts(m), match_counts(m + 1)
+    last = np.sum(np.max(np.abs(metrics._embed(rr, m)[:-1] - metrics._embed(rr, m)[-1]), axis=1) <= tolerance)
+    b = counts_m[:-1].sum() - (n - m) - last
+    a = counts_m1.sum() - (n - m)
+    approx = np.mean(np.log(counts_m / (n - m + 1))) - np.mean(np.log(counts_m1 / (n - m)))
+    return -np.log(a / b), approx
+
+
+def time_s(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--naive-max", type=int, default=5000, help="largest recording to run the O(n²) reference on")
+    args = parser.parse_args()
+
+    metrics.warm_up()
+    print(f"{'beats':>8}{'~hours':>8}{'naive s':>10}{'kdtree s':>10}{'sweep s':>10}{'dfa s':>9}{'session s':>11}")
+    for n in (300, 3000, 10000, 30000, 60000):
+        rr = synthetic_rr(n).astype(float)
+        jittered = rr + np.random.default_rng(1).uniform(0, 0.5, n)  # non-integer -> KD-tree path
+
+        if n <= args.naive_max:
+            naive = time_s(lambda: naive_entropy(rr), repeat=1)
+            assert np.allclose(naive_entropy(rr), metrics.entropy_measures(rr))
+        else:
+            naive = float("nan")
+        kdtree = time_s(lambda: metrics.entropy_measures(jittered), repeat=1)
+        sweep = time_s(lambda: metrics.entropy_measures(rr)) if n >= metrics.SWEEP_MIN_BEATS else float("nan")
+        dfa = time_s(lambda: (metrics.dfa_alpha(rr, metrics.DFA_ALPHA1_SCALES),
+                              metrics.dfa_alpha(rr, metrics.DFA_ALPHA2_SCALES)))
+        session = time_s(lambda: metrics.calculate_basic_metrics(rr.astype(int).tolist()))
+        hours = rr.sum() / 3.6e6
+        print(f"{n:>8}{hours:>8.1f}{naive:>10.3f}{kdtree:>10.3f}{sweep:>10.3f}{dfa:>9.3f}{session:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
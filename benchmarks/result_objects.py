@@ -0,0 +1,196 @@
+# benchmarks/result_objects.py
+"""Cost of carrying one session's results from validation to persistence and the response.
+
+  models - the previous path: SessionMetrics as a pydantic model built from a
+           merged dict, dataclass metadata rendered with asdict, then the
+           response's metrics dict copied back out by key for hrv_metrics
+  slots  - app/models/result.py records built once, read by attribute for
+           hrv_metrics and rendered once for the response
+
+Metric computation is done up front so only the result handling is timed.
+"peak KiB" is the most memory (tracemalloc) allocated at once while handling
+one session; "object B" is the size of the metrics object itself.
+
+Usage:
+    python benchmarks/result_objects.py [--sessions 2000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.crud import build_metrics_row  # noqa: E402
+from app.core.indexes import build_metric_indexes  # noqa: E402
+from app.core.metrics import calculate_basic_metrics  # noqa: E402
+from app.core.validator import HRVValidator  # noqa: E402
+from app.models.metadata import SessionMetadata  # noqa: E402
+from app.models.record import SessionRecord  # noqa: E402
+from app.models.result import SessionMetrics  # noqa: E402
+from app.models.schemas import RawHRVData  # noqa: E402
+
+
+class PydanticMetrics(BaseModel):
+    """Reference: the pydantic SessionMetrics the pipeline used to build"""
+    mean_rr: float
+    sdnn: float
+    rmssd: float
+    pnn50: float
+    cv_rr: float
+    rr_count: int
+    lfPower: Optional[float]
+    hfPower: Optional[float]
+    lfHfRatio: Optional[float]
+    breathingRate: Optional[float]
+    sd1: Optional[float] = None
+    sd2: Optional[float] = None
+    sd1Sd2Ratio: Optional[float] = None
+    sampleEntropy: Optional[float] = None
+    approxEntropy: Optional[float] = None
+    dfaAlpha1: Optional[float] = None
+    dfaAlpha2: Optional[float] = None
+    heartRate: Optional[float]
+    motionArtifacts: bool
+    valid_rr_percentage: float
+    quality_score: float
+    outlier_count: int
+    filter_method: str
+
+
+@dataclass
+class DataclassMetadata:
+    """Reference: the SessionMetadata dataclass rendered with asdict"""
+    timestamp: str
+    recordingSessionId: str
+    user_id: str
+    device_info: Dict[str, str]
+    tags: List[str]
+    valid: bool
+    reason: Optional[str] = None
+    quality_score: float = 1.0
+    quality_label: str = "excellent"
+    filter_method: str = "zscore"
+    processing_profile: str = "default"
+    outlier_count: int = 0
+    valid_rr_percentage: float = 100.0
+    motionArtifacts: bool = False
+
+
+def models_path(raw, validation, basic):
+    metadata = DataclassMetadata(
+        timestamp=raw.timestamp, recordingSessionId=raw.recordingSessionId, user_id=raw.user_id,
+        device_info=raw.device_info, tags=raw.tags, valid=validation["valid"], reason=validation["reason"],
+        quality_score=validation["quality_score"], quality_label=validation["quality_label"],
+        filter_method=validation["filter_method"], processing_profile=validation["processing_profile"],
+        outlier_count=validation["outlier_count"], valid_rr_percentage=validation["valid_rr_percentage"],
+        motionArtifacts=raw.motionArtifacts
+    )
+    metrics = PydanticMetrics(**{
+        **basic,
+        "heartRate": raw.heartRate,
+        "motionArtifacts": raw.motionArtifacts,
+        "valid_rr_percentage": validation["valid_rr_percentage"],
+        "quality_score": validation["quality_score"],
+        "outlier_count": validation["outlier_count"],
+        "filter_method": validation["filter_method"]
+    })
+    indexes = build_metric_indexes(metrics)
+    result = {"metadata": asdict(metadata), "metrics": metrics.dict(), "indexes": indexes}
+    metrics_dict = result["metrics"]
+    row = {name: metrics_dict.get(key) for name, key in (
+        ("mean_rr", "mean_rr"), ("sdnn", "sdnn"), ("rmssd", "rmssd"), ("pnn50", "pnn50"), ("cv_rr", "cv_rr"),
+        ("rr_count", "rr_count"), ("lf_power", "lfPower"), ("hf_power", "hfPower"),
+        ("lf_hf_ratio", "lfHfRatio"), ("breathing_rate", "breathingRate"))}
+    return result, row
+
+
+def slots_path(raw, validation, basic):
+    metadata = SessionMetadata(
+        validation, timestamp=raw.timestamp, recordingSessionId=raw.recordingSessionId, user_id=raw.user_id,
+        device_info=raw.device_info, tags=raw.tags, motionArtifacts=raw.motionArtifacts
+    )
+    metrics = SessionMetrics(
+        basic, heartRate=float(raw.heartRate), motionArtifacts=raw.motionArtifacts,
+        valid_rr_percentage=validation.valid_rr_percentage, quality_score=validation.quality_score,
+        outlier_count=validation.outlier_count, filter_method=validation.filter_method
+    )
+    indexes = build_metric_indexes(metrics)
+    result = SessionRecord(metadata=metadata, metrics=metrics, indexes=indexes).dict()
+    row = build_metrics_row({"metrics": metrics, "indexes": indexes}, "bench")
+    return result, row
+
+
+def make_inputs(count):
+    rng = np.random.default_rng(0)
+    inputs = []
+    for i in range(min(count, 50)):
+        raw = RawHRVData(
+            user_id="bench@example.com",
+            device_info={"model": "Polar H10", "firmwareVersion": "2.1.9"},
+            recordingSessionId=f"bench-{i}",
+            timestamp="2025-03-25T23:10:00Z",
+            rrIntervals=(850 + rng.normal(0, 20, 300)).astype(int).tolist(),
+            heartRate=70,
+            tags=["Sleep"],
+        )
+        cleaned, validation = HRVValidator(raw).process()
+        inputs.append((raw, validation, dict(validation), calculate_basic_metrics(cleaned)))
+    return [inputs[i % len(inputs)] for i in range(count)]
+
+
+def measure(path, inputs, slots):
+    args = [(raw, slot_validation if slots else dict_validation, basic)
+            for raw, slot_validation, dict_validation, basic in inputs]
+    start = time.perf_counter()
+    for arguments in args:
+        path(*arguments)
+    elapsed = time.perf_counter() - start
+
+    # Peak memory allocated while handling one session, over what was already live
+    tracemalloc.start()
+    peaks = []
+    for arguments in args[:500]:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        path(*arguments)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    tracemalloc.stop()
+    return elapsed / len(args) * 1e6, sum(peaks) / len(peaks) / 1024
+
+
+def metrics_size(metrics) -> int:
+    """Bytes held by a metrics object itself (values are shared either way)"""
+    return sys.getsizeof(metrics) + (sys.getsizeof(vars(metrics)) if hasattr(metrics, "__dict__") else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=2000)
+    args = parser.parse_args()
+
+    inputs = make_inputs(args.sessions)
+    # Same response either way (pydantic coerces heartRate to float)
+    models_result, models_row = models_path(inputs[0][0], inputs[0][2], inputs[0][3])
+    slots_result, slots_row = slots_path(inputs[0][0], inputs[0][1], inputs[0][3])
+    assert models_result == slots_result
+    assert all(slots_row[name] == value for name, value in models_row.items())
+
+    objects = {
+        "models": PydanticMetrics(**models_result["metrics"]),
+        "slots": SessionMetrics(slots_result["metrics"])
+    }
+    print(f"{'path':<8}{'µs/session':>12}{'peak KiB':>10}{'object B':>10}")
+    for name, path, slots in (("models", models_path, False), ("slots", slots_path, True)):
+        micros, kib = measure(path, inputs, slots)
+        print(f"{name:<8}{micros:>12.1f}{kib:>10.2f}{metrics_size(objects[name]):>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# benchmarks/rr_downsampling.py
+"""RR chart retrieval: ORM rows vs column fetch, and the downsampling kernels.
+
+The first table times GET /api/hrv/session/{id}/rr's work for one stored
+session, from the database to JSON bytes:
+
+  orm rows - crud.get_rr_intervals_by_session (one RRInterval object per beat)
+  columns  - SQLSessionStore.get_rr_intervals, full series
+  lttb     - columns, downsampled to --points with LTTB
+  minmax   - columns, downsampled to --points with min/max buckets
+
+The second table compares the kernels with textbook loops that do one Python
+iteration per beat.
+
+Usage:
+    python benchmarks/rr_downsampling.py [--points 500]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+tmp_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert  # noqa: E402
+
+from app.core.crud import get_rr_intervals_by_session  # noqa: E402
+from app.core.database import Base, SessionLocal, engine  # noqa: E402
+from app.core.rr_series import beat_times, lttb, minmax, rr_series_view  # noqa: E402
+from app.core.serialization import HRVJSONResponse  # noqa: E402
+from app.core.storage import SQLSessionStore  # noqa: E402
+from app.models.sql_models import RRInterval  # noqa: E402
+
+
+def synthetic_rr(beats):
+    rng = np.random.default_rng(0)
+    t = np.arange(beats)
+    return (850 + 60 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 15, beats)).astype(np.int64)
+
+
+def loop_lttb(x, y, points):
+    x, y = x.tolist(), y.tolist()
+    n = len(x)
+    every = (n - 2) / (points - 2)
+    selected, previous = [0], 0
+    for bucket in range(points - 2):
+        start, end = int(bucket * every) + 1, int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, n)
+        if bucket == points - 3:
+            cx, cy = x[-1], y[-1]
+        else:
+            cx = sum(x[end:next_end]) / (next_end - end)
+            cy = sum(y[end:next_end]) / (next_end - end)
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            area = abs((x[previous] - cx) * (y[i] - y[previous]) - (x[previous] - x[i]) * (cy - y[previous]))
+            if area > best_area:
+                best, best_area = i, area
+        selected.append(best)
+        previous = best
+    selected.append(n - 1)
+    return selected
+
+
+def loop_minmax(y, points):
+    y = y.tolist()
+    buckets = points // 2
+    every = len(y) / buckets
+    selected = []
+    for bucket in range(buckets):
+        start, end = int(bucket * every), int((bucket + 1) * every)
+        low = min(range(start, end), key=y.__getitem__)
+        high = max(range(start, end), key=y.__getitem__)
+        selected.extend(sorted({low, high}))
+    return selected
+
+
+def time_ms(func):
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def seed(sessions):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for session_id, rr in sessions.items():
+            conn.execute(insert(RRInterval), [
+                {"id": f"{session_id}-{i}", "session_id": session_id, "position": i, "value": int(value)}
+                for i, value in enumerate(rr)
+            ])
+
+
+def retrieval_paths(points):
+    def orm_rows(session_id):
+        db = SessionLocal()
+        try:
+            rows = get_rr_intervals_by_session(db, session_id)
+            return HRVJSONResponse({"rr": [row.value for row in rows]}).body
+        finally:
+            db.close()
+
+    def columns(session_id, **options):
+        store = SQLSessionStore(SessionLocal())
+        try:
+            return HRVJSONResponse(rr_series_view(store.get_rr_intervals(session_id), **options)).body
+        finally:
+            store.close()
+
+    return {
+        "orm rows": orm_rows,
+        "columns": columns,
+        "lttb": lambda session_id: columns(session_id, points=points),
+        "minmax": lambda session_id: columns(session_id, points=points, method="minmax"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=500)
+    args = parser.parse_args()
+    sizes = (5000, 30000, 100000)
+    sessions = {f"session-{beats}": synthetic_rr(beats) for beats in sizes}
+    seed(sessions)
+
+    print(f"{'beats':>8} {'path':<10} {'ms':>9} {'KB':>9}")
+    for session_id, rr in sessions.items():
+        for name, path in retrieval_paths(args.points).items():
+            size = len(path(session_id)) / 1024
+            print(f"{rr.size:>8} {name:<10} {time_ms(lambda: path(session_id)):>9.2f} {size:>9.1f}")
+
+    print(f"\n{'beats':>8} {'kernel':<8} {'loop ms':>9} {'kernels ms':>11} {'speedup':>8}")
+    for rr in sessions.values():
+        x, y = beat_times(rr), rr.astype(np.float64)
+        for method, loop, kernel in (
+            ("lttb", lambda: loop_lttb(x, y, args.points), lambda: lttb(x, y, args.points)),
+            ("minmax", lambda: loop_minmax(y, args.points), lambda: minmax(y, args.points)),
+        ):
+            slow, fast = time_ms(loop), time_ms(kernel)
+            print(f"{rr.size:>8} {method:<8} {slow:>9.2f} {fast:>11.2f} {slow / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/rr_payload.py
+"""Compare JSON and binary RR payloads: wire size and server-side decode time.
+
+JSON decode = json.loads + RawHRVData validation (what POST /api/hrv/session does).
+Binary decode = decompress + decode_payload + metadata-only RawHRVData.
+
+Usage:
+    python benchmarks/rr_payload.py
+"""
+import gzip
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.schemas import RawHRVData  # noqa: E402
+from app.core.rr_codec import encode_payload, decompress, decode_payload  # noqa: E402
+
+METADATA = {
+    "user_id": "bench@example.com",
+    "device_info": {"model": "Polar H10", "firmwareVersion": "2.1.9"},
+    "recordingSessionId": "bench",
+    "timestamp": "2025-03-25T23:10:00Z",
+    "heartRate": 74,
+    "motionArtifacts": False,
+    "tags": ["Sleep"],
+}
+MAX_SIZE = 64 * 1024 * 1024
+
+
+def synthetic_rr(n):
+    rng = np.random.default_rng(0)
+    t = np.arange(n)
+    return (850 + 60 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 15, n)).astype(int)
+
+
+def time_it(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1000
+
+
+def main():
+    try:
+        import zstandard  # noqa: F401
+        compressions = ("identity", "gzip", "zstd")
+    except ImportError:
+        compressions = ("identity", "gzip")
+
+    print(f"{'beats':>7} {'format':<28}{'bytes':>10}{'decode ms':>12}")
+    for n in (300, 3000, 30000):
+        rr = synthetic_rr(n)
+        number = max(1, 3000 // n)
+
+        body = json.dumps({**METADATA, "rrIntervals": rr.tolist()}).encode()
+        ms = time_it(lambda: RawHRVData(**json.loads(body)), number)
+        print(f"{n:>7} {'json':<28}{len(body):>10}{ms:>12.3f}")
+        gz = gzip.compress(body)
+        ms = time_it(lambda: RawHRVData(**json.loads(gzip.decompress(gz))), number)
+        print(f"{n:>7} {'json+gzip':<28}{len(gz):>10}{ms:>12.3f}")
+
+        for encoding in ("uint16", "varint-delta"):
+            for compression in compressions:
+                payload = encode_payload(METADATA, rr, encoding, compression)
+
+                def decode():
+                    header, array = decode_payload(decompress(payload, compression, MAX_SIZE))
+                    raw = RawHRVData(**header, rrIntervals=[])
+                    raw.rrIntervals = array
+
+                ms = time_it(decode, number)
+                print(f"{n:>7} {encoding + '+' + compression:<28}{len(payload):>10}{ms:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
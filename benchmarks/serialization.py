@@ -0,0 +1,115 @@
+# benchmarks/serialization.py
+"""Serialization cost per endpoint: FastAPI default vs the fast path.
+
+Responses:
+  default  - jsonable_encoder + JSONResponse (what a plain dict return costs)
+  orjson   - HRVJSONResponse (app/core/serialization.py)
+  msgpack  - MsgPackResponse, when msgpack is installed
+
+Requests (POST /api/hrv/session body):
+  pydantic - json.loads + RawHRVData(**body)
+  lean     - decode_body + split_rr_intervals + metadata-only RawHRVData
+
+Usage:
+    python benchmarks/serialization.py
+"""
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from app.models.schemas import RawHRVData  # noqa: E402
+from app.core.processor import HRVSessionProcessor  # noqa: E402
+from app.core.serialization import HRVJSONResponse, MsgPackResponse, decode_body, split_rr_intervals, msgpack  # noqa: E402
+
+
+def raw_payload(n):
+    rng = np.random.default_rng(0)
+    t = np.arange(n)
+    rr = (850 + 60 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 15, n)).astype(int)
+    return {
+        "user_id": "bench@example.com",
+        "device_info": {"model": "Polar H10", "firmwareVersion": "2.1.9"},
+        "recordingSessionId": "bench",
+        "timestamp": "2025-03-25T23:10:00Z",
+        "rrIntervals": rr.tolist(),
+        "heartRate": 74,
+        "motionArtifacts": False,
+        "tags": ["Sleep"],
+    }
+
+
+def ingest_response():
+    valid, result = HRVSessionProcessor(RawHRVData(**raw_payload(3000))).process()
+    return {"status": "success", "message": "Session processed and stored successfully", "data": result}
+
+
+def session_summary(i):
+    return {
+        "id": f"id-{i}",
+        "recordingSessionId": f"session-{i}",
+        "timestamp": datetime(2025, 3, 25, 23, 10),
+        "valid": True,
+        "quality_score": 0.98,
+        "quality_label": "excellent",
+        "tags": ["Sleep"],
+    }
+
+
+def session_detail(ingest):
+    metrics = ingest["data"]["metrics"]
+    return {
+        **session_summary(0),
+        "user_id": "bench@example.com",
+        "device": {"model": "Polar H10", "firmware_version": "2.1.9"},
+        "reason": None,
+        "metrics": metrics,
+        "indexes": ingest["data"]["indexes"],
+    }
+
+
+def time_ms(func, number=200):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1000
+
+
+def main():
+    ingest = ingest_response()
+    endpoints = {
+        "POST /hrv/session": ingest,
+        "GET /hrv/session/{id}": session_detail(ingest),
+        "GET /hrv/sessions/user (100)": [session_summary(i) for i in range(100)],
+    }
+
+    print("Responses (ms per render)")
+    print(f"{'endpoint':<30}{'default':>10}{'orjson':>10}{'msgpack':>10}")
+    for name, content in endpoints.items():
+        default = time_ms(lambda: JSONResponse(jsonable_encoder(content)))
+        fast = time_ms(lambda: HRVJSONResponse(content))
+        packed = time_ms(lambda: MsgPackResponse(content)) if msgpack else float("nan")
+        print(f"{name:<30}{default:>10.3f}{fast:>10.3f}{packed:>10.3f}")
+
+    print("\nRequests (ms per decode)")
+    print(f"{'beats':<30}{'pydantic':>10}{'lean':>10}")
+    for n in (300, 3000, 30000):
+        body = json.dumps(raw_payload(n)).encode()
+        number = max(1, 6000 // n)
+
+        def lean():
+            fields, rr = split_rr_intervals(decode_body("application/json", body))
+            raw = RawHRVData(**fields, rrIntervals=[])
+            raw.rrIntervals = rr
+
+        slow = time_ms(lambda: RawHRVData(**json.loads(body)), number)
+        fast = time_ms(lean, number)
+        print(f"{n:<30}{slow:>10.3f}{fast:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/session_query.py
+"""Population query latency with and without the query indexes.
+
+Seeds a throwaway SQLite database with synthetic sessions and metrics, then
+times crud.query_sessions for a few screening queries twice: once with the
+indexes declared on the models, and once after dropping them. Without the
+indexes every query is a full scan.
+
+Usage:
+    python benchmarks/session_query.py [--sessions 200000] [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert  # noqa: E402
+
+from app.core.crud import query_sessions  # noqa: E402
+from app.core.database import Base, SessionLocal, engine  # noqa: E402
+from app.models.sql_models import Device, HRVMetrics, HRVSession, Tag, User, session_tags  # noqa: E402
+
+QUERY_INDEXES = [
+    index for table in (HRVSession.__table__, HRVMetrics.__table__, session_tags)
+    for index in table.indexes if index.name.startswith(("ix_hrv_metrics_", "ix_hrv_sessions_", "ix_session_tags_"))
+]
+NOW = datetime(2025, 6, 1)
+
+QUERIES = {
+    "rmssd<20 excellent 30d": dict(ranges={"rmssd": (None, 20.0)}, quality_labels=["excellent"],
+                                   start=NOW - timedelta(days=30)),
+    "tag=Sleep": dict(ranges={}, tag="Sleep"),
+    "user history": dict(ranges={}, user_id="user-17"),
+    "device 7d": dict(ranges={}, device_model="Device 3", start=NOW - timedelta(days=7)),
+    "sdnn 80-90": dict(ranges={"sdnn": (80.0, 90.0)}),
+}
+
+
+def seed(sessions):
+    rng = np.random.default_rng(0)
+    Base.metadata.create_all(bind=engine)
+    users = [{"id": f"user-{i}", "username": f"user-{i}", "email": f"user-{i}@example.com"} for i in range(2000)]
+    devices = [{"id": f"device-{i}", "model": f"Device {i}", "firmware_version": "1.0"} for i in range(10)]
+    tags = [{"id": f"tag-{name}", "name": name} for name in ("Sleep", "Morning", "Workout", "Rest")]
+    labels = np.array(["excellent", "good", "fair", "poor"])
+    with engine.begin() as conn:
+        conn.execute(insert(User), users)
+        conn.execute(insert(Device), devices)
+        conn.execute(insert(Tag), tags)
+        for start in range(0, sessions, 50000):
+            n = min(50000, sessions - start)
+            ids = [f"s{start + i}" for i in range(n)]
+            offsets = rng.uniform(0, 365 * 86400, n)
+            rmssd = rng.lognormal(3.6, 0.5, n)
+            conn.execute(insert(HRVSession), [
+                {"id": sid, "recording_session_id": sid, "timestamp": NOW - timedelta(seconds=float(offset)),
+                 "user_id": f"user-{rng.integers(2000)}", "device_id": f"device-{rng.integers(10)}",
+                 "valid": True, "quality_score": 1.0, "quality_label": str(label)}
+                for sid, offset, label in zip(ids, offsets, labels[rng.integers(0, 4, n)])
+            ])
+            conn.execute(insert(HRVMetrics), [
+                {"id": f"m-{sid}", "session_id": sid, "mean_rr": 850.0, "sdnn": float(value * 1.3),
+                 "rmssd": float(value), "pnn50": 10.0, "cv_rr": 5.0, "rr_count": 300}
+                for sid, value in zip(ids, rmssd)
+            ])
+            conn.execute(insert(session_tags), [
+                {"session_id": sid, "tag_id": tags[i % len(tags)]["id"]} for i, sid in enumerate(ids)
+            ])
+        conn.exec_driver_sql("ANALYZE")
+
+
+def time_queries(runs):
+    db = SessionLocal()
+    results = {}
+    try:
+        for name, kwargs in QUERIES.items():
+            samples = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                query_sessions(db, limit=100, **kwargs)
+                samples.append(time.perf_counter() - start)
+                db.expunge_all()
+            results[name] = statistics.median(samples) * 1000
+    finally:
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Seeding {args.sessions} sessions into {DB_PATH} ...")
+    seed(args.sessions)
+    indexed = time_queries(args.runs)
+    for index in QUERY_INDEXES:
+        index.drop(bind=engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    scanned = time_queries(args.runs)
+
+    print(f"\n{'query':<24} {'indexed ms':>11} {'no index ms':>12} {'speedup':>8}")
+    for name in QUERIES:
+        print(f"{name:<24} {indexed[name]:>11.2f} {scanned[name]:>12.2f} {scanned[name] / indexed[name]:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/startup.py
+"""Cold-start benchmark.
+
+Each run starts a fresh interpreter and reports:
+  import   - time to import main (what every worker pays at boot)
+  startup  - lifespan hook (table creation unless AUTO_CREATE_TABLES=False)
+  first    - first HRVSessionProcessor.process() call (pays the SciPy import if not pre-warmed)
+
+The "preload (forked)" row imports and warms the app before timing starts,
+which is what a worker forked from a gunicorn --preload master inherits.
+
+Usage:
+    python benchmarks/startup.py [--runs 5]
+
+Uses DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import asyncio, json, os, time
+if os.environ.get("BENCH_PRELOAD") == "1":
+    # What a worker forked from a --preload master inherits for free
+    import main
+    from app.core.metrics import warm_up
+    warm_up()
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+
+async def run_lifespan():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+
+asyncio.run(run_lifespan())
+t2 = time.perf_counter()
+
+from app.models.schemas import RawHRVData
+from app.core.processor import HRVSessionProcessor
+raw = RawHRVData(
+    user_id="bench@example.com",
+    device_info={"model": "Polar H10", "firmwareVersion": "2.1.9"},
+    recordingSessionId="bench",
+    timestamp="2025-03-25T23:10:00Z",
+    rrIntervals=[800 + (i * 37) % 60 for i in range(300)],
+)
+HRVSessionProcessor(raw).process()
+t3 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "startup": t2 - t1, "first": t3 - t2}))
+"""
+
+MODES = {
+    "create_all": {"AUTO_CREATE_TABLES": "True", "PREWARM_SCIPY": "False"},
+    "alembic": {"AUTO_CREATE_TABLES": "False", "PREWARM_SCIPY": "False"},
+    "alembic+prewarm": {"AUTO_CREATE_TABLES": "False", "PREWARM_SCIPY": "True"},
+    "preload (forked)": {"AUTO_CREATE_TABLES": "False", "PREWARM_SCIPY": "True", "BENCH_PRELOAD": "1"},
+}
+
+
+def run_once(env):
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_env = dict(os.environ)
+        base_env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        base_env["METRICS_ENABLED"] = base_env.get("METRICS_ENABLED", "True")
+
+        print(f"{'mode':<18}{'import ms':>12}{'startup ms':>12}{'first ms':>12}{'total ms':>12}")
+        for mode, overrides in MODES.items():
+            env = {**base_env, **overrides}
+            runs = [run_once(env) for _ in range(args.runs)]
+            med = {k: statistics.median(r[k] for r in runs) * 1000 for k in ("import", "startup", "first")}
+            total = sum(med.values())
+            print(f"{mode:<18}{med['import']:>12.1f}{med['startup']:>12.1f}{med['first']:>12.1f}{total:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/windowed_metrics.py
+"""Windowed analysis cost: one recompute per window vs the strided kernels.
+
+  naive   - calculate_basic_metrics on every window slice
+  kernels - calculate_windowed_metrics (prefix sums + batched Welch)
+
+Usage:
+    python benchmarks/windowed_metrics.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.metrics import calculate_basic_metrics, calculate_windowed_metrics  # noqa: E402
+
+
+def synthetic_rr(hours):
+    rng = np.random.default_rng(0)
+    n = int(hours * 3600 / 0.85)
+    t = np.arange(n)
+    return (850 + 60 * np.sin(2 * np.pi * t / 12) + rng.normal(0, 15, n)).astype(int).tolist()
+
+
+def naive_windows(rr, window_seconds, step_seconds):
+    times = np.cumsum(rr) / 1000
+    rr = np.asarray(rr)
+    start = times[0]
+    results = []
+    while start + window_seconds <= times[-1]:
+        mask = (times >= start) & (times < start + window_seconds)
+        results.append(calculate_basic_metrics(rr[mask].tolist()))
+        start += step_seconds
+    return results
+
+
+def time_s(func):
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    calculate_windowed_metrics(synthetic_rr(0.5), 300, 150)  # import SciPy outside the timings
+
+    print(f"{'recording':<12}{'window/step':<14}{'windows':>8}{'naive s':>10}{'kernels s':>11}{'speedup':>9}")
+    for hours in (1, 8, 24):
+        rr = synthetic_rr(hours)
+        for window, step in ((300, 150), (120, 30)):
+            windows = calculate_windowed_metrics(rr, window, step)["count"]
+            naive = time_s(lambda: naive_windows(rr, window, step))
+            fast = time_s(lambda: calculate_windowed_metrics(rr, window, step))
+            print(f"{f'{hours}h':<12}{f'{window}/{step}s':<14}{windows:>8}{naive:>10.3f}{fast:>11.3f}{naive / fast:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# gunicorn.conf.py
+# Picked up automatically by `gunicorn main:app` from the project root.
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+
+# Import the app once in the master and fork workers from it. The app does no
+# DB work at import (tables are handled in the lifespan hook), so forked
+# workers share the already-imported NumPy/SciPy/FastAPI modules copy-on-write.
+preload_app = os.getenv("GUNICORN_PRELOAD", "True").lower() == "true"
+
+
+def when_ready(server):
+    """Master is up and (with preload) has imported the app; runs before forking"""
+    if not preload_app:
+        return
+
+    from app.config import settings
+    if settings.PREWARM_SCIPY:
+        from app.core.metrics import warm_up
+        warm_up()
+        server.log.info("Pre-warmed SciPy in the master process")
+
+    # Move everything allocated so far out of the GC's reach, so collections
+    # in the workers don't touch (and un-share) the preloaded pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Never share pooled DB connections inherited from the master"""
+    from app.core.database import engine, read_engine, shard_engines
+    engine.dispose(close=False)
+    if read_engine is not engine:
+        read_engine.dispose(close=False)
+    for shard_engine in shard_engines:
+        if shard_engine is not engine:
+            shard_engine.dispose(close=False)
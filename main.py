@@ -1,9 +1,19 @@
 # main.py
-from fastapi import FastAPI
+from fastapi import FastAPI, Response, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.session_handler import router as session_router
 from app.config import settings
-from app.core.database import engine, Base
+from app.core.database import engine, shard_engines, Base
+from app.core.instrumentation import REGISTRY, CONTENT_TYPE_LATEST, MetricsMiddleware
+from app.core.tracing import TracingMiddleware, build_exporter, configure_tracer, get_tracer
+from app.core.profiling import PROFILE_FORMAT, load_profile, require_debug_access
+from app.core.metrics import warm_up
+from app.core.profiles import load_profiles
+from app.core.jobs import start_job_workers, stop_job_workers
+from app.core.write_behind import start_write_behind, stop_write_behind
+from app.core.sketches import start_sketches, stop_sketches
+from contextlib import asynccontextmanager
+import threading
 import logging
 
 # Configure logging
@@ -13,12 +23,54 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Create tables
-try:
-    Base.metadata.create_all(bind=engine)
-    logger.info("Successfully created database tables")
-except Exception as e:
-    logger.error(f"Error creating tables: {e}")
+def create_tables():
+    """Create missing tables directly from the ORM models"""
+    try:
+        Base.metadata.create_all(bind=engine)
+        for shard_engine in shard_engines:
+            if shard_engine is not engine:
+                Base.metadata.create_all(bind=shard_engine)
+        logger.info("Successfully created database tables")
+    except Exception as e:
+        logger.error(f"Error creating tables: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs once per worker, after any gunicorn fork; nothing touches the DB at import
+    if settings.AUTO_CREATE_TABLES:
+        create_tables()
+    else:
+        logger.info("AUTO_CREATE_TABLES is off; schema is managed by Alembic")
+    
+    # A bad PROCESSING_PROFILES_FILE fails startup rather than the first ingest
+    load_profiles()
+    
+    # Warm SciPy in the background so the worker starts taking traffic immediately
+    if settings.PREWARM_SCIPY:
+        threading.Thread(target=warm_up, name="scipy-warmup", daemon=True).start()
+    
+    # Group-commit persister for concurrent ingests
+    if settings.WRITE_BEHIND_ENABLED:
+        start_write_behind(settings.WRITE_BEHIND_FLUSH_MS / 1000, settings.WRITE_BEHIND_MAX_BATCH)
+    
+    # Background analysis workers drain the hrv_jobs table
+    if settings.JOB_WORKERS > 0:
+        start_job_workers(
+            settings.JOB_WORKERS,
+            settings.JOB_POLL_INTERVAL,
+            settings.JOB_STALE_AFTER,
+            settings.JOB_MAX_ATTEMPTS
+        )
+    
+    # Population percentile sketches, flushed to metric_sketches in the background
+    if settings.SKETCHES_ENABLED:
+        start_sketches(settings.SKETCH_FLUSH_SECONDS, settings.SKETCH_MAX_SEGMENTS)
+    
+    yield
+    
+    stop_job_workers()
+    stop_write_behind()
+    stop_sketches()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -27,7 +79,8 @@ app = FastAPI(
     description=settings.API_DESCRIPTION,
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -39,6 +92,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Add request metrics middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Add request tracing with slow-request capture
+if settings.TRACING_ENABLED:
+    configure_tracer(
+        build_exporter(settings.TRACE_EXPORTER, settings.TRACE_FILE_PATH, settings.TRACE_BUFFER_SIZE),
+        settings.SLOW_REQUEST_THRESHOLD_MS
+    )
+    app.add_middleware(TracingMiddleware)
+
 # Include routers
 app.include_router(session_router, prefix="/api", tags=["HRV Sessions"])
 
@@ -51,6 +116,12 @@ async def root():
         "docs": "/docs"
     }
 
+# Metrics endpoint for Prometheus scraping
+@app.get("/metrics", tags=["Monitoring"], include_in_schema=False)
+async def metrics():
+    """Expose application metrics in the Prometheus text format"""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE_LATEST)
+
 # Debug endpoint to check environment
 @app.get("/debug", tags=["Debug"])
 async def debug():
@@ -65,6 +136,32 @@ async def debug():
         "api_version": settings.API_VERSION
     }
 
+# Debug endpoint listing captured slow-request traces
+@app.get("/debug/slow-requests", tags=["Debug"], dependencies=[Depends(require_debug_access)])
+async def slow_requests(limit: int = 20):
+    """Return span trees and SQL statements of recent requests above the latency threshold"""
+    tracer = get_tracer()
+    if tracer is None:
+        return {"enabled": False, "threshold_ms": None, "traces": []}
+    return {
+        "enabled": True,
+        "threshold_ms": tracer.slow_threshold_ms,
+        "traces": tracer.exporter.recent(limit)
+    }
+
+# Debug endpoint serving stored request profiles
+@app.get("/debug/profiles/{profile_id}", tags=["Debug"], dependencies=[Depends(require_debug_access)])
+async def get_profile(profile_id: str):
+    """Return a stored profile as collapsed stacks (flamegraph.pl / speedscope input)"""
+    content = load_profile(profile_id)
+    if content is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return Response(
+        content=content,
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.{PROFILE_FORMAT}"'}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=settings.DEBUG)
\ No newline at end of file
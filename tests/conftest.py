@@ -0,0 +1,60 @@
+# tests/conftest.py
+import os
+import uuid
+
+# Settings are read at import time; keep the suite off any configured database
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.storage import MemorySessionStore
+from tests.factories import sharded_backend, sql_backend
+
+
+def pytest_addoption(parser):
+    parser.addoption("--database-url", help="also run the store tests against this database "
+                                            "(they only add rows, under random ids)")
+
+
+def pytest_generate_tests(metafunc):
+    if "backend" in metafunc.fixturenames:
+        backends = ["memory", "sqlite", "sharded"]
+        if metafunc.config.getoption("--database-url"):
+            backends.append("database-url")
+        metafunc.parametrize("backend", backends)
+
+
+@pytest.fixture(scope="session")
+def open_store(request, tmp_path_factory):
+    """Backend name -> function opening a new store on it"""
+    directory = tmp_path_factory.mktemp("stores")
+    database_url = request.config.getoption("--database-url")
+    memory = MemorySessionStore()
+    return {
+        "memory": lambda: memory,
+        "sqlite": sql_backend(f"sqlite:///{directory / 'store.db'}"),
+        "sharded": sharded_backend(str(directory), shards=3),
+        "database-url": sql_backend(database_url) if database_url else None
+    }
+
+
+@pytest.fixture
+def store(backend, open_store):
+    store = open_store[backend]()
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def prefix() -> str:
+    """Unique id prefix, so tests can share a database"""
+    return f"t-{uuid.uuid4().hex[:8]}"
+
+
+@pytest.fixture(scope="session")
+def client():
+    """The app on its configured (in-memory SQLite) database, with its workers running"""
+    from main import app
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,77 @@
+# tests/factories.py
+"""Sessions processed through the real pipeline, and stores to put them in"""
+import os
+from typing import Callable, List, Optional
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base, configure_sqlite, normalize_url
+from app.core.ingest import session_entry
+from app.core.processor import HRVSessionProcessor
+from app.core.sharding import ShardedSessionStore, ShardMap
+from app.core.storage import SessionStore, SQLSessionStore
+from app.models.schemas import RawHRVData
+
+
+def make_entry(recording_id: str, user_id: str, beats: int = 300, tags=("Sleep",), day: int = 1,
+               device_model: str = "Polar H10", seed: int = 0, rr_intervals: Optional[List[int]] = None) -> dict:
+    """Process a synthetic session through the real pipeline"""
+    rng = np.random.default_rng(seed)
+    if rr_intervals is None:
+        rr_intervals = (850 + rng.normal(0, 10 + 10 * seed, beats)).astype(int).tolist()
+    raw_data = RawHRVData(
+        user_id=user_id,
+        device_info={"model": device_model, "firmwareVersion": "2.1.9"},
+        recordingSessionId=recording_id,
+        timestamp=f"2025-03-{day:02d}T07:00:00Z",
+        rrIntervals=rr_intervals,
+        heartRate=70,
+        tags=list(tags),
+    )
+    processor = HRVSessionProcessor(raw_data)
+    valid, result = processor.process()
+    return session_entry(raw_data, processor, valid, result)
+
+
+def rr_series(beats: int, seed: int = 7) -> List[int]:
+    return (850 + np.random.default_rng(seed).normal(0, 30, beats)).astype(int).tolist()
+
+
+def post_session(client, recording_id: str, rr_intervals: List[int], **params) -> dict:
+    """Upload a session through the API; its user is named after it"""
+    response = client.post("/api/hrv/session", params=params, json={
+        "user_id": f"{recording_id}@example.com",
+        "device_info": {"model": "Polar H10", "firmwareVersion": "2.1.9"},
+        "recordingSessionId": recording_id,
+        "timestamp": "2025-03-25T23:10:00Z",
+        "rrIntervals": list(rr_intervals),
+        "heartRate": 74,
+        "tags": ["Sleep"]
+    })
+    assert response.status_code in (200, 202), response.text
+    return response.json()
+
+
+def sqlite_factory(path: str) -> sessionmaker:
+    engine = create_engine(f"sqlite:///{path}")
+    configure_sqlite(engine)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def sql_backend(url: str) -> Callable[[], SessionStore]:
+    engine = create_engine(normalize_url(url))
+    configure_sqlite(engine)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return lambda: SQLSessionStore(factory())
+
+
+def sharded_backend(directory: str, shards: int, cache_ttl: float = 30) -> Callable[[], ShardedSessionStore]:
+    """Two or more SQLite shards plus a directory database"""
+    directory_factory = sqlite_factory(os.path.join(directory, "directory.db"))
+    shard_factories = [sqlite_factory(os.path.join(directory, f"shard{i}.db")) for i in range(shards)]
+    shard_map = ShardMap(shards, cache_ttl=cache_ttl)
+    return lambda: ShardedSessionStore(directory_factory(), shard_factories, shard_map)
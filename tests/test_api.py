@@ -0,0 +1,56 @@
+# tests/test_api.py
+import time
+
+from tests.factories import post_session, rr_series
+
+
+def wait_for_job(client, status_url: str, timeout: float = 30) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(status_url).json()
+        if job["status"] in ("succeeded", "failed") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_session_detail_etag(client, prefix):
+    rr = rr_series(400)
+    post_session(client, prefix, rr[:300])
+    url = f"/api/hrv/session/{prefix}"
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(url, headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+
+    # An append invalidates the cached detail
+    client.post(f"{url}/rr", json={"rrIntervals": rr[300:], "offset": 300})
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json() != first.json()
+
+
+def test_async_ingest(client, prefix):
+    rr = rr_series(300)
+    accepted = post_session(client, prefix, rr, **{"async": "true"})
+    assert accepted["status"] == "accepted"
+    # Re-submitting while the job is pending returns the same job (or, once it ran, the session)
+    again = post_session(client, prefix, rr, **{"async": "true"})
+    if again["status"] == "accepted":
+        assert again["data"]["job_id"] == accepted["data"]["job_id"]
+
+    job = wait_for_job(client, accepted["data"]["status_url"])
+    assert job["status"] == "succeeded", job
+    assert job["result"]["data"]["metadata"]["recordingSessionId"] == prefix
+    assert client.get(f"/api/hrv/session/{prefix}").status_code == 200
+    assert client.get("/api/hrv/jobs/missing").status_code == 404
+
+
+def test_batched_writes_are_read_back(client, prefix):
+    # On SQLite, ingests go through the write-behind queue
+    for i in range(5):
+        post_session(client, f"{prefix}-{i}", rr_series(300, seed=i))
+    for i in range(5):
+        assert client.get(f"/api/hrv/session/{prefix}-{i}").status_code == 200
+    duplicate = post_session(client, f"{prefix}-0", rr_series(300))
+    assert duplicate["status"] == "error"
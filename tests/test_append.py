@@ -0,0 +1,90 @@
+# tests/test_append.py
+import numpy as np
+import pytest
+
+from app.core.append import AppendError, add_chunk, series_state
+from app.core.profiles import DEFAULT_PROFILE
+from app.core.rr_codec import CONTENT_TYPE, encode_payload
+from app.core.storage import SQLSessionStore
+from app.core.validator import statistical_filter
+from app.models.sql_models import HRVSession
+from tests.factories import make_entry, post_session, rr_series, sqlite_factory
+
+
+def test_rejects_a_gap_before_the_chunk(store, prefix):
+    store.create_sessions([make_entry(f"{prefix}-s", f"{prefix}@example.com", rr_intervals=rr_series(300))])
+    with pytest.raises(AppendError) as gap:
+        store.append_rr(f"{prefix}-s", np.asarray(rr_series(50)), offset=310)
+    assert gap.value.status_code == 409
+    # Nothing was written, and the right offset still goes through
+    plan = store.append_rr(f"{prefix}-s", np.asarray(rr_series(50)), offset=300)
+    assert plan.state["raw"] == 350
+
+
+def test_appends_without_an_offset(store, prefix):
+    rr = rr_series(400)
+    store.create_sessions([make_entry(f"{prefix}-s", f"{prefix}@example.com", rr_intervals=rr[:300])])
+    store.append_rr(f"{prefix}-s", np.asarray(rr[300:]))
+    session = store.get_session_by_recording_id(f"{prefix}-s")
+    assert store.get_rr_intervals(session.id).tolist() == rr
+
+
+def test_incremental_metrics_match_the_validator(store, prefix):
+    rr = rr_series(900)
+    store.create_sessions([make_entry(f"{prefix}-s", f"{prefix}@example.com", rr_intervals=rr[:600])])
+    # The first append computes everything; a small chunk after it only updates the running sums
+    assert store.append_rr(f"{prefix}-s", np.asarray(rr[600:650]), offset=600).recomputed
+    plan = store.append_rr(f"{prefix}-s", np.asarray(rr[650:700]), offset=650)
+    assert not plan.recomputed
+    whole = make_entry(f"{prefix}-whole", f"{prefix}-whole@example.com", rr_intervals=rr[:700])
+    for key, column in (("mean_rr", "mean_rr"), ("sdnn", "sdnn"), ("rmssd", "rmssd"), ("rr_count", "rr_count")):
+        assert plan.metrics[column] == pytest.approx(whole["metrics"][key], rel=1e-9), key
+
+
+def test_refuses_archived_sessions(tmp_path, prefix):
+    db = sqlite_factory(str(tmp_path / "archived.db"))()
+    store = SQLSessionStore(db)
+    try:
+        store.create_sessions([make_entry(f"{prefix}-s", f"{prefix}@example.com")])
+        db.query(HRVSession).filter_by(recording_session_id=f"{prefix}-s").update({"rr_archive": "s.rr"})
+        db.commit()
+        with pytest.raises(AppendError, match="archived") as archived:
+            store.append_rr(f"{prefix}-s", np.asarray(rr_series(10)), offset=300)
+        assert archived.value.status_code == 409
+    finally:
+        store.close()
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_zscore_filter_of_a_constant_series():
+    # The validator's z-scores are all NaN when sd is 0, so it keeps no beat; neither does a chunk
+    state = series_state(np.full(40, 800), DEFAULT_PROFILE)
+    state = add_chunk(state, np.full(10, 800), DEFAULT_PROFILE)
+    assert state["n"] == statistical_filter(np.full(50, 800), DEFAULT_PROFILE).size
+
+
+def test_http_append(client, prefix):
+    rr = rr_series(600)
+    post_session(client, prefix, rr[:300])
+    url = f"/api/hrv/session/{prefix}/rr"
+    response = client.post(url, json={"rrIntervals": rr[300:450], "offset": 300})
+    assert response.status_code == 200, response.text
+    assert client.post(url, json={"rrIntervals": rr[300:450], "offset": 300}).status_code == 409
+    assert client.post(url, json={"rrIntervals": []}).status_code == 422
+    assert client.post(f"/api/hrv/session/{prefix}-missing/rr", json={"rrIntervals": [800]}).status_code == 404
+
+    body = encode_payload({"offset": 450, "final": True}, rr[450:], "varint-delta", "gzip")
+    response = client.post(url, content=body, headers={"content-type": CONTENT_TYPE, "content-encoding": "gzip"})
+    assert response.status_code == 200, response.text
+    whole = post_session(client, f"{prefix}-whole", rr)
+    assert response.json()["data"]["metrics"] == whole["data"]["metrics"]
+
+
+def test_http_append_rejects_bad_binary_bodies(client, prefix):
+    post_session(client, prefix, rr_series(300))
+    url = f"/api/hrv/session/{prefix}/rr"
+    headers = {"content-type": CONTENT_TYPE}
+    assert client.post(url, content=b"xx", headers=headers).status_code == 400
+    assert client.post(url, content=b"xx", headers={**headers, "content-encoding": "br"}).status_code == 415
+    huge = encode_payload({"offset": 300}, 800 + np.arange(3000) * 1_000_000, "varint-delta")
+    assert client.post(url, content=huge, headers=headers).status_code == 400
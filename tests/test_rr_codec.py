@@ -0,0 +1,77 @@
+# tests/test_rr_codec.py
+import gzip
+import json
+import struct
+
+import numpy as np
+import pytest
+
+from app.core.rr_codec import (
+    PayloadError, UnsupportedEncodingError, decode_payload, decompress, encode_payload, varint_delta_fits
+)
+
+RR = [812, 845, 790, 1210, 640, 833]
+
+
+def raw_payload(header: dict, block: bytes = b"") -> bytes:
+    encoded = json.dumps(header).encode("utf-8")
+    return struct.pack("<I", len(encoded)) + encoded + block
+
+
+@pytest.mark.parametrize("encoding", ["int16", "uint16", "int32", "varint-delta"])
+def test_round_trips(encoding):
+    header, rr = decode_payload(encode_payload({"user_id": "u@example.com"}, RR, encoding))
+    assert header == {"user_id": "u@example.com"}
+    assert rr.tolist() == RR
+
+
+def test_round_trips_gzip():
+    body = encode_payload({}, RR, "varint-delta", "gzip")
+    _, rr = decode_payload(decompress(body, "gzip", max_size=1 << 20))
+    assert rr.tolist() == RR
+
+
+def test_round_trips_empty_series():
+    _, rr = decode_payload(encode_payload({}, [], "varint-delta"))
+    assert rr.size == 0
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"\x01\x00", "too short"),
+    (struct.pack("<I", 100) + b"{}", "Header length exceeds"),
+    (struct.pack("<I", 3) + b"{x}", "Invalid JSON header"),
+    (raw_payload([1, 2]), "JSON object"),
+    (raw_payload({"encoding": "uint16"}), "'count'"),
+    (raw_payload({"encoding": "uint16", "count": -1}), "'count'"),
+    (raw_payload({"encoding": "uint16", "count": 0, "rrIntervals": [800]}), "binary block"),
+    (raw_payload({"encoding": "uint16", "count": 3}, b"\x00" * 4), "Expected 6 bytes"),
+    (raw_payload({"encoding": "varint-delta", "count": 2}), "Empty varint block"),
+    (raw_payload({"encoding": "varint-delta", "count": 1}, b"\x80"), "Truncated varint"),
+    (raw_payload({"encoding": "varint-delta", "count": 1}, b"\x80\x80\x80\x01"), "Varint too long"),
+    (raw_payload({"encoding": "varint-delta", "count": 3}, b"\x01\x02"), "does not match"),
+])
+def test_rejects_malformed_payloads(data, message):
+    with pytest.raises(PayloadError, match=message):
+        decode_payload(data)
+
+
+def test_rejects_unknown_encoding():
+    with pytest.raises(UnsupportedEncodingError):
+        decode_payload(raw_payload({"encoding": "float64", "count": 0}))
+    with pytest.raises(UnsupportedEncodingError):
+        decompress(b"", "br", max_size=100)
+
+
+def test_rejects_values_beyond_32_bits():
+    rr = 800 + np.arange(3000, dtype=np.int64) * 1_000_000
+    assert varint_delta_fits(rr)
+    with pytest.raises(PayloadError, match="32-bit"):
+        decode_payload(encode_payload({}, rr, "varint-delta"))
+
+
+def test_refuses_to_inflate_past_the_limit():
+    body = gzip.compress(b"\x00" * 1000)
+    with pytest.raises(PayloadError, match="exceeds"):
+        decompress(body, "gzip", max_size=100)
+    with pytest.raises(PayloadError, match="Invalid gzip"):
+        decompress(b"not gzip", "gzip", max_size=100)
@@ -0,0 +1,70 @@
+# tests/test_sharding.py
+import numpy as np
+import pytest
+
+from app.core.sharding import ShardedSessionStore, ShardMap, copy_user, delete_user, home_shard, move_user
+from app.models.sql_models import HRVSession
+from tests.factories import make_entry, rr_series, sqlite_factory
+
+
+@pytest.fixture
+def shards(tmp_path):
+    """Directory and two shards; the shard map does not cache, so a move is seen at once"""
+    directory = sqlite_factory(str(tmp_path / "directory.db"))
+    shard_sessions = [sqlite_factory(str(tmp_path / f"shard{i}.db")) for i in range(2)]
+    return directory, shard_sessions, ShardMap(2, cache_ttl=0)
+
+
+def user_on(shard: int, prefix: str) -> str:
+    return next(user for user in (f"{prefix}-{i}@example.com" for i in range(100)) if home_shard(user, 2) == shard)
+
+
+def test_append_during_a_move(shards, prefix):
+    directory, shard_sessions, shard_map = shards
+    user = user_on(1, prefix)
+    rr = rr_series(900, seed=1)
+    store = ShardedSessionStore(directory(), shard_sessions, shard_map)
+    store.create_sessions([make_entry(f"{prefix}-rec", user, rr_intervals=rr[:300])])
+    source, target, directory_db = shard_sessions[1](), shard_sessions[0](), directory()
+
+    # move_user's steps, with a chunk appended to the source after the first copy
+    assert copy_user(source, target, user) == 1
+    store.append_rr(f"{prefix}-rec", np.asarray(rr[300:600]), offset=300)
+    shard_map.assign(directory_db, user, 0)
+    assert copy_user(source, target, user) == 1
+    delete_user(source, user)
+    # The next chunk goes to the target, which has every beat so far
+    plan = store.append_rr(f"{prefix}-rec", np.asarray(rr[600:]), offset=600, final=True)
+    assert plan.state["raw"] == 900
+    store.close()
+
+    store = ShardedSessionStore(directory(), shard_sessions, shard_map)
+    session = target.query(HRVSession).filter_by(recording_session_id=f"{prefix}-rec").one()
+    whole = make_entry(f"{prefix}-whole", f"{prefix}-whole@example.com", rr_intervals=rr)
+    assert store.get_rr_intervals(session.id).tolist() == rr
+    assert session.metrics.rmssd == whole["metrics"]["rmssd"]
+    assert session.metrics.lf_hf_ratio == whole["metrics"]["lfHfRatio"]
+    assert store.get_user_summary(user).session_count == 1
+    assert source.query(HRVSession).filter_by(user_id=user).count() == 0
+    for db in (store, source, target, directory_db):
+        db.close()
+
+
+def test_move_user(shards, prefix):
+    directory, shard_sessions, shard_map = shards
+    user = user_on(0, prefix)
+    store = ShardedSessionStore(directory(), shard_sessions, shard_map)
+    store.create_sessions([make_entry(f"{prefix}-{i}", user, day=i + 1) for i in range(3)])
+    store.close()
+
+    directory_db = directory()
+    moved = move_user(directory_db, shard_sessions, shard_map, user, target=1, grace=0)
+    assert moved == {"user_id": user, "source": 0, "target": 1, "moved": 3}
+    assert shard_map.shard_for(directory_db, user) == 1
+    directory_db.close()
+
+    store = ShardedSessionStore(directory(), shard_sessions, shard_map)
+    assert len(store.get_sessions_by_user(user)) == 3
+    assert store.get_user_summary(user).session_count == 3
+    assert store.append_rr(f"{prefix}-0", np.asarray(rr_series(10)), offset=300).state["raw"] == 310
+    store.close()
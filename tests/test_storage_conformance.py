@@ -0,0 +1,206 @@
+# tests/test_storage_conformance.py
+"""Behaviour every SessionStore backend must share.
+
+Each test stores a few real processed sessions under a unique prefix and then
+compares what the store returns with what the endpoints expect. Every test
+runs against the memory store, a SQLite file, three SQLite shards and, with
+--database-url, another database (the tests only add rows, under random ids).
+"""
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.core.append import AppendError
+from app.core.circadian import circadian_response
+from app.core.session_query import TagFilter
+from app.core.storage import SessionStore, StoreConflict
+from tests.factories import make_entry
+
+
+def test_stores_and_reads_back_a_session(store: SessionStore, prefix: str) -> None:
+    entry = make_entry(f"{prefix}-a", f"{prefix}@example.com", tags=("Sleep", "Morning"))
+    (session_id,) = store.create_sessions([entry])
+    session = store.get_session_by_recording_id(f"{prefix}-a")
+    assert session is not None and session.id == session_id, "session not found by recording id"
+    assert session.user_id == f"{prefix}@example.com", "user_id not stored"
+    assert session.timestamp == datetime(2025, 3, 1, 7), f"timestamp stored as {session.timestamp}"
+    assert session.device.model == "Polar H10" and session.device.firmware_version == "2.1.9", "device not linked"
+    assert sorted(tag.name for tag in session.tags) == ["Morning", "Sleep"], "tags not linked"
+    assert session.valid and session.quality_label == entry["validation_result"]["quality_label"], "quality not stored"
+    metrics = entry["metrics"]
+    assert session.metrics is not None, "metrics missing"
+    assert abs(session.metrics.rmssd - metrics["rmssd"]) < 1e-9, "rmssd differs"
+    assert session.metrics.lf_hf_ratio == metrics["lfHfRatio"], "lfHfRatio differs"
+    assert session.metrics.indexes == entry["indexes"], "indexes differ"
+    assert store.get_session_by_recording_id(f"{prefix}-missing") is None, "unknown recording id returned a session"
+    assert store.get_session_id(f"{prefix}-a") == session_id, "session id lookup differs"
+    assert store.get_session_id(f"{prefix}-missing") is None, "unknown recording id returned a session id"
+
+
+def test_keeps_rr_intervals_in_order(store: SessionStore, prefix: str) -> None:
+    entry = make_entry(f"{prefix}-rr", f"{prefix}@example.com", beats=500)
+    (session_id,) = store.create_sessions([entry])
+    rr = store.get_rr_intervals(session_id)
+    assert np.array_equal(rr, np.asarray(entry["raw_data"].rrIntervals)), "RR intervals differ"
+    assert store.get_rr_intervals(f"{prefix}-none").size == 0, "unknown session returned RR intervals"
+
+
+def test_rejects_duplicates_atomically(store: SessionStore, prefix: str) -> None:
+    store.create_sessions([make_entry(f"{prefix}-dup", f"{prefix}@example.com")])
+    # The duplicate's user differs from the new session's, which may put them on different shards
+    batch = [make_entry(f"{prefix}-new", f"{prefix}-other@example.com"),
+             make_entry(f"{prefix}-dup", f"{prefix}@example.com")]
+    with pytest.raises(StoreConflict):
+        store.create_sessions(batch)
+    assert store.get_session_by_recording_id(f"{prefix}-new") is None, "partial batch was stored"
+    # The store is still usable after a conflict
+    store.create_sessions([make_entry(f"{prefix}-after", f"{prefix}@example.com")])
+    assert store.get_session_by_recording_id(f"{prefix}-after") is not None, "store unusable after conflict"
+
+
+def test_stores_invalid_sessions_without_metrics(store: SessionStore, prefix: str) -> None:
+    entry = make_entry(f"{prefix}-short", f"{prefix}@example.com", beats=10)
+    assert not entry["valid"], "fixture should be invalid"
+    store.create_sessions([entry])
+    session = store.get_session_by_recording_id(f"{prefix}-short")
+    assert session is not None and not session.valid, "invalid session not stored as invalid"
+    assert session.metrics is None, "invalid session has metrics"
+    assert session.reason == entry["validation_result"]["reason"], "reason not stored"
+
+
+def test_lists_sessions_by_user_and_tag(store: SessionStore, prefix: str) -> None:
+    user = f"{prefix}@example.com"
+    entries = [make_entry(f"{prefix}-{i}", user, tags=(f"{prefix}-tag",) if i % 2 else (), day=i + 1) for i in range(5)]
+    store.create_sessions(entries)
+    by_user = [s.recording_session_id for s in store.get_sessions_by_user(user, 0, 100)]
+    assert sorted(by_user) == [f"{prefix}-{i}" for i in range(5)], f"user listing returned {by_user}"
+    assert len(store.get_sessions_by_user(user, 1, 2)) == 2, "user listing ignores skip/limit"
+    by_tag = sorted(s.recording_session_id for s in store.get_sessions_by_tag(f"{prefix}-tag", 0, 100))
+    assert by_tag == [f"{prefix}-1", f"{prefix}-3"], f"tag listing returned {by_tag}"
+    assert store.get_sessions_by_user(f"{prefix}-nobody", 0, 100) == [], "unknown user has sessions"
+
+
+def test_filters_queries_like_sql(store: SessionStore, prefix: str) -> None:
+    user = f"{prefix}@example.com"
+    entries = [
+        make_entry(f"{prefix}-{i}", user, tags=("Sleep",) if i % 2 else ("Workout",), day=i + 1,
+                   device_model=f"{prefix}-dev{i % 2}", seed=i)
+        for i in range(6)
+    ]
+    entries.append(make_entry(f"{prefix}-bad", user, beats=10, tags=(), day=20))
+    store.create_sessions(entries)
+    rmssd = {e["raw_data"].recordingSessionId: e["metrics"]["rmssd"] for e in entries if e["valid"]}
+    cutoff = sorted(rmssd.values())[3]
+
+    def ids(**kwargs):
+        return [s.recording_session_id for s, _ in store.query_sessions(user_id=user, **kwargs)]
+
+    newest_first = [f"{prefix}-bad"] + [f"{prefix}-{i}" for i in reversed(range(6))]
+    assert ids(ranges={}) == newest_first, "default ordering is not newest first"
+    expected = [rid for rid in ids(ranges={}) if rid in rmssd and rmssd[rid] <= cutoff]
+    assert ids(ranges={"rmssd": (None, cutoff)}) == expected, "rmssd_max filter differs"
+    assert f"{prefix}-bad" not in ids(ranges={"sdnn": (0.0, None)}), "metric filter matched a session without metrics"
+    assert ids(ranges={}, valid=False) == [f"{prefix}-bad"], "valid filter differs"
+    assert ids(ranges={}, tag="Sleep") == [f"{prefix}-5", f"{prefix}-3", f"{prefix}-1"], "tag filter differs"
+    by_device = ids(ranges={}, device_model=f"{prefix}-dev0")
+    assert by_device == [f"{prefix}-4", f"{prefix}-2", f"{prefix}-0"], "device filter differs"
+    in_range = ids(ranges={}, start=datetime(2025, 3, 2), end=datetime(2025, 3, 4))
+    assert in_range == [f"{prefix}-2", f"{prefix}-1"], "time range differs (from inclusive, to exclusive)"
+    assert ids(ranges={}, skip=1, limit=2) == [f"{prefix}-5", f"{prefix}-4"], "skip/limit differ"
+    rows = store.query_sessions({"heart_rate": (70, 70)}, user_id=user,
+                                quality_labels=["excellent", "good", "fair", "poor"])
+    assert all(metrics is None or metrics.session_id == session.id for session, metrics in rows), "metrics row mismatched"
+
+
+def test_combines_tag_expressions(store: SessionStore, prefix: str) -> None:
+    a, b, c = (f"{prefix}-{name}" for name in "abc")
+    tag_sets = [(a,), (a, b), (b,), (a, b, c), (c,), ()]
+    store.create_sessions([
+        make_entry(f"{prefix}-{i}", f"{prefix}-u{i % 2}@example.com", tags=tags, day=i + 1)
+        for i, tags in enumerate(tag_sets)
+    ])
+
+    def ids(tags, **kwargs):
+        return [s.recording_session_id for s, _ in store.query_sessions({}, tags=tags, **kwargs)]
+
+    assert ids(TagFilter(all_of=(a, b))) == [f"{prefix}-3", f"{prefix}-1"], "all_of differs"
+    any_of = ids(TagFilter(any_of=(b, c)))
+    assert any_of == [f"{prefix}-4", f"{prefix}-3", f"{prefix}-2", f"{prefix}-1"], "any_of differs"
+    assert ids(TagFilter(all_of=(a,), none_of=(c,))) == [f"{prefix}-1", f"{prefix}-0"], "none_of differs"
+    by_user = ids(TagFilter(all_of=(a,)), user_id=f"{prefix}-u1@example.com")
+    assert by_user == [f"{prefix}-3", f"{prefix}-1"], "tags with user filter differ"
+    total, facets = store.tag_facets({}, tags=TagFilter(any_of=(a, c)))
+    assert total == 4 and facets == {a: 3, b: 2, c: 2}, f"facets {total} {facets}"
+    total, facets = store.tag_facets({}, tags=TagFilter(none_of=(a, b, c)), user_id=f"{prefix}-u1@example.com")
+    assert total == 1 and facets == {}, f"facets without tags {total} {facets}"
+
+
+def test_maintains_user_summaries(store: SessionStore, prefix: str) -> None:
+    user = f"{prefix}@example.com"
+    assert store.get_user_summary(user) is None, "unknown user has a summary"
+    store.create_sessions([make_entry(f"{prefix}-1", user, day=1), make_entry(f"{prefix}-short", user, beats=10, day=3)])
+    store.create_sessions([make_entry(f"{prefix}-2", user, day=2)])
+    summary = store.get_user_summary(user)
+    assert summary is not None, "summary missing"
+    assert summary.session_count == 3 and summary.valid_session_count == 2, "session counts differ"
+    assert summary.latest_recording_session_id == f"{prefix}-short", "latest session is not the newest by timestamp"
+    # Day buckets only average valid sessions
+    assert sum(day["sessions"] for day in summary.daily.values()) == 2, "daily buckets differ"
+    profile = circadian_response(user, summary.circadian)
+    assert profile["sessions"] == 2 and profile["hourly"]["sessions"][7] == 2, "circadian bins differ"
+    assert profile["weekday"]["sessions"][5:] == [1, 1], "weekday bins differ"  # 2025-03-01 was a Saturday
+
+
+def test_counts_rows(store: SessionStore, prefix: str) -> None:
+    before = store.counts()
+    store.create_sessions([
+        make_entry(f"{prefix}-1", f"{prefix}@example.com", tags=(f"{prefix}-t1",), device_model=f"{prefix}-dev"),
+        make_entry(f"{prefix}-2", f"{prefix}-2@example.com", tags=(f"{prefix}-t1", f"{prefix}-t2")),
+    ])
+    after = store.counts()
+    delta = {key: after[key] - before[key] for key in ("users", "sessions", "devices", "tags")}
+    assert delta == {"users": 2, "sessions": 2, "devices": 1, "tags": 2}, f"count deltas {delta}"
+    latest = [s.recording_session_id for s in store.latest_sessions(2)]
+    assert set(latest) == {f"{prefix}-1", f"{prefix}-2"}, f"latest sessions {latest}"
+
+
+def test_merges_listings_across_users(store: SessionStore, prefix: str) -> None:
+    tag = f"{prefix}-shared"
+    entries = [make_entry(f"{prefix}-{i}", f"{prefix}-u{i % 4}@example.com", tags=(tag,), day=i + 1) for i in range(8)]
+    store.create_sessions(entries)
+    newest_first = [f"{prefix}-{i}" for i in reversed(range(8))]
+    pages = [[s.recording_session_id for s, _ in store.query_sessions({}, tag=tag, skip=skip, limit=3)]
+             for skip in (0, 3, 6)]
+    assert pages == [newest_first[:3], newest_first[3:6], newest_first[6:]], f"query pages {pages}"
+    by_tag = sorted(s.recording_session_id for s in store.get_sessions_by_tag(tag, 0, 100))
+    assert by_tag == sorted(newest_first), f"tag listing returned {by_tag}"
+    assert len(store.get_sessions_by_tag(tag, 2, 4)) == 4, "tag listing ignores skip/limit"
+    for i in range(4):
+        user = f"{prefix}-u{i}@example.com"
+        assert len(store.get_sessions_by_user(user, 0, 100)) == 2, f"{user} listing differs"
+        assert store.get_user_summary(user).session_count == 2, f"{user} summary differs"
+
+
+def test_appends_rr_intervals(store: SessionStore, prefix: str) -> None:
+    user = f"{prefix}@example.com"
+    rr = (850 + np.random.default_rng(7).normal(0, 30, 600)).astype(int).tolist()
+    whole = make_entry(f"{prefix}-whole", f"{prefix}-whole@example.com", rr_intervals=rr)
+    store.create_sessions([make_entry(f"{prefix}-parts", user, rr_intervals=rr[:20])])
+    assert not store.get_session_by_recording_id(f"{prefix}-parts").valid, "fixture should start invalid"
+    store.append_rr(f"{prefix}-parts", np.asarray(rr[20:300]), offset=20)
+    with pytest.raises(AppendError) as conflict:
+        store.append_rr(f"{prefix}-parts", np.asarray(rr[20:300]), offset=20)
+    assert conflict.value.status_code == 409, "retried chunk was not refused"
+    plan = store.append_rr(f"{prefix}-parts", np.asarray(rr[300:]), offset=300, final=True)
+    assert plan.recomputed, "final chunk did not recompute"
+    session = store.get_session_by_recording_id(f"{prefix}-parts")
+    assert np.array_equal(store.get_rr_intervals(session.id), np.asarray(rr)), "appended RR intervals differ"
+    assert session.valid and session.quality_label == whole["validation_result"]["quality_label"], "validity differs"
+    for key, column in (("rmssd", "rmssd"), ("sdnn", "sdnn"), ("lfHfRatio", "lf_hf_ratio"), ("rr_count", "rr_count")):
+        assert getattr(session.metrics, column) == whole["metrics"][key], f"{key} differs from a single upload"
+    summary = store.get_user_summary(user)
+    assert summary.session_count == 1 and summary.valid_session_count == 1, "summary counts differ after append"
+    with pytest.raises(AppendError) as missing:
+        store.append_rr(f"{prefix}-missing", np.asarray(rr[:10]))
+    assert missing.value.status_code == 404, "unknown session was not a 404"